@@ -0,0 +1,278 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import pandas as pd
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from app.loader import PO_SCHEMA, RFM_SCHEMA, apply_dtype_plan, load_excel_data
+from app.localization import DEPARTMENT_PICS, assign_department, compile_department_patterns, split_by_department
+from app.metrics import max_rss_mb, track_peak_rss
+from app.processor import _save_workbook, build_base_filter, enrich_source, index_normalization, parse_window
+from app.reports import REPORTS, compile_report_plan, evaluate_report_plan, reports_for_source
+from app.styler import style_and_reorder_excel_by_process
+from app.synthetic import EXCEL_MAX_ROWS, generate_normalization, generate_source, write_dataset
+
+DEFAULT_RESULTS_DIR: str = '.benchmarks'
+DEFAULT_ROWS: List[int] = [10000, 100000]
+BENCHMARK_WINDOW = ('01-06-2025', '30-06-2025')
+
+# stage name -> needs an excel workbook, in run order
+STAGES: Dict[str, bool] = {
+    'load': True,
+    'load_streaming': True,
+    'enrich': False,
+    'assign_department': False,
+    'filter': False,
+    'split_by_department': False,
+    'write_styled': True,
+    'write_plain': True,
+    'style_legacy': True,
+}
+
+def measure(fn: Callable[[], Any], sample_memory: bool = True) -> Dict[str, Any]:
+    """
+    run fn once and record its cost.
+
+    Args:
+        fn: stage to run.
+        sample_memory: record the stage's peak RSS growth (linux only), see track_peak_rss.
+
+    Returns:
+        Dictionary with 'result', 'wall_s', 'cpu_s', 'peak_mb' (RSS growth over the
+        stage, None when not sampled) and 'max_rss_mb', the process high water mark.
+    """
+    gc.collect()
+    with track_peak_rss(sample_memory) as usage:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = fn()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    return {'result': result, 'wall_s': wall, 'cpu_s': cpu, 'peak_mb': usage['peak_mb'], 'max_rss_mb': max_rss_mb()}
+
+def _git_commit() -> Optional[str]:
+    try:
+        # the checkout this module runs from, not the working directory
+        repo = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.run(['git', '-C', repo, 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', '-C', repo, 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+def _benchmark_source(
+    source: str,
+    df: pd.DataFrame,
+    normalization: pd.DataFrame,
+    source_file: str,
+    n_rows: int,
+    stages: List[str],
+    work_dir: str,
+    sample_memory: bool
+) -> List[Dict[str, Any]]:
+    """
+    benchmark the pipeline stages of one source, see benchmark_size.
+    """
+    results: List[Dict[str, Any]] = []
+    fits_excel = n_rows <= EXCEL_MAX_ROWS
+    schema = PO_SCHEMA if source == 'PO' else RFM_SCHEMA
+    # in-memory stages see the dtypes a load produces
+    df = apply_dtype_plan(df, schema)
+
+    datestart_dt, dateend_dt = parse_window(*BENCHMARK_WINDOW)
+    reports = reports_for_source(REPORTS, source)
+    state: Dict[str, Any] = {}
+
+    def run_filter():
+        plan = compile_report_plan(state['assigned'], build_base_filter(source, state['assigned']), reports)
+        return evaluate_report_plan(plan, datestart_dt, dateend_dt)
+
+    # frames a stage reads, built untimed when the stage producing them was not selected
+    producers = [
+        ('enriched', lambda: enrich_source(source, df, index_normalization(normalization))),
+        ('assigned', lambda: assign_department(state['enriched'], compile_department_patterns())),
+        ('rows', run_filter),
+    ]
+    needs = {'assign_department': 1, 'filter': 2}
+
+    def write(path: str, style_inline: bool):
+        _save_workbook(source, path, df, state['assigned'], state['rows'], list(DEPARTMENT_PICS), style_inline, {}, REPORTS)
+        return path
+
+    plain_path = os.path.join(work_dir, f"plain-{source}-{n_rows}.xlsx")
+    stage_fns: Dict[str, Callable[[], Any]] = {
+        'load': lambda: load_excel_data(source_file, use_cache=False, schema=schema),
+        'load_streaming': lambda: load_excel_data(source_file, use_cache=False, schema=schema, streaming=True),
+        'enrich': lambda: enrich_source(source, df, index_normalization(normalization)),
+        'assign_department': lambda: assign_department(state['enriched'], compile_department_patterns()),
+        'filter': run_filter,
+        'split_by_department': lambda: {
+            name: split_by_department(state['assigned'].iloc[rows]) for name, rows in state['rows'].items()
+        },
+        'write_styled': lambda: write(os.path.join(work_dir, f"styled-{source}-{n_rows}.xlsx"), True),
+        'write_plain': lambda: write(plain_path, False),
+        'style_legacy': lambda: style_and_reorder_excel_by_process(plain_path),
+    }
+
+    for stage in stages:
+        row = {'source': source, 'stage': stage, 'rows': n_rows}
+        if STAGES[stage] and not fits_excel:
+            print(f"  {source} {stage}: skipped, {n_rows} rows exceed one Excel sheet")
+            results.append({**row, 'skipped': True})
+            continue
+        if stage not in ('load', 'load_streaming', 'enrich'):
+            for key, produce in producers[:needs.get(stage, len(producers))]:
+                if key not in state:
+                    state[key] = produce()
+        if stage == 'style_legacy' and not os.path.exists(plain_path):
+            write(plain_path, False)
+
+        # stage output is discarded unless it feeds the next stage
+        outcome = measure(stage_fns[stage], sample_memory)
+        if stage == 'enrich':
+            state['enriched'] = outcome['result']
+        elif stage == 'assign_department':
+            state['assigned'] = outcome['result']
+        elif stage == 'filter':
+            state['rows'] = outcome['result']
+        outcome.pop('result')
+        print(f"  {source} {stage}: {outcome['wall_s']:.3f}s wall, {outcome['cpu_s']:.3f}s cpu"
+              + (f", +{outcome['peak_mb']:.1f} MB peak RSS" if outcome['peak_mb'] is not None else ''))
+        results.append({**row, **outcome, 'skipped': False})
+    return results
+
+def benchmark_size(
+    n_rows: int,
+    stages: List[str],
+    work_dir: str,
+    seed: int = 0,
+    sample_memory: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    benchmark the pipeline stages on one generated PO and RFM dataset.
+
+    Both sources go through every stage, as in a run. In-memory stages run
+    on the generated frames so their timings do not depend on the excel
+    reader. Stages that need a workbook are skipped above EXCEL_MAX_ROWS.
+
+    Args:
+        n_rows: lines per source.
+        stages: stage names, see STAGES.
+        work_dir: folder for generated inputs (reused between runs) and outputs.
+        seed: random seed of the generated data.
+        sample_memory: see measure.
+
+    Returns:
+        one result row per source and stage.
+    """
+    print(f"Generating {n_rows} rows...")
+    frames = {source: generate_source(source, n_rows, seed) for source in ('PO', 'RFM')}
+    normalization = generate_normalization(list(frames.values()), seed=seed)
+    data_dir = os.path.join(work_dir, f"data-{n_rows}-{seed}")
+    files = {source: os.path.join(data_dir, f"{source}.xlsx") for source in frames}
+    if n_rows <= EXCEL_MAX_ROWS and any(STAGES[stage] for stage in stages) and not all(os.path.exists(path) for path in files.values()):
+        write_dataset(data_dir, n_rows, seed)
+
+    results: List[Dict[str, Any]] = []
+    for source, df in frames.items():
+        results.extend(_benchmark_source(source, df, normalization, files[source], n_rows, stages, work_dir, sample_memory))
+    return results
+
+def run_benchmarks(
+    rows: List[int],
+    stages: Optional[List[str]] = None,
+    results_dir: str = DEFAULT_RESULTS_DIR,
+    seed: int = 0,
+    sample_memory: bool = True
+) -> str:
+    """
+    benchmark every size and store the results as json.
+
+    Args:
+        rows: dataset sizes.
+        stages: stage names, see STAGES. Defaults to all.
+        results_dir: folder for results, generated data is kept in its 'work' folder.
+        seed: random seed of the generated data.
+        sample_memory: see measure.
+
+    Returns:
+        path to the results file.
+    """
+    if stages is None:
+        stages = list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}")
+    work_dir = os.path.join(results_dir, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+
+    commit = _git_commit()
+    results: List[Dict[str, Any]] = []
+    for n_rows in rows:
+        results.extend(benchmark_size(n_rows, stages, work_dir, seed, sample_memory))
+
+    created = datetime.now()
+    report = {
+        'commit': commit,
+        'created': created.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'sample_memory': sample_memory,
+        'results': results,
+    }
+    path = os.path.join(results_dir, f"{created:%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved: {path}")
+    return path
+
+def compare_results(baseline_path: str, current_path: str) -> pd.DataFrame:
+    """
+    per source, stage and size wall time and peak memory of two result files.
+
+    Results saved before RFM was benchmarked count as PO.
+
+    Returns:
+        dataframe with baseline, current and current/baseline ratio columns.
+    """
+    frames = []
+    for path in (baseline_path, current_path):
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        df = pd.DataFrame([{'source': 'PO', **r} for r in report['results'] if not r['skipped']])
+        frames.append(df.set_index(['source', 'stage', 'rows'])[['wall_s', 'peak_mb']])
+    baseline, current = frames
+    table = baseline.join(current, lsuffix='_base', rsuffix='_new', how='inner')
+    table['wall_ratio'] = table['wall_s_new'] / table['wall_s_base']
+    table['peak_ratio'] = table['peak_mb_new'] / table['peak_mb_base']
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the weekly purchasing pipeline on generated data.")
+    parser.add_argument("--rows", type=int, nargs='+', default=DEFAULT_ROWS, help="Dataset sizes in rows (10000 to 2000000).")
+    parser.add_argument("--stages", nargs='+', choices=list(STAGES), help="Stages to run (default: all).")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Folder for result files and generated data.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated data.")
+    parser.add_argument("--no-memory", action="store_true", help="Do not sample memory.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare this run against an earlier result file.")
+    parser.add_argument("--generate", metavar="DIR", help="Only write PO.xlsx, RFM.xlsx and Normalisasi.csv of the first --rows size to DIR.")
+    args = parser.parse_args()
+
+    if args.generate:
+        write_dataset(args.generate, args.rows[0], args.seed)
+        return
+
+    path = run_benchmarks(args.rows, args.stages, args.results_dir, args.seed, not args.no_memory)
+    if args.compare:
+        with pd.option_context('display.width', 200, 'display.float_format', '{:.3f}'.format):
+            print(compare_results(args.compare, path))
+
+if __name__ == "__main__":
+    main()
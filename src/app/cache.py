@@ -0,0 +1,172 @@
+import pandas as pd
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+try:
+    import pyarrow  # noqa: F401 - parquet engine for pandas
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+DEFAULT_CACHE_DIR: str = os.environ.get(
+    'WEEKLY_PURCHASING_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'weekly-purchasing')
+)
+DEFAULT_MAX_CACHE_BYTES: int = int(os.environ.get('WEEKLY_PURCHASING_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+_CACHE_EXTENSIONS: Tuple[str, ...] = ('.parquet', '.pkl')
+
+def file_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    sha256 of file contents.
+
+    Args:
+        file_path: path to file.
+        chunk_size: bytes read per step.
+
+    Returns:
+        hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(file_path: str, sheet_name, variant: str = '') -> str:
+    """
+    cache key for one sheet of one input file.
+
+    Args:
+        file_path: path to excel file.
+        sheet_name: sheet name or index as passed to the loader.
+        variant: extra discriminator for loaders that parse the same sheet differently.
+
+    Returns:
+        hex key built from content hash, size, mtime and sheet name.
+    """
+    stat = os.stat(file_path)
+    parts = [file_digest(file_path), str(stat.st_size), str(stat.st_mtime_ns), repr(sheet_name), variant]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+def _entries(cache_dir: str) -> List[str]:
+    if not os.path.isdir(cache_dir):
+        return []
+    return [
+        os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+        if name.endswith(_CACHE_EXTENSIONS)
+    ]
+
+def has_cached_frame(key: str, cache_dir: str = DEFAULT_CACHE_DIR) -> bool:
+    """
+    whether the cache holds an entry for key, without loading it.
+    """
+    return any(
+        os.path.exists(os.path.join(cache_dir, key + ext)) and (ext != '.parquet' or HAS_PYARROW)
+        for ext in _CACHE_EXTENSIONS
+    )
+
+def read_cached_frame(key: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Optional[pd.DataFrame]:
+    """
+    load a cached dataframe.
+
+    Args:
+        key: cache key from cache_key.
+        cache_dir: cache location.
+
+    Returns:
+        cached dataframe, or None on a miss or an unreadable entry.
+    """
+    for ext in _CACHE_EXTENSIONS:
+        path = os.path.join(cache_dir, key + ext)
+        if not os.path.exists(path):
+            continue
+        if ext == '.parquet' and not HAS_PYARROW:
+            continue
+        try:
+            df = pd.read_parquet(path) if ext == '.parquet' else pd.read_pickle(path)
+        except Exception as e:
+            print(f"Warning: Discarding unreadable cache entry {path}: {e}")
+            os.remove(path)
+            continue
+        # bump mtime so eviction drops least recently used entries first
+        os.utime(path, None)
+        return df
+    return None
+
+def write_cached_frame(
+    key: str,
+    df: pd.DataFrame,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    max_bytes: int = DEFAULT_MAX_CACHE_BYTES
+):
+    """
+    store a dataframe in the cache, then evict down to max_bytes.
+
+    Parquet is used when pyarrow is installed and the frame converts cleanly,
+    otherwise the frame is pickled. Both keep dtypes.
+
+    Args:
+        key: cache key from cache_key.
+        df: dataframe to store.
+        cache_dir: cache location.
+        max_bytes: size bound for the whole cache directory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    stored = False
+    if HAS_PYARROW:
+        path = os.path.join(cache_dir, key + '.parquet')
+        tmp_path = path + '.tmp'
+        try:
+            df.to_parquet(tmp_path, index=True)
+            os.replace(tmp_path, path)
+            stored = True
+        except Exception:
+            # mixed-type object columns or non-string headers, fall back to pickle
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    if not stored:
+        path = os.path.join(cache_dir, key + '.pkl')
+        tmp_path = path + '.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> int:
+    """
+    remove least recently used entries until the cache fits in max_bytes.
+
+    Args:
+        cache_dir: cache location.
+        max_bytes: size bound for the whole cache directory.
+
+    Returns:
+        number of entries removed.
+    """
+    entries = [(os.stat(path), path) for path in _entries(cache_dir)]
+    total = sum(stat.st_size for stat, _ in entries)
+    removed = 0
+    for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= stat.st_size
+        removed += 1
+    return removed
+
+def clear_cache(cache_dir: str = DEFAULT_CACHE_DIR) -> int:
+    """
+    delete every cache entry.
+
+    Args:
+        cache_dir: cache location.
+
+    Returns:
+        number of entries removed.
+    """
+    entries = _entries(cache_dir)
+    for path in entries:
+        os.remove(path)
+    print(f"Cleared {len(entries)} cache entries from {cache_dir}")
+    return len(entries)
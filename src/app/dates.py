@@ -0,0 +1,119 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.loader import NA_STRINGS
+from app.normalization import NORMALIZATION_DATE_FORMAT
+
+# last step of a fallback chain: pandas parses each remaining value on its own
+INFER = 'infer'
+INFER_DAYFIRST = 'infer-dayfirst'
+
+ISO_FORMATS: List[str] = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+DAYFIRST_FORMATS: List[str] = [NORMALIZATION_DATE_FORMAT, '%d/%m/%Y %H:%M:%S', '%d-%m-%Y']
+
+# text date formats of each column, tried in order. Excel dates (datetime cells)
+# need no format. Columns filled from the normalization sheet hold DD/MM/YYYY text.
+DATE_FORMATS: Dict[str, List[str]] = {
+    'PO Approval Date': ISO_FORMATS + [INFER],
+    'Requisition Approved Date': ISO_FORMATS + [INFER],
+    'Requisition Required Date': ISO_FORMATS + [INFER],
+    'used_approved_date': DAYFIRST_FORMATS + ISO_FORMATS + [INFER_DAYFIRST],
+    'Updated Requisition Approved Date': DAYFIRST_FORMATS + ISO_FORMATS + [INFER_DAYFIRST],
+    'Updated Requisition Required Date': DAYFIRST_FORMATS + ISO_FORMATS + [INFER_DAYFIRST],
+}
+# columns without a declared chain
+DEFAULT_DATE_FORMATS: List[str] = ISO_FORMATS + [INFER]
+
+def _parse_text(values: np.ndarray, formats: List[str]) -> np.ndarray:
+    """
+    parse distinct text dates with each format of the chain in turn.
+    """
+    result = np.full(len(values), np.datetime64('NaT', 'ns'))
+    pending = np.arange(len(values))
+    for date_format in formats:
+        if not len(pending):
+            break
+        if date_format in (INFER, INFER_DAYFIRST):
+            parsed = pd.to_datetime(
+                pd.Series(values[pending], dtype=object), errors='coerce',
+                format='mixed', dayfirst=date_format == INFER_DAYFIRST
+            )
+        else:
+            parsed = pd.to_datetime(pd.Series(values[pending], dtype=object), errors='coerce', format=date_format)
+        parsed = parsed.dt.tz_localize(None) if parsed.dt.tz is not None else parsed
+        parsed = parsed.to_numpy(dtype='datetime64[ns]')
+        found = ~np.isnat(parsed)
+        result[pending[found]] = parsed[found]
+        pending = pending[~found]
+    return result
+
+def parse_dates(values: pd.Series, formats: Optional[List[str]] = None) -> Tuple[pd.Series, int]:
+    """
+    convert a column to datetime64, parsing each distinct value once.
+
+    Exports repeat a few hundred dates over many rows, so the distinct
+    values are parsed and mapped back by position. Date and datetime cells
+    are taken as they are, text goes through the format chain.
+
+    Args:
+        values: column to convert.
+        formats: text date formats tried in order, INFER or INFER_DAYFIRST
+            as last step parses what is left value by value. Defaults to
+            DEFAULT_DATE_FORMATS.
+
+    Returns:
+        (dates, coerced): the converted column, and the number of non-empty
+        values that are not dates and became NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, 0
+    formats = formats or DEFAULT_DATE_FORMATS
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = np.asarray(uniques, dtype=object)
+
+    is_text = np.array([isinstance(v, str) for v in uniques], dtype=bool)
+    text = np.array([v.strip() for v in uniques[is_text]], dtype=object)
+    is_empty = np.zeros(len(uniques), dtype=bool)
+    is_empty[is_text] = np.isin(text, list(NA_STRINGS))
+
+    parsed = np.full(len(uniques), np.datetime64('NaT', 'ns'))
+    text_rows = np.flatnonzero(is_text & ~is_empty)
+    parsed[text_rows] = _parse_text(text[~is_empty[is_text]], formats)
+    other = np.flatnonzero(~is_text)
+    if len(other):
+        # datetime cells, and numbers or other objects pandas may understand
+        converted = pd.to_datetime(pd.Series(uniques[other], dtype=object), errors='coerce', format='mixed')
+        parsed[other] = converted.to_numpy(dtype='datetime64[ns]')
+
+    # values that were present but did not parse, weighted by their row count
+    failed = np.isnat(parsed) & ~is_empty
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    coerced = int(counts[failed].sum())
+
+    # code -1 (missing) takes the trailing NaT
+    dates = np.append(parsed, np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(dates, index=values.index, name=values.name), coerced
+
+def parse_date_columns(
+    df: pd.DataFrame,
+    columns: List[str],
+    formats: Optional[Dict[str, List[str]]] = None
+) -> Dict[str, int]:
+    """
+    convert date columns of a frame in place.
+
+    Args:
+        df: frame to update, columns are replaced.
+        columns: columns to convert, missing ones are skipped.
+        formats: column name to format chain. Defaults to DATE_FORMATS.
+
+    Returns:
+        column name to the number of values coerced to NaT.
+    """
+    formats = DATE_FORMATS if formats is None else formats
+    coerced: Dict[str, int] = {}
+    for column in columns:
+        if column not in df.columns:
+            continue
+        df[column], coerced[column] = parse_dates(df[column], formats.get(column))
+    return coerced
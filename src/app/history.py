@@ -0,0 +1,350 @@
+import argparse
+import os
+import sqlite3
+import time
+import pandas as pd
+import numpy as np
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.metrics import stage
+from app.reports import PR_PO_COLUMN
+
+# seconds a writer waits for another process holding the database, e.g. backfill workers
+BUSY_TIMEOUT: float = 60.0
+
+# columns of every PO / RFM export (see PO_SCHEMA / RFM_SCHEMA) that stay the
+# same while a line moves through the process, the stored row key is built from them
+HISTORY_KEY_COLUMNS: Dict[str, List[str]] = {
+    'PO': ['Requisition Number', 'Item Category', 'Requisition Type', 'Department'],
+    'RFM': ['Requisition Number', 'Item Category', 'Requisition Type', 'Project'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS windows (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    normalization_version TEXT,
+    recorded_at TEXT NOT NULL,
+    UNIQUE (source, window_start, window_end)
+);
+CREATE TABLE IF NOT EXISTS report_rows (
+    window_id INTEGER NOT NULL,
+    report TEXT NOT NULL,
+    department TEXT,
+    row_key TEXT NOT NULL,
+    requisition_number TEXT,
+    pr_po REAL
+);
+CREATE INDEX IF NOT EXISTS windows_week ON windows (window_end, window_start);
+CREATE INDEX IF NOT EXISTS report_rows_report ON report_rows (report, window_id);
+CREATE INDEX IF NOT EXISTS report_rows_department ON report_rows (report, department, window_id);
+CREATE INDEX IF NOT EXISTS report_rows_window ON report_rows (window_id);
+"""
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    open a history database, creating its tables on first use.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+def _iso(value: str) -> str:
+    # 'DD-MM-YYYY' -> 'YYYY-MM-DD', which sorts and compares as text
+    try:
+        return datetime.strptime(value, '%d-%m-%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected DD-MM-YYYY format.")
+
+def _stable_values(values: pd.Series) -> pd.Series:
+    # the same line hashes the same whether a column loads as int, float, text or categorical
+    if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype('float64')
+    return values.astype(object).where(values.notna(), None).astype(str)
+
+def history_keys(df: pd.DataFrame, source: str) -> np.ndarray:
+    """
+    one key per line that does not depend on the export's row order.
+
+    Exports have no line number, so a line is identified by its
+    HISTORY_KEY_COLUMNS and its occurrence among the requisition's lines with
+    the same values. A reordered export, or a line whose status, PO or dates
+    changed, keeps its key, so year-to-date counts stay exact. Lines of one
+    requisition with the same key columns are told apart by their order
+    only: their number is exact, but which of them carries which PR-PO may
+    swap between windows. A line whose category, type or department is
+    corrected gets a new key.
+
+    Args:
+        df: PO or RFM frame.
+        source: 'PO' or 'RFM'.
+
+    Returns:
+        string key per row, e.g. 'RQ-00000012#5f0c...#0'.
+
+    Raises:
+        ValueError: if df lacks a HISTORY_KEY_COLUMNS column.
+    """
+    columns = HISTORY_KEY_COLUMNS[source]
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Cannot key {source} history rows without the columns {', '.join(repr(c) for c in missing)}.")
+    numbers = df['Requisition Number'].astype(str).reset_index(drop=True)
+    identity = pd.util.hash_pandas_object(
+        pd.DataFrame({column: _stable_values(df[column]) for column in columns[1:]}).reset_index(drop=True), index=False
+    )
+    identity = identity.map('{:016x}'.format)
+    occurrence = numbers.groupby([numbers, identity], sort=False).cumcount()
+    return (numbers + '#' + identity + '#' + occurrence.astype(str)).to_numpy()
+
+def record_reports(
+    path: str,
+    source: str,
+    df: pd.DataFrame,
+    results: Dict[str, np.ndarray],
+    departments: List[str],
+    window_start: pd.Timestamp,
+    window_end: pd.Timestamp,
+    normalization_version: Optional[str] = None
+) -> int:
+    """
+    store the report rows of one source and window in the history database.
+
+    One row per report row: report name, department, row key (see
+    history_keys) and PR-PO where the source has it. Recording a window
+    again replaces its rows.
+
+    Args:
+        path: history database file.
+        source: 'PO' or 'RFM'.
+        df: enriched, department-assigned frame.
+        results: report name to row positions in df.
+        departments: department names, rows of other departments are stored without one.
+        window_start: window start, inclusive.
+        window_end: window end, inclusive.
+        normalization_version: snapshot version the rows were enriched with.
+
+    Returns:
+        number of rows stored.
+    """
+    with stage('history', source=source) as record:
+        keys = history_keys(df, source)
+        numbers = df['Requisition Number'].astype(str).to_numpy()
+        department = df['Department_Assigned'] if 'Department_Assigned' in df.columns else pd.Series(np.nan, index=df.index)
+        department = department.astype(object).where(department.isin(departments), None).to_numpy()
+        lead_times = df[PR_PO_COLUMN].astype(float).to_numpy() if PR_PO_COLUMN in df.columns else np.full(len(df), np.nan)
+
+        with closing(connect(path)) as connection, connection:
+            bounds = (source, window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d'))
+            connection.execute(
+                'DELETE FROM report_rows WHERE window_id IN '
+                '(SELECT id FROM windows WHERE source = ? AND window_start = ? AND window_end = ?)', bounds
+            )
+            connection.execute('DELETE FROM windows WHERE source = ? AND window_start = ? AND window_end = ?', bounds)
+            window_id = connection.execute(
+                'INSERT INTO windows (source, window_start, window_end, normalization_version, recorded_at) VALUES (?, ?, ?, ?, ?)',
+                bounds + (normalization_version, datetime.now().isoformat(timespec='seconds'))
+            ).lastrowid
+            stored = 0
+            for name, rows in results.items():
+                connection.executemany(
+                    'INSERT INTO report_rows (window_id, report, department, row_key, requisition_number, pr_po) VALUES (?, ?, ?, ?, ?, ?)',
+                    zip(
+                        [window_id] * len(rows), [name] * len(rows), department[rows].tolist(),
+                        keys[rows].tolist(), numbers[rows].tolist(),
+                        [None if np.isnan(value) else value for value in lead_times[rows].tolist()]
+                    )
+                )
+                stored += len(rows)
+        record['rows_out'] = stored
+    return stored
+
+def _query(path: str, sql: str, params: list) -> pd.DataFrame:
+    with closing(connect(path)) as connection:
+        return pd.read_sql_query(sql, connection, params=params)
+
+def _filters(report: str, start: Optional[str], end: Optional[str], department: Optional[str]):
+    # windows ending within start..end, given in DD-MM-YYYY format
+    clauses = ['r.report = ?']
+    params: list = [report]
+    if start:
+        clauses.append('w.window_end >= ?')
+        params.append(_iso(start))
+    if end:
+        clauses.append('w.window_end <= ?')
+        params.append(_iso(end))
+    if department:
+        clauses.append('r.department = ?')
+        params.append(department)
+    return ' AND '.join(clauses), params
+
+def list_windows(path: str) -> pd.DataFrame:
+    """
+    recorded windows with their number of stored rows.
+    """
+    return _query(path, """
+        SELECT w.source, w.window_start, w.window_end, w.normalization_version, w.recorded_at,
+               (SELECT COUNT(*) FROM report_rows r WHERE r.window_id = w.id) AS rows
+        FROM windows w ORDER BY w.window_end, w.source
+    """, [])
+
+def report_trend(
+    path: str,
+    report: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    department: Optional[str] = None,
+    by_department: bool = False
+) -> pd.DataFrame:
+    """
+    rows of a report per window, e.g. the weekly in-process backlog.
+
+    Args:
+        path: history database file.
+        report: report name, e.g. 'Inprocess_PO'.
+        start: first window end to include, 'DD-MM-YYYY'.
+        end: last window end to include, 'DD-MM-YYYY'.
+        department: only this department's rows.
+        by_department: one row per window and department instead of per window.
+
+    Returns:
+        window_start, window_end, (department,) rows, in window order.
+    """
+    where, params = _filters(report, start, end, department)
+    group = ', r.department' if by_department else ''
+    return _query(path, f"""
+        SELECT w.window_start, w.window_end{group}, COUNT(*) AS rows
+        FROM report_rows r JOIN windows w ON w.id = r.window_id
+        WHERE {where}
+        GROUP BY w.id{group}
+        ORDER BY w.window_end{group}
+    """, params)
+
+def year_to_date(path: str, report: str, year: Optional[int] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """
+    distinct report rows of the windows ending in a year so far, per department.
+
+    A row in several windows, e.g. of overlapping backfills, is counted once.
+
+    Args:
+        path: history database file.
+        report: report name, e.g. 'PO_Approved'.
+        year: calendar year. Defaults to the year of end, or the current year.
+        end: last window end to include, 'DD-MM-YYYY'. Defaults to the end of the year.
+
+    Returns:
+        department and rows, 'All' first.
+    """
+    if year is None:
+        year = int(_iso(end)[:4]) if end else datetime.now().year
+    where, params = _filters(report, f"01-01-{year}", end or f"31-12-{year}", None)
+    counts = _query(path, f"""
+        SELECT COALESCE(r.department, '') AS department, COUNT(DISTINCT r.row_key) AS rows
+        FROM report_rows r JOIN windows w ON w.id = r.window_id
+        WHERE {where}
+        GROUP BY r.department ORDER BY r.department
+    """, params)
+    total = _query(path, f"""
+        SELECT 'All' AS department, COUNT(DISTINCT r.row_key) AS rows
+        FROM report_rows r JOIN windows w ON w.id = r.window_id
+        WHERE {where}
+    """, params)
+    return pd.concat([total, counts[counts['department'] != '']], ignore_index=True)
+
+def lead_time_trend(
+    path: str,
+    report: str = 'PO_Approved',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    by: str = 'window'
+) -> pd.DataFrame:
+    """
+    PR-PO lead time statistics of a report per window or per department.
+
+    Args:
+        path: history database file.
+        report: report name with PR-PO, e.g. 'PO_Approved'.
+        start: first window end to include, 'DD-MM-YYYY'.
+        end: last window end to include, 'DD-MM-YYYY'.
+        by: 'window' for one row per window, 'department' for one row per
+            department over all the windows, each row counted once.
+
+    Returns:
+        rows with a lead time, and median, p90 and mean PR-PO in days.
+    """
+    if by not in ('window', 'department'):
+        raise ValueError(f"Unknown grouping '{by}', expected window or department.")
+    where, params = _filters(report, start, end, None)
+    rows = _query(path, f"""
+        SELECT w.window_start, w.window_end, r.department, r.row_key, r.pr_po
+        FROM report_rows r JOIN windows w ON w.id = r.window_id
+        WHERE {where} AND r.pr_po IS NOT NULL
+        ORDER BY w.window_end
+    """, params)
+    if by == 'department':
+        # latest value of each row
+        rows = rows.drop_duplicates('row_key', keep='last')
+        rows = pd.concat([rows.assign(department='All'), rows.dropna(subset=['department'])], ignore_index=True)
+        keys = ['department']
+    else:
+        keys = ['window_start', 'window_end']
+    grouped = rows.groupby(keys, sort=False)['pr_po']
+    summary = grouped.agg(['count', 'median', 'mean'])
+    summary.insert(2, 'p90', grouped.quantile(0.9))
+    summary = summary.rename(columns={'count': 'rows with PR-PO', 'median': 'median PR-PO', 'p90': 'p90 PR-PO', 'mean': 'mean PR-PO'})
+    return summary.round(2).reset_index()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the weekly report history recorded with --history.")
+    parser.add_argument("--db", required=True, help="History database file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    windows = commands.add_parser("windows", help="Recorded windows.")
+
+    trend = commands.add_parser("trend", help="Rows of a report per window, e.g. the in-process backlog.")
+    trend.add_argument("--report", required=True, help="Report name, e.g. Inprocess_PO.")
+    trend.add_argument("--department", help="Only this department.")
+    trend.add_argument("--by-department", action="store_true", help="One row per window and department.")
+
+    ytd = commands.add_parser("ytd", help="Distinct rows of a report this year so far, per department.")
+    ytd.add_argument("--report", required=True, help="Report name, e.g. PO_Approved.")
+    ytd.add_argument("--year", type=int, help="Calendar year (default: current).")
+
+    lead_time = commands.add_parser("lead-time", help="PR-PO lead time statistics per window or department.")
+    lead_time.add_argument("--report", default="PO_Approved", help="Report name with PR-PO (default PO_Approved).")
+    lead_time.add_argument("--by", choices=["window", "department"], default="window", help="Grouping (default window).")
+
+    for command in (trend, ytd, lead_time):
+        command.add_argument("--end", help="Last window end to include, DD-MM-YYYY.")
+    for command in (trend, lead_time):
+        command.add_argument("--start", help="First window end to include, DD-MM-YYYY.")
+    for command in (windows, trend, ytd, lead_time):
+        command.add_argument("--csv", action="store_true", help="Print csv instead of a table.")
+    args = parser.parse_args()
+
+    elapsed = time.perf_counter()
+    if args.command == "windows":
+        result = list_windows(args.db)
+    elif args.command == "trend":
+        result = report_trend(args.db, args.report, args.start, args.end, args.department, args.by_department)
+    elif args.command == "ytd":
+        result = year_to_date(args.db, args.report, args.year, args.end)
+    else:
+        result = lead_time_trend(args.db, args.report, args.start, args.end, args.by)
+    elapsed = time.perf_counter() - elapsed
+
+    if args.csv:
+        print(result.to_csv(index=False), end='')
+    else:
+        print(result.to_string(index=False))
+        print(f"({len(result)} rows, {elapsed * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,298 @@
 import pandas as pd
+import numpy as np
+import glob
+import multiprocessing
 import os
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Tuple, Union
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+from app.cache import DEFAULT_CACHE_DIR, HAS_PYARROW, cache_key, has_cached_frame, read_cached_frame, write_cached_frame
 
-def load_excel_data(file_path: str, sheet_name: Optional[str] = 0) -> pd.DataFrame:
+# dtype plan: columns the processor reads, with the dtype they are converted to at load.
+# 'date' -> datetime64, 'category' -> categorical, 'string' -> kept as text.
+PO_SCHEMA: Dict[str, str] = {
+    'Requisition Number': 'string',
+    'Item Category': 'category',
+    'Requisition Type': 'category',
+    'Department': 'category',
+    'Procurement Name': 'category',
+    'Requisition Approved Date': 'date',
+    'Requisition Required Date': 'date',
+    'Requisition Status': 'category',
+    'PO Approval Date': 'date',
+}
+
+RFM_SCHEMA: Dict[str, str] = {
+    'Requisition Number': 'string',
+    'Item Category': 'category',
+    'Requisition Type': 'category',
+    'Project': 'category',
+    'Procurement Name': 'category',
+    'Requisition Approved Date': 'date',
+    'Requisition Required Date': 'date',
+    'Requisition Status': 'category',
+}
+
+# PO_SCHEMA columns a PO export may lack, they are added empty at load: no PO
+# report filters on the status, and the required date is only read without
+# normalization data
+PO_OPTIONAL_COLUMNS: List[str] = ['Requisition Status', 'Requisition Required Date']
+
+# identifies the lines of a requisition across exports of a source, with their
+# position within the requisition as in app.state.row_keys
+LINE_KEY_COLUMN = 'Requisition Number'
+# provenance column added when a source is read from several exports
+SOURCE_FILE_COLUMN = 'Source File'
+
+# a path, a glob pattern, or a list of either
+InputFiles = Union[str, List[str]]
+
+# strings read_excel treats as missing by default
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+def _header_names(row: tuple) -> List[str]:
+    """
+    column names from the header row, following read_excel naming for blanks and duplicates.
+    """
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for idx, value in enumerate(row):
+        name = f"Unnamed: {idx}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _convert_column(values: list, kind: Optional[str]) -> pd.Series:
+    """
+    build one column of a chunk with its declared dtype.
+
+    Args:
+        values: raw cell values from openpyxl.
+        kind: 'date', 'category', 'string' or None for pass-through columns.
+
+    Returns:
+        converted series.
+    """
+    values = [None if isinstance(v, str) and v.strip() in NA_STRINGS else v for v in values]
+    series = pd.Series(values)
+
+    # integral floats come back as ints, as in read_excel
+    if series.dtype == 'float64' and series.notna().all() and (series % 1 == 0).all():
+        series = series.astype('int64')
+
+    if kind == 'category':
+        return series.astype('category')
+    if kind == 'date' and series.dtype == object:
+        non_null = series.dropna()
+        # text dates are left for the processor to coerce
+        if all(isinstance(v, date) for v in non_null):
+            return pd.to_datetime(series)
+        return series
+    if kind is None and HAS_PYARROW and series.dtype == object:
+        non_null = series.dropna()
+        if len(non_null) and all(isinstance(v, str) for v in non_null):
+            # arrow-backed text instead of one python object per cell
+            return series.astype('string[pyarrow]')
+    return series
+
+def apply_dtype_plan(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    convert a frame loaded with read_excel to the declared dtypes.
+
+    Category columns become categoricals, date columns holding only dates
+    become datetime64. Text dates are left for the processor to coerce, as
+    in load_excel_streaming. Columns are replaced in place.
+
+    Args:
+        df: loaded dataframe.
+        schema: column name to kind, see PO_SCHEMA / RFM_SCHEMA.
+
+    Returns:
+        the same dataframe.
+    """
+    for name, kind in schema.items():
+        if name not in df.columns:
+            continue
+        column = df[name]
+        if kind == 'category' and not isinstance(column.dtype, pd.CategoricalDtype):
+            df[name] = column.astype('category')
+        elif kind == 'date' and column.dtype == object:
+            if all(isinstance(v, date) for v in column.dropna()):
+                df[name] = pd.to_datetime(column)
+    return df
+
+def read_excel_header(
+    file_path: str,
+    sheet_name: Optional[str] = 0,
+    sample_rows: int = 0
+) -> Tuple[List[str], List[str], List[tuple]]:
+    """
+    read the sheet list, header row and first data rows of a workbook.
+
+    Only the requested rows are parsed, through openpyxl's read-only reader.
+
+    Args:
+        file_path: path to file.
+        sheet_name: sheet name or index. Defaults to 0 (first sheet).
+        sample_rows: data rows to return after the header.
+
+    Returns:
+        (sheet names, column names as read_excel names them, data rows).
+
+    Raises:
+        ValueError: if the file is not a readable workbook or the sheet does not exist.
+    """
+    try:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Error reading file {file_path}: {e}")
+    try:
+        sheet_names = wb.sheetnames
+        if isinstance(sheet_name, int):
+            if sheet_name >= len(wb.worksheets):
+                raise ValueError(f"{file_path} has no sheet {sheet_name}, sheets: {sheet_names}")
+            ws = wb.worksheets[sheet_name]
+        elif sheet_name in sheet_names:
+            ws = wb[sheet_name]
+        else:
+            raise ValueError(f"{file_path} has no sheet '{sheet_name}', sheets: {sheet_names}")
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        names = _header_names(header) if header is not None else []
+        sample: List[tuple] = []
+        for row in rows:
+            if len(sample) >= sample_rows:
+                break
+            if any(v is not None for v in row):
+                sample.append(tuple(row[:len(names)]) + (None,) * (len(names) - len(row)))
+    finally:
+        wb.close()
+    return sheet_names, names, sample
+
+def _union_categories(parts: List[pd.Series]) -> pd.Categorical:
+    """
+    combine the categorical chunks of one column.
+
+    Each chunk infers its own category dtype, e.g. object for an all-empty
+    chunk or mixed numbers and text, str otherwise, which union_categoricals
+    rejects. The chunks are combined with object categories and the dtype is
+    inferred once over all of them, as astype('category') does on the whole
+    column.
+    """
+    combined = union_categoricals([part.cat.rename_categories(part.cat.categories.astype(object)) for part in parts])
+    return pd.Categorical.from_codes(combined.codes, categories=pd.Index(list(combined.categories)))
+
+def load_excel_streaming(
+    file_path: str,
+    schema: Dict[str, str],
+    sheet_name: Optional[str] = 0,
+    chunk_size: int = 50000
+) -> pd.DataFrame:
+    """
+    stream excel data from cps in chunks with declared dtypes.
+
+    Rows are read through openpyxl's read-only reader so only one chunk
+    of python cell objects is alive at a time. Columns named in the schema
+    are parsed as they are read, the rest are kept in compact dtypes.
+
+    Args:
+        file_path: path to file.
+        schema: column name to kind, see PO_SCHEMA / RFM_SCHEMA.
+        sheet_name: sheet name or index. Defaults to 0 (first sheet).
+        chunk_size: rows converted per step.
+
+    Returns:
+        loaded dataframe.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        names = _header_names(header)
+        kinds = [schema.get(name) for name in names]
+        parts: List[List[pd.Series]] = [[] for _ in names]
+
+        def flush(chunk: List[tuple]):
+            for idx, values in enumerate(zip(*chunk)):
+                parts[idx].append(_convert_column(list(values), kinds[idx]))
+
+        chunk: List[tuple] = []
+        for row in rows:
+            # blank rows are skipped, as in read_excel
+            if all(v is None for v in row):
+                continue
+            row = tuple(row[:len(names)]) + (None,) * (len(names) - len(row))
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        wb.close()
+
+    columns: Dict[str, pd.Series] = {}
+    for name, kind, column_parts in zip(names, kinds, parts):
+        if not column_parts:
+            columns[name] = pd.Series([], dtype=object)
+        elif kind == 'category':
+            columns[name] = pd.Series(_union_categories(column_parts))
+        else:
+            columns[name] = pd.concat(column_parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+def _load_cache_key(file_path: str, sheet_name, schema: Optional[Dict[str, str]], streaming: bool) -> str:
+    # the same sheet parsed with another dtype plan or reader is cached separately
+    return cache_key(file_path, sheet_name, variant=repr((streaming, sorted(schema.items()))) if schema else '')
+
+def is_cached(
+    file_path: str,
+    sheet_name: Optional[str] = 0,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    schema: Optional[Dict[str, str]] = None,
+    streaming: bool = False
+) -> bool:
+    """
+    whether load_excel_data would load the file from the cache.
+
+    Args: see load_excel_data.
+    """
+    return os.path.exists(file_path) and has_cached_frame(_load_cache_key(file_path, sheet_name, schema, streaming), cache_dir)
+
+def load_excel_data(
+    file_path: str,
+    sheet_name: Optional[str] = 0,
+    use_cache: bool = True,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    schema: Optional[Dict[str, str]] = None,
+    streaming: bool = False
+) -> pd.DataFrame:
     """
     load excel data from cps.
+
+    Parsed sheets are cached by file content, size, mtime and sheet name,
+    so re-running an unchanged export skips the xlsx parse.
     
     Args:
         file_path: path to file.
         sheet_name: sheet name or index. Defaults to 0 (first sheet).
+        use_cache: read from and write to the local cache.
+        cache_dir: cache location.
+        schema: optional dtype plan, see PO_SCHEMA / RFM_SCHEMA. Low-cardinality
+            columns become categoricals and date columns datetime64 at load.
+        streaming: read the sheet in chunks with load_excel_streaming, needs schema.
         
     Returns:
         loaded dataframe.
@@ -20,9 +304,194 @@ def load_excel_data(file_path: str, sheet_name: Optional[str] = 0) -> pd.DataFra
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
+    key = None
+    if use_cache:
+        key = _load_cache_key(file_path, sheet_name, schema, streaming)
+        df = read_cached_frame(key, cache_dir)
+        if df is not None:
+            print(f"Loaded from cache: {file_path}")
+            return df
+
     try:
         print(f"Loading file: {file_path}")
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
-        return df
+        if schema is not None and streaming:
+            df = load_excel_streaming(file_path, schema, sheet_name=sheet_name)
+        else:
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
+            if schema is not None:
+                df = apply_dtype_plan(df, schema)
     except Exception as e:
         raise ValueError(f"Error reading file {file_path}: {e}")
+
+    if key is not None:
+        try:
+            write_cached_frame(key, df, cache_dir)
+        except OSError as e:
+            print(f"Warning: Could not write cache for {file_path}: {e}")
+    return df
+
+def header_key(name) -> str:
+    """
+    column name as matched against schemas, ignoring surrounding spaces and case.
+    """
+    return str(name).strip().casefold()
+
+def resolve_input_files(files: InputFiles) -> List[str]:
+    """
+    paths of one source's exports.
+
+    Args:
+        files: a path, a glob pattern such as 'exports/PO_*.xlsx', or a list
+            of either. An existing path is taken as is even if it contains
+            glob characters, e.g. 'PO [HO].xlsx'. Glob matches are sorted by name.
+
+    Returns:
+        paths in the given order, without repeats.
+
+    Raises:
+        FileNotFoundError: if a pattern matches nothing or no file is given.
+    """
+    patterns = [files] if isinstance(files, str) else list(files)
+    paths: List[str] = []
+    for pattern in patterns:
+        if not os.path.exists(pattern) and any(char in pattern for char in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No files match {pattern}")
+            paths += matches
+        else:
+            paths.append(pattern)
+    if not paths:
+        raise FileNotFoundError("No input files given.")
+    return list(dict.fromkeys(paths))
+
+def _load_file(args: tuple) -> pd.DataFrame:
+    # one export in a worker process, see load_excel_files
+    file_path, use_cache, schema, streaming = args
+    return load_excel_data(file_path, use_cache=use_cache, schema=schema, streaming=streaming)
+
+def _align_columns(frames: List[pd.DataFrame], schema: Optional[Dict[str, str]]) -> List[pd.DataFrame]:
+    """
+    give the frames of one source the same columns and category dtypes.
+
+    Headers differing only in surrounding spaces or case are renamed to the
+    schema's, or the first export's, spelling. Missing columns, and schema
+    columns no export has, are added empty.
+    """
+    spelling: Dict[str, str] = {}
+    for name in list(schema or {}) + [name for df in frames for name in df.columns]:
+        spelling.setdefault(header_key(name), name)
+    frames = [
+        df.rename(columns=lambda name: spelling[header_key(name)])
+        if any(spelling[header_key(name)] != name for name in df.columns) else df
+        for df in frames
+    ]
+
+    columns = list(dict.fromkeys([name for df in frames for name in df.columns] + list(schema or {})))
+    frames = [df.reindex(columns=columns) if list(df.columns) != columns else df for df in frames]
+    for name in columns:
+        dtypes = [df[name].dtype for df in frames]
+        if any(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            # shared categories keep the column categorical through concat
+            categories = pd.Index(pd.unique(np.concatenate(
+                [df[name].astype('category').cat.categories.to_numpy(dtype=object) for df in frames]
+            )))
+            frames = [df.assign(**{name: df[name].astype(pd.CategoricalDtype(categories))}) for df in frames]
+    return frames
+
+def drop_repeated_lines(df: pd.DataFrame, file_index: np.ndarray) -> Tuple[pd.DataFrame, int]:
+    """
+    keep each requisition's lines from the last export that has it.
+
+    Lines are identified as in app.state.row_keys, by requisition number and
+    position within the requisition. Positions only line up within one
+    export, so a requisition found in several exports takes all its lines
+    from the latest one: a line updated in between is kept once, as
+    exported last, and a line no longer exported is dropped. Rows without a
+    requisition number are kept.
+
+    Args:
+        df: merged exports.
+        file_index: position of each row's export, oldest first.
+
+    Returns:
+        (deduplicated frame, number of rows dropped).
+
+    Raises:
+        ValueError: if the exports have no LINE_KEY_COLUMN.
+    """
+    if LINE_KEY_COLUMN not in df.columns:
+        raise ValueError(f"Cannot merge exports without a '{LINE_KEY_COLUMN}' column.")
+    numbers = df[LINE_KEY_COLUMN]
+    last = pd.Series(file_index, index=df.index).groupby(numbers, sort=False, observed=True).transform('max')
+    keep = numbers.isna().to_numpy() | (file_index == last.to_numpy())
+    if keep.all():
+        return df, 0
+    return df[keep].reset_index(drop=True), int((~keep).sum())
+
+def load_excel_files(
+    files: InputFiles,
+    use_cache: bool = True,
+    schema: Optional[Dict[str, str]] = None,
+    streaming: bool = False,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    load and merge the exports of one source, e.g. one per site or month.
+
+    A single export loads as in load_excel_data, with its headers spelled
+    as in the schema (see _align_columns). Several are read in
+    parallel worker processes where the platform can fork, given the same
+    columns (see _align_columns), concatenated by modification time (input
+    order among equal times) and deduplicated with drop_repeated_lines, so a
+    requisition exported twice comes from the newer export whatever the
+    file names. The file each row comes from is kept in SOURCE_FILE_COLUMN.
+
+    Args:
+        files: path, glob pattern or list, see resolve_input_files.
+        use_cache: see load_excel_data, each export is cached on its own.
+        schema: see load_excel_data.
+        streaming: see load_excel_data.
+        max_workers: processes reading exports. Defaults to one per export,
+            capped at the cpu count.
+
+    Returns:
+        merged dataframe.
+
+    Raises:
+        FileNotFoundError: if an export is not found.
+        ValueError: if an export cannot be read.
+    """
+    paths = resolve_input_files(files)
+    if len(paths) == 1:
+        df = load_excel_data(paths[0], use_cache=use_cache, schema=schema, streaming=streaming)
+        return _align_columns([df], schema)[0]
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+    # oldest export first, so drop_repeated_lines keeps the newest
+    paths = sorted(paths, key=lambda path: os.stat(path).st_mtime_ns)
+
+    if max_workers is None:
+        max_workers = min(len(paths), os.cpu_count() or 1)
+    jobs = [(path, use_cache, schema, streaming) for path in paths]
+    if max_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            frames = list(executor.map(_load_file, jobs))
+    else:
+        frames = [_load_file(job) for job in jobs]
+
+    file_index = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    frames = _align_columns(frames, schema)
+    df = pd.concat(frames, ignore_index=True)
+    # file names, full paths where two exports share a name
+    names = [os.path.basename(path) for path in paths]
+    labels = names if len(set(names)) == len(names) else paths
+    df[SOURCE_FILE_COLUMN] = pd.Categorical.from_codes(file_index, categories=labels)
+    if schema is not None:
+        # dates stored as text in some exports
+        df = apply_dtype_plan(df, schema)
+    df, dropped = drop_repeated_lines(df, file_index)
+    print(f"Merged {len(paths)} files: {len(df)} rows, {dropped} lines of requisitions in a later export dropped")
+    return df
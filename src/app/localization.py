@@ -1,49 +1,142 @@
 import pandas as pd
-from typing import Dict, List, Optional
+import numpy as np
+import json
+import re
+from typing import Dict, List, Optional, Tuple
 
-# define pic list, name in list with / is from rfm name in 
+# define pic list, name in list with / is from rfm name in
 pic_OBI: List[str] = ['Rona / Joko', 'Joko', 'Victo', 'Rakan', 'Rona Justhafist', 'Rona / Victo / Rakan / Joko']
 pic_LAR: List[str] = ['Fairus / Irwan', 'Fairus Mubakri', 'Irwan', 'Ady', 'Fairus / Ady']
 pic_HO: List[str] = ['Linda / Puji / Syifa R / Stheven', 'Syifa Ramadhani', 'Syifa Alifia', 'Rizal Agus Fianto',
       'Auriel', 'Puji Astuti', 'Linda Permata Sari']
 
-def assign_department(df: pd.DataFrame) -> pd.DataFrame:
+# department -> pic names, in match priority order
+DEPARTMENT_PICS: Dict[str, List[str]] = {'OBI': pic_OBI, 'LAR': pic_LAR, 'HO': pic_HO}
+
+DepartmentPatterns = List[Tuple[str, re.Pattern]]
+
+def load_pic_config(path: str) -> Dict[str, List[str]]:
+    """
+    load department pic lists from a json file.
+
+    The file maps department name to a list of pic names, e.g.
+    {"OBI": ["Joko", "Victo"], "LAR": ["Irwan"], "HO": ["Auriel"]}.
+    Key order is the match priority.
+
+    Args:
+        path: path to json file.
+
+    Returns:
+        department to pic names.
+
+    Raises:
+        ValueError: if the file is not a mapping of names to string lists.
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    if not isinstance(config, dict) or not all(
+        isinstance(names, list) and all(isinstance(n, str) for n in names) for names in config.values()
+    ):
+        raise ValueError(f"PIC config {path} must map department names to lists of PIC names.")
+    return config
+
+def compile_department_patterns(departments: Optional[Dict[str, List[str]]] = None) -> DepartmentPatterns:
+    """
+    compile one substring matcher per department.
+
+    Args:
+        departments: department to pic names. Defaults to DEPARTMENT_PICS.
+
+    Returns:
+        (department, compiled alternation) pairs in priority order.
+    """
+    if departments is None:
+        departments = DEPARTMENT_PICS
+    return [
+        (dept, re.compile('|'.join(re.escape(n) for n in names)))
+        for dept, names in departments.items() if names
+    ]
+
+def assign_department(df: pd.DataFrame, patterns: Optional[DepartmentPatterns] = None) -> pd.DataFrame:
     """
     assign dept based on procurement name.
-    
+
+    Each distinct name is matched once, first department in priority
+    order wins, and the result is mapped back to rows by category code.
+
     Args:
         df: input po dataframe.
-        
+        patterns: output of compile_department_patterns. Defaults to DEPARTMENT_PICS.
+
     Returns:
-        df with 'Department_Assigned' column.
-    """
-    def get_dept(name):
-        if pd.isna(name): return None
-        for dept, names in [('OBI', pic_OBI), ('LAR', pic_LAR), ('HO', pic_HO)]:
-            if any(n in name for n in names):
-                return dept
-        return None
-    
-    df = df.copy()
-    df['Department_Assigned'] = df['Procurement Name'].apply(get_dept)
+        shallow copy of df with categorical 'Department_Assigned' column.
+    """
+    if patterns is None:
+        patterns = compile_department_patterns()
+    departments = [dept for dept, _ in patterns]
+
+    codes, uniques = pd.factorize(df['Procurement Name'])
+    unique_names = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    unique_codes = np.full(len(unique_names), -1, dtype=np.int64)
+    for dept_code, (_, pattern) in enumerate(patterns):
+        unassigned = unique_codes == -1
+        if not unassigned.any():
+            break
+        hits = unique_names[unassigned].str.contains(pattern, na=False).to_numpy(dtype=bool)
+        unique_codes[np.flatnonzero(unassigned)[hits]] = dept_code
+
+    # missing names keep factorize code -1, which stays unassigned
+    row_codes = np.full(len(codes), -1, dtype=np.int64)
+    named = codes != -1
+    row_codes[named] = unique_codes[codes[named]]
+
+    df = df.copy(deep=False)
+    df['Department_Assigned'] = pd.Categorical.from_codes(row_codes, categories=departments)
     return df
 
-def split_by_department(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+def split_by_department(df: pd.DataFrame, departments: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
     """
     split df by department.
-    
+
     Args:
         df: input po dataframe.
-        
+        departments: department names in output order. Defaults to DEPARTMENT_PICS order.
+
     Returns:
         dictionary where keys are department names and values are df.
     """
-    result: Dict[str, pd.DataFrame] = {}
-    for dept in ['OBI', 'LAR', 'HO']:
-        if 'Department_Assigned' not in df.columns:
-             return {}
-             
-        df_dept = df[df['Department_Assigned'] == dept].drop(columns='Department_Assigned')
-        if not df_dept.empty:
-            result[dept] = df_dept
+    # one take per department, rows and columns in the same step
+    columns = [idx for idx, name in enumerate(df.columns) if name != 'Department_Assigned']
+    return {
+        dept: df.iloc[rows, columns]
+        for dept, rows in split_rows_by_department(df, np.arange(len(df)), departments).items()
+    }
+
+def split_rows_by_department(df: pd.DataFrame, rows: np.ndarray, departments: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    split row positions by department, without copying df.
+
+    Args:
+        df: dataframe with categorical 'Department_Assigned' from assign_department.
+        rows: row positions of a report.
+        departments: department names in output order. Defaults to DEPARTMENT_PICS order.
+
+    Returns:
+        dictionary where keys are department names and values are non-empty row positions.
+    """
+    if departments is None:
+        departments = list(DEPARTMENT_PICS)
+    if 'Department_Assigned' not in df.columns:
+        return {}
+
+    assigned = df['Department_Assigned'].cat
+    codes = assigned.codes.to_numpy()[rows]
+    result: Dict[str, np.ndarray] = {}
+    for dept in departments:
+        if dept not in assigned.categories:
+            continue
+        dept_rows = rows[codes == assigned.categories.get_loc(dept)]
+        if len(dept_rows):
+            result[dept] = dept_rows
     return result
@@ -1,10 +1,22 @@
 import argparse
+import logging
 import os
 import sys
+import traceback
 import pandas as pd
-from app.processor import process_procurement_data #added app for ingestion
+from app.loader import InputFiles, resolve_input_files
+from app.processor import process_procurement_backfill, process_procurement_data, weekly_windows #added app for ingestion
 from app.styler import style_and_reorder_excel_by_process #added app for ingestion
-from typing import Optional
+from app.cache import clear_cache
+from app.localization import load_pic_config
+from app.normalization import DEFAULT_NORMALIZATION_TTL, load_normalization
+from app.metrics import PROFILERS, finish_run, format_summary, stage, start_run, write_metrics_json
+from app.preflight import check_normalization, check_sources, format_problems, preflight
+from app.reports import REPORTS, load_report_config
+from app.sinks import DEFAULT_SINKS, SINKS, validate_sinks
+from app.service import DEFAULT_DEBOUNCE, DEFAULT_PAIR_WAIT, DEFAULT_PORT, DEFAULT_QUEUE_SIZE, serve
+from app.state import DEFAULT_STATE_DIR
+from typing import List, Optional, Tuple
 
 def get_input(prompt: str, required: bool = True) -> Optional[str]:
     while True:
@@ -15,102 +27,387 @@ def get_input(prompt: str, required: bool = True) -> Optional[str]:
             return None
         print("This field is required.")
 
+def parse_windows(value: str) -> List[Tuple[str, str]]:
+    """
+    parse 'START:END,START:END' into a list of windows.
+    """
+    windows = []
+    for item in value.split(','):
+        start, sep, end = item.strip().partition(':')
+        if not sep or not start or not end:
+            raise ValueError(f"Invalid window '{item}', expected START:END in DD-MM-YYYY format.")
+        windows.append((start, end))
+    return windows
+
+def profile_dir_for(po_file: InputFiles, output_dir: Optional[str]) -> str:
+    """
+    profiler output folder: '<output_dir>/profile', or next to the PO export.
+
+    Taken from the given path or pattern without resolving it, so a missing
+    export is reported by the run, with its metrics.
+    """
+    if output_dir:
+        return os.path.join(output_dir, 'profile')
+    first = po_file if isinstance(po_file, str) else (po_file[0] if po_file else '')
+    directory = os.path.dirname(first)
+    while any(char in directory for char in '*?['):
+        directory = os.path.dirname(directory)
+    return os.path.join(directory, 'profile')
+
+def check_inputs(
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    normalization_source: Optional[str] = None,
+    offline: bool = False,
+    normalization_ttl: int = DEFAULT_NORMALIZATION_TTL
+) -> List[str]:
+    """
+    check the PO, RFM and normalization inputs without processing them.
+
+    Only headers and the first rows of the exports are read, see app.preflight.
+    Normalization data is loaded like in run, through the snapshot cache.
+
+    Returns:
+        every problem found, empty when all inputs pass.
+    """
+    try:
+        normalization, _ = load_normalization(normalization_source, offline=offline, ttl=normalization_ttl)
+    except (OSError, ValueError) as e:
+        return preflight(po_file, rfm_file) + [f"Normalization data: {e}"]
+    return preflight(po_file, rfm_file, normalization)
+
 def run(
-    po_file: str,
-    rfm_file: str,
-    start_date: str,
-    end_date: str,
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    start_date: Optional[str],
+    end_date: Optional[str],
     normalization_file: Optional[pd.DataFrame] = None,
-    output_dir: Optional[str] = None
+    output_dir: Optional[str] = None,
+    legacy_styling: bool = False,
+    use_cache: bool = True,
+    streaming: bool = False,
+    pic_config: Optional[str] = None,
+    normalization_source: Optional[str] = None,
+    offline: bool = False,
+    normalization_ttl: int = DEFAULT_NORMALIZATION_TTL,
+    cadence_days: Optional[int] = None,
+    windows: Optional[List[Tuple[str, str]]] = None,
+    max_workers: Optional[int] = None,
+    report_config: Optional[str] = None,
+    profile: Optional[str] = None,
+    metrics_json: Optional[str] = None,
+    incremental: bool = False,
+    sinks: Optional[List[str]] = None,
+    pr_po_formulas: bool = False,
+    normalization_version: Optional[str] = None,
+    history: Optional[str] = None
 ):
     """
     Programmatic entry point for processing procurement data.
-    """
-    # Validate input files
-    if not os.path.exists(po_file):
-        raise FileNotFoundError(f"PO file not found at {po_file}")
-    if not os.path.exists(rfm_file):
-        raise FileNotFoundError(f"RFM file not found at {rfm_file}")
-
-    # Create output directory if it doesn't exist
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # Use default normalization file if not provided
-    if normalization_file is None:
-        try:
-            normalization_file = pd.read_csv(f'https://docs.google.com/spreadsheets/d/1EZ7kPPvnRqvR5UN0Vi0NNLpLTNXEArzRklsVTIGb1vc/gviz/tq?tqx=out:csv&gid=0')
-        except Exception as e:
-            print(f"Warning: Could not fetch normalization file: {e}")
-            normalization_file = None
 
+    po_file and rfm_file take a path, a glob pattern or a list of paths,
+    e.g. one export per site or month. Several exports of a source are read
+    in parallel and merged, see app.loader.load_excel_files.
+
+    Workbooks are styled while they are written. Set legacy_styling to
+    write plain workbooks and style them afterwards with openpyxl.
+    Parsed PO/RFM inputs are cached locally unless use_cache is False.
+    Set streaming to read large exports in chunks with declared dtypes.
+    Set incremental to enrich only rows that changed since the last run,
+    reusing the rest from the requisition state store (see app.state), and
+    to keep outputs of a window already written from the same rows.
+    sinks lists the output formats ('excel', 'parquet', 'csv', 'sqlite',
+    see app.sinks), excel only by default. PR-PO lead times are written as
+    values, pr_po_formulas writes them as formulas with the values cached.
+    history is an optional sqlite file every window's report rows are
+    appended to, queried with app.history for year-to-date and trend figures.
+    pic_config is an optional json file of department PIC names, and
+    report_config an optional json file of report definitions (see app.reports).
+
+    When normalization_file is not given, normalization data is loaded from
+    normalization_source (google sheet by default, a local csv/xlsx, or
+    'snapshot:<version>'). Remote data is cached for normalization_ttl
+    seconds, and offline serves it from cached snapshots only. Pass
+    normalization_version with a given normalization_file to record its
+    snapshot version in the outputs.
+
+    Backfill: pass windows, a list of (start, end) dates, or cadence_days to
+    split start_date..end_date into windows of that many days. Inputs are
+    loaded once, each window is written to its own '<start>_<end>' folder
+    using up to max_workers processes, and a list of outputs is returned.
+    For a single window, max_workers of 2 or more runs the PO and RFM
+    pipelines concurrently.
+
+    Every stage's wall time, cpu time, peak RSS growth, row counts and bytes
+    written are recorded (see app.metrics). metrics_json saves them, with the
+    run status, to a json file, also when the run fails. profile ('cprofile'
+    or 'pyinstrument') profiles the hot stages into '<output_dir>/profile'
+    and prints a stage summary.
+
+    Before anything is loaded, the headers and first rows of the inputs are
+    checked against their schemas (see app.preflight), and a ValueError
+    listing every problem is raised if any fails, e.g. a missing column.
+    Sampled date cells that do not parse are printed as warnings, the run
+    coerces them to NaT. Exports found in the input cache are not checked
+    again.
+    """
+    profile_dir = profile_dir_for(po_file, output_dir) if profile else None
+    collector = start_run(
+        profile, profile_dir,
+        po_file=po_file, rfm_file=rfm_file, start_date=start_date, end_date=end_date,
+        windows=windows, cadence_days=cadence_days, output_dir=output_dir, max_workers=max_workers
+    )
+    output_files = None
+    error = None
     try:
+        if windows is None and cadence_days is not None:
+            windows = weekly_windows(start_date, end_date, cadence_days)
+
+        # Validate input files
+        po_file = resolve_input_files(po_file)
+        rfm_file = resolve_input_files(rfm_file)
+        for path in po_file:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"PO file not found at {path}")
+        for path in rfm_file:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"RFM file not found at {path}")
+
+        # Check headers before the slow load, exports already in the input cache loaded before.
+        # Sampled dates that do not parse are only warned about, the run coerces them to NaT.
+        date_warnings: List[str] = []
+        with stage('preflight'):
+            problems = (
+                check_sources('PO', po_file, skip_cached=use_cache, streaming=streaming, warnings=date_warnings)
+                + check_sources('RFM', rfm_file, skip_cached=use_cache, streaming=streaming, warnings=date_warnings)
+            )
+
+        # Create output directory if it doesn't exist
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        sinks = validate_sinks(sinks) if sinks else DEFAULT_SINKS
+        departments = load_pic_config(pic_config) if pic_config else None
+        reports = load_report_config(report_config) if report_config else None
+        if pr_po_formulas:
+            reports = [{**report, 'pr_po': 'formula'} if report.get('pr_po') else report for report in reports or REPORTS]
+
+        # Use default normalization file if not provided
+        if normalization_file is None:
+            with stage('normalization'):
+                normalization_file, normalization_info = load_normalization(
+                    normalization_source, offline=offline, ttl=normalization_ttl
+                )
+            if normalization_info is not None:
+                normalization_version = normalization_info['version']
+        problems += check_normalization(normalization_file, warnings=date_warnings)
+        for warning in date_warnings:
+            print(f"Warning: {warning}")
+        if problems:
+            raise ValueError(format_problems(problems))
+
         # Process data
         print("Starting data processing...")
-        output_files = process_procurement_data(
-            po_file=po_file,
-            rfm_file=rfm_file,
-            datestart=start_date,
-            dateend=end_date,
-            normalization_file=normalization_file,
-            output_dir=output_dir
-        )
+        if windows is not None:
+            output_files = process_procurement_backfill(
+                po_file=po_file,
+                rfm_file=rfm_file,
+                windows=windows,
+                normalization_file=normalization_file,
+                output_dir=output_dir,
+                style_inline=not legacy_styling,
+                use_cache=use_cache,
+                streaming=streaming,
+                departments=departments,
+                normalization_version=normalization_version,
+                max_workers=max_workers,
+                reports=reports,
+                incremental=incremental,
+                sinks=sinks,
+                history=history
+            )
+        else:
+            output_files = process_procurement_data(
+                po_file=po_file,
+                rfm_file=rfm_file,
+                datestart=start_date,
+                dateend=end_date,
+                normalization_file=normalization_file,
+                output_dir=output_dir,
+                style_inline=not legacy_styling,
+                use_cache=use_cache,
+                streaming=streaming,
+                departments=departments,
+                normalization_version=normalization_version,
+                max_workers=max_workers or 1,
+                reports=reports,
+                incremental=incremental,
+                sinks=sinks,
+                history=history
+            )
         
         # Style files
-        print("Starting file styling...")
-        style_and_reorder_excel_by_process(output_files['po_output_path'])
-        style_and_reorder_excel_by_process(output_files['rfm_output_path'])
+        if legacy_styling and 'excel' in sinks:
+            print("Starting file styling...")
+            for window_files in (output_files if windows is not None else [output_files]):
+                for path in (window_files['po_outputs']['excel'], window_files['rfm_outputs']['excel']):
+                    with stage('style_legacy', output=path) as record:
+                        style_and_reorder_excel_by_process(path, reports)
+                        record['bytes_written'] = os.path.getsize(path)
         
         print("Processing completed successfully.")
         return output_files
         
     except Exception as e:
+        error = e
         print(f"An error occurred: {e}")
         raise
+    finally:
+        report = finish_run(collector, error)
+        report['outputs'] = output_files
+        if metrics_json:
+            write_metrics_json(metrics_json, report)
+            print(f"Run metrics saved: {metrics_json}")
+        if profile:
+            print(format_summary(report))
+            print(f"Profiles saved in: {profile_dir}")
 
 def main():
     parser = argparse.ArgumentParser(description="Process procurement data for weekly reporting.")
     
-    parser.add_argument("--po-file", help="Path to the PO Excel file.")
-    parser.add_argument("--rfm-file", help="Path to the RFM Excel file.")
+    parser.add_argument("--po-file", nargs="+", help="Path to the PO Excel file. Several paths or a quoted glob (e.g. \"exports/PO_*.xlsx\") are read in parallel and merged.")
+    parser.add_argument("--rfm-file", nargs="+", help="Path to the RFM Excel file, or several as for --po-file.")
     parser.add_argument("--start-date", help="Start date in DD-MM-YYYY format.")
     parser.add_argument("--end-date", help="End date in DD-MM-YYYY format.")
-    parser.add_argument("--normalization-file", help="Path to the Normalisasi.xlsx file (optional).")
+    parser.add_argument("--normalization-file", help="Normalization source (optional): path to Normalisasi.xlsx/csv, a CSV URL, or snapshot:<version>. Defaults to the google sheet.")
+    parser.add_argument("--offline", action="store_true", help="Do not use the network, use cached normalization snapshots only.")
+    parser.add_argument("--normalization-ttl", type=int, default=DEFAULT_NORMALIZATION_TTL, help="Seconds to reuse cached normalization data before revalidating it.")
+    parser.add_argument("--check", action="store_true", help="Only check the headers and first rows of the inputs against their schemas, exit 1 on problems.")
     parser.add_argument("--output-dir", help="Directory to save output files (optional).")
+    parser.add_argument("--cadence", type=int, help="Backfill: split --start-date..--end-date into windows of this many days (e.g. 7).")
+    parser.add_argument("--windows", help="Backfill: comma separated START:END windows in DD-MM-YYYY format, replaces --start-date/--end-date.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (optional). 2 or more runs the PO and RFM pipelines concurrently; in backfill mode, processes writing windows. Ignored in service mode.")
+    parser.add_argument("--pic-config", help="Path to a JSON file mapping departments to PIC names (optional).")
+    parser.add_argument("--report-config", help="Path to a JSON file of report definitions (optional), see app/reports.py for the format.")
+    parser.add_argument("--no-cache", action="store_true", help="Parse input files without reading or writing the local cache.")
+    parser.add_argument("--clear-cache", action="store_true", help="Delete cached input files and the requisition state store before running.")
+    parser.add_argument("--incremental", action="store_true", help="Enrich only rows that are new or changed since the last run, reusing the rest from the local state store, and keep outputs already written from the same rows. Writing dominates a run, so only unchanged reruns of a window are much faster.")
+    parser.add_argument("--streaming", action="store_true", help="Read input files in chunks with declared column dtypes to reduce peak memory.")
+    parser.add_argument("--metrics-json", help="Save per-stage timings, memory, row counts and bytes written to this JSON file.")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILERS, help="Profile the hot stages (default cprofile, or pyinstrument) into <output-dir>/profile and print a stage summary.")
+    parser.add_argument("--log-level", default="WARNING", help="Level of the structured json stage log on stderr (e.g. INFO).")
+    parser.add_argument("--sinks", nargs="+", choices=list(SINKS), help="Output formats to write, one or several (default excel). Every format uses the workbook's sheet names.")
+    parser.add_argument("--history", help="Append each window's report rows to this SQLite file for year-to-date and trend queries (see weekly-purchasing-history).")
+    parser.add_argument("--pr-po-formulas", action="store_true", help="Write the PR-PO column as Excel formulas with cached values instead of plain values.")
+    parser.add_argument("--legacy-styling", action="store_true", help="Style output files with a separate openpyxl pass after writing.")
+    parser.add_argument("--watch", metavar="DIR", help="Service mode: watch this folder for PO/RFM exports and process each new pair in one process, windows of --cadence days (default 7) ending today.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Service mode: localhost port of the trigger api, 0 to disable.")
+    parser.add_argument("--socket", help="Service mode: also serve the trigger api on this unix socket.")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="Service mode: seconds a new file must stay unchanged before it is read.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Service mode: runs that can wait in the job queue.")
+    parser.add_argument("--pair-wait", type=float, default=DEFAULT_PAIR_WAIT, help="Service mode: seconds a new export of one source waits for the other source's before running with the older one.")
 
     args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s', stream=sys.stderr)
+
+    if args.clear_cache:
+        clear_cache()
+        clear_cache(DEFAULT_STATE_DIR)
+        # clearing on its own is a complete command
+        if not any([args.po_file, args.rfm_file, args.start_date, args.end_date]):
+            return
+
+    if args.watch:
+        try:
+            serve(
+                watch_dir=args.watch,
+                output_dir=args.output_dir,
+                run_job=run,
+                run_options={
+                    'legacy_styling': args.legacy_styling,
+                    'use_cache': not args.no_cache,
+                    'streaming': args.streaming,
+                    'pic_config': args.pic_config,
+                    'max_workers': args.workers,
+                    'report_config': args.report_config,
+                    'incremental': args.incremental,
+                    'sinks': args.sinks,
+                    'pr_po_formulas': args.pr_po_formulas,
+                    'history': args.history,
+                },
+                cadence_days=args.cadence or 7,
+                port=args.port or None,
+                socket_path=args.socket,
+                debounce=args.debounce,
+                queue_size=args.queue_size,
+                normalization_source=args.normalization_file,
+                offline=args.offline,
+                normalization_ttl=args.normalization_ttl,
+                pair_wait=args.pair_wait
+            )
+        except Exception:
+            traceback.print_exc()
+            sys.exit(1)
+        return
 
     # Interactive fallback
-    if not any(vars(args).values()):
+    if all(value == parser.get_default(name) for name, value in vars(args).items()):
         print("No arguments provided. Switching to interactive mode.")
         args.po_file = get_input("Enter path to PO file: ")
         args.rfm_file = get_input("Enter path to RFM file: ")
         args.start_date = get_input("Enter start date (DD-MM-YYYY): ")
         args.end_date = get_input("Enter end date (DD-MM-YYYY): ")
-        print("Normalization file is pulled fromm google sheet")
+        print("Normalization file is pulled from google sheet")
         args.output_dir = get_input("Enter output directory (optional, press Enter to skip): ", required=False)
     else:
         # Validate required arguments if not in interactive mode
         missing = []
         if not args.po_file: missing.append("--po-file")
         if not args.rfm_file: missing.append("--rfm-file")
-        if not args.start_date: missing.append("--start-date")
-        if not args.end_date: missing.append("--end-date")
+        if not args.windows and not args.check:
+            if not args.start_date: missing.append("--start-date")
+            if not args.end_date: missing.append("--end-date")
         
         if missing:
             print(f"Error: Missing required arguments: {', '.join(missing)}")
             parser.print_help()
             sys.exit(1)
 
+    if args.check:
+        problems = check_inputs(args.po_file, args.rfm_file, args.normalization_file, args.offline, args.normalization_ttl)
+        if problems:
+            print(format_problems(problems))
+            sys.exit(1)
+        print("Input check passed.")
+        return
+
     try:
         run(
             po_file=args.po_file,
             rfm_file=args.rfm_file,
             start_date=args.start_date,
             end_date=args.end_date,
-            output_dir=args.output_dir
+            output_dir=args.output_dir,
+            legacy_styling=args.legacy_styling,
+            use_cache=not args.no_cache,
+            streaming=args.streaming,
+            pic_config=args.pic_config,
+            normalization_source=args.normalization_file,
+            offline=args.offline,
+            normalization_ttl=args.normalization_ttl,
+            cadence_days=args.cadence,
+            windows=parse_windows(args.windows) if args.windows else None,
+            max_workers=args.workers,
+            report_config=args.report_config,
+            profile=args.profile,
+            metrics_json=args.metrics_json,
+            incremental=args.incremental,
+            sinks=args.sinks,
+            pr_po_formulas=args.pr_po_formulas,
+            history=args.history
         )
-    except Exception as e:
+    except Exception:
+        traceback.print_exc()
         sys.exit(1)
 
 if __name__ == "__main__":
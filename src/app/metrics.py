@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+RSS_SAMPLE_INTERVAL: float = 0.005  # seconds
+PROFILERS = ('cprofile', 'pyinstrument')
+# stages wrapped by the profiler when profiling is on
+HOT_STAGES = ('load', 'enrich', 'assign_department', 'write', 'style_legacy')
+
+# record fields that are measurements, everything else is a label
+METRIC_FIELDS = ('wall_s', 'cpu_s', 'peak_rss_mb', 'rows_in', 'rows_out', 'bytes_written', 'sheets', 'coerced', 'error')
+
+# collector of the run in progress, see start_run. forked workers inherit a copy.
+_ACTIVE: Optional[Dict[str, Any]] = None
+
+def max_rss_mb() -> Optional[float]:
+    """
+    process peak RSS so far, None where the platform does not report it.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is kilobytes on linux, bytes on macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+def current_rss_bytes() -> Optional[int]:
+    # resident pages from /proc, linux only
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+@contextmanager
+def track_peak_rss(enabled: bool = True) -> Iterator[Dict[str, Optional[float]]]:
+    """
+    sample RSS in a background thread while the block runs.
+
+    Unlike tracemalloc this does not slow the block down.
+
+    Yields:
+        dictionary whose 'peak_mb' is set on exit to the RSS growth over the
+        block, None when disabled or not on linux.
+    """
+    usage: Dict[str, Optional[float]] = {'peak_mb': None}
+    start = current_rss_bytes() if enabled else None
+    if start is None:
+        yield usage
+        return
+
+    peak = [start]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(RSS_SAMPLE_INTERVAL):
+            peak[0] = max(peak[0], current_rss_bytes() or 0)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield usage
+    finally:
+        done.set()
+        sampler.join()
+        usage['peak_mb'] = (max(peak[0], current_rss_bytes() or 0) - start) / 1024 ** 2
+
+def start_run(profile: Optional[str] = None, profile_dir: Optional[str] = None, **info) -> Dict[str, Any]:
+    """
+    start collecting stage metrics for this process.
+
+    Args:
+        profile: None, 'cprofile' or 'pyinstrument', profiler wrapped around HOT_STAGES.
+        profile_dir: folder for profiler output, required with profile.
+        info: run details stored with the metrics, e.g. input paths.
+
+    Returns:
+        the collector, pass it to finish_run.
+
+    Raises:
+        ValueError: on an unknown or unavailable profiler.
+    """
+    global _ACTIVE
+    if profile is not None:
+        if profile not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profile}', expected one of {', '.join(PROFILERS)}.")
+        if profile == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                raise ValueError("Profiling with pyinstrument needs it installed: pip install pyinstrument")
+        os.makedirs(profile_dir, exist_ok=True)
+
+    _ACTIVE = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'info': info,
+        'stages': [],
+        'filters': [],
+        'labels': {},
+        'profile': profile,
+        'profile_dir': profile_dir,
+        '_wall': time.perf_counter(),
+        '_cpu': time.process_time(),
+    }
+    return _ACTIVE
+
+def finish_run(collector: Dict[str, Any], error: Optional[BaseException] = None) -> Dict[str, Any]:
+    """
+    stop collecting and summarise the run.
+
+    Returns:
+        json-serialisable run report: status, totals, stages and filters.
+    """
+    global _ACTIVE
+    if _ACTIVE is collector:
+        _ACTIVE = None
+    return {
+        'status': 'error' if error is not None else 'ok',
+        'error': f"{type(error).__name__}: {error}" if error is not None else None,
+        'started': collector['started'],
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'wall_s': round(time.perf_counter() - collector['_wall'], 4),
+        'cpu_s': round(time.process_time() - collector['_cpu'], 4),
+        'max_rss_mb': max_rss_mb(),
+        'info': collector['info'],
+        'stages': collector['stages'],
+        'filters': collector['filters'],
+        'profile_dir': collector['profile_dir'] if collector['profile'] else None,
+    }
+
+@contextmanager
+def label_stages(**values) -> Iterator[None]:
+    """
+    add labels (e.g. source or window) to every stage and filter recorded in the block.
+    """
+    if _ACTIVE is None:
+        yield
+        return
+    previous = _ACTIVE['labels']
+    _ACTIVE['labels'] = {**previous, **values}
+    try:
+        yield
+    finally:
+        _ACTIVE['labels'] = previous
+
+def _profile_path(collector: Dict[str, Any], record: Dict[str, Any], extension: str) -> str:
+    # named after the stage and its labels, taken before the stage adds its counts
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', '-'.join(str(value) for value in record.values()))
+    return os.path.join(collector['profile_dir'], f"{name}-{os.getpid()}.{extension}")
+
+@contextmanager
+def _profiled(collector: Dict[str, Any], record: Dict[str, Any]) -> Iterator[None]:
+    if collector['profile'] is None or record['stage'] not in HOT_STAGES:
+        yield
+        return
+    if collector['profile'] == 'pyinstrument':
+        path = _profile_path(collector, record, 'html')
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+        return
+
+    import cProfile
+    path = _profile_path(collector, record, 'prof')
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+@contextmanager
+def stage(name: str, **stage_labels) -> Iterator[Dict[str, Any]]:
+    """
+    time one pipeline stage.
+
+    Records wall time, cpu time and peak RSS growth of the block, logs it
+    as one json line and adds it to the run's metrics. The yielded record
+    takes extra fields such as 'rows_in', 'rows_out' or 'bytes_written'.
+    Without an active run only the record is yielded.
+
+    Args:
+        name: stage name.
+        stage_labels: labels such as source='PO'.
+    """
+    collector = _ACTIVE
+    record: Dict[str, Any] = {'stage': name}
+    if collector is None:
+        yield record
+        return
+
+    record.update(collector['labels'])
+    record.update(stage_labels)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    usage: Dict[str, Optional[float]] = {'peak_mb': None}
+    try:
+        with track_peak_rss() as usage, _profiled(collector, record):
+            yield record
+    except BaseException as e:
+        # failed stages are kept, they show where a run stopped
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['wall_s'] = round(time.perf_counter() - wall, 4)
+        record['cpu_s'] = round(time.process_time() - cpu, 4)
+        record['peak_rss_mb'] = round(usage['peak_mb'], 1) if usage['peak_mb'] is not None else None
+        collector['stages'].append(record)
+        logger.info(json.dumps({'event': 'stage', **record}, default=str))
+
+def record_filter(name: str, rows_in: int, rows_out: int, **filter_labels):
+    """
+    record the rows going in and out of one filter of the active run.
+    """
+    if _ACTIVE is None:
+        return
+    record = {'filter': name, **_ACTIVE['labels'], **filter_labels, 'rows_in': int(rows_in), 'rows_out': int(rows_out)}
+    _ACTIVE['filters'].append(record)
+    logger.info(json.dumps({'event': 'filter', **record}, default=str))
+
+@contextmanager
+def capture_records() -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """
+    collect the stages and filters recorded in the block separately.
+
+    Worker processes use this to send their records back to the parent,
+    which adds them to its run with merge_records.
+    """
+    captured: Dict[str, List[Dict[str, Any]]] = {'stages': [], 'filters': []}
+    if _ACTIVE is None:
+        yield captured
+        return
+    previous = _ACTIVE['stages'], _ACTIVE['filters']
+    _ACTIVE['stages'], _ACTIVE['filters'] = captured['stages'], captured['filters']
+    try:
+        yield captured
+    finally:
+        _ACTIVE['stages'], _ACTIVE['filters'] = previous
+
+def merge_records(captured: Dict[str, List[Dict[str, Any]]]):
+    """
+    add records captured in a worker to the active run.
+    """
+    if _ACTIVE is None:
+        return
+    _ACTIVE['stages'].extend(captured['stages'])
+    _ACTIVE['filters'].extend(captured['filters'])
+
+def write_metrics_json(path: str, report: Dict[str, Any]):
+    """
+    save a run report from finish_run as json.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+
+def format_summary(report: Dict[str, Any]) -> str:
+    """
+    stage and filter table of a run report, for printing.
+    """
+    lines = [f"{'stage':<20} {'labels':<34} {'wall s':>8} {'cpu s':>8} {'+RSS MB':>8} {'rows':>10} {'bytes':>12}"]
+    for record in report['stages']:
+        label = ' '.join(
+            str(value) for key, value in record.items() if key != 'stage' and key not in METRIC_FIELDS
+        )
+        peak = record.get('peak_rss_mb')
+        lines.append(
+            f"{record['stage']:<20} {label[:34]:<34} {record['wall_s']:>8.3f} {record['cpu_s']:>8.3f} "
+            f"{'' if peak is None else f'{peak:.1f}':>8} {record.get('rows_out', ''):>10} {record.get('bytes_written', ''):>12}"
+        )
+    for record in report['filters']:
+        label = ' '.join(str(value) for key, value in record.items() if key != 'filter' and key not in METRIC_FIELDS)
+        lines.append(f"filter {record['filter']:<13} {label[:34]:<34} {record['rows_in']:>10} -> {record['rows_out']}")
+    rss = report['max_rss_mb']
+    lines.append(f"total {report['wall_s']:.3f}s wall, {report['cpu_s']:.3f}s cpu" + (f", max RSS {rss:.1f} MB" if rss is not None else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,227 @@
+import pandas as pd
+import hashlib
+import http.client
+import io
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+from app.cache import DEFAULT_CACHE_DIR
+
+DEFAULT_NORMALIZATION_URL: str = 'https://docs.google.com/spreadsheets/d/1EZ7kPPvnRqvR5UN0Vi0NNLpLTNXEArzRklsVTIGb1vc/gviz/tq?tqx=out:csv&gid=0'
+DEFAULT_NORMALIZATION_TTL: int = 15 * 60  # seconds
+NORMALIZATION_TIMEOUT: int = 30  # seconds
+
+SNAPSHOT_PREFIX = 'snapshot:'
+
+# columns the processor reads from the Normalisasi sheet, see PO_SCHEMA in loader.py
+NORMALIZATION_SCHEMA: Dict[str, str] = {
+    'Requisition Number': 'string',
+    'Updated Requisition Approved Date': 'date',
+    'Updated Requisition Required Date': 'date',
+    'Background Update': 'string',
+}
+# updated dates are typed in the sheet as DD/MM/YYYY text
+NORMALIZATION_DATE_FORMAT: str = '%d/%m/%Y'
+
+NormalizationInfo = Dict[str, str]
+
+def _snapshot_dir(cache_dir: str) -> str:
+    return os.path.join(cache_dir, 'normalization')
+
+def _content_version(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:16]
+
+def _meta_path(cache_dir: str, source: str) -> str:
+    source_key = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_snapshot_dir(cache_dir), f"source-{source_key}.json")
+
+def _read_meta(cache_dir: str, source: str) -> Optional[Dict]:
+    path = _meta_path(cache_dir, source)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(cache_dir: str, source: str, meta: Dict):
+    path = _meta_path(cache_dir, source)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+def _snapshot_path(cache_dir: str, version: str) -> str:
+    return os.path.join(_snapshot_dir(cache_dir), f"{version}.csv")
+
+def _save_snapshot(cache_dir: str, content: bytes) -> str:
+    version = _content_version(content)
+    path = _snapshot_path(cache_dir, version)
+    if not os.path.exists(path):
+        os.makedirs(_snapshot_dir(cache_dir), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+    return version
+
+def _info(source: str, version: str, fetched_at: float) -> NormalizationInfo:
+    return {
+        'source': source,
+        'version': version,
+        'fetched_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(fetched_at)),
+    }
+
+def _load_snapshot(cache_dir: str, version: str) -> Tuple[pd.DataFrame, NormalizationInfo]:
+    """
+    load a stored snapshot by version, a unique prefix is enough.
+    """
+    directory = _snapshot_dir(cache_dir)
+    matches = []
+    if os.path.isdir(directory):
+        matches = [name[:-4] for name in os.listdir(directory) if name.endswith('.csv') and name.startswith(version)]
+    if len(matches) != 1:
+        reason = 'not found' if not matches else 'ambiguous'
+        raise ValueError(f"Normalization snapshot {version} {reason} in {directory}")
+    path = _snapshot_path(cache_dir, matches[0])
+    return pd.read_csv(path), _info(f"{SNAPSHOT_PREFIX}{matches[0]}", matches[0], os.path.getmtime(path))
+
+def _load_local(path: str, cache_dir: str) -> Tuple[pd.DataFrame, NormalizationInfo]:
+    """
+    load a local Normalisasi csv or xlsx, using the 'RFM' sheet when present.
+
+    The data is stored as a snapshot so the printed version can be replayed
+    with 'snapshot:<version>'. A csv is stored as is; of an xlsx the selected
+    sheet is stored as csv, dates written as NORMALIZATION_DATE_FORMAT, and
+    read back from it, so a run and its replay see the same data.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        sheets = pd.ExcelFile(io.BytesIO(content)).sheet_names
+        sheet = pd.read_excel(io.BytesIO(content), sheet_name='RFM' if 'RFM' in sheets else 0)
+        content = sheet.to_csv(index=False, date_format=NORMALIZATION_DATE_FORMAT).encode('utf-8')
+    df = pd.read_csv(io.BytesIO(content))
+    version = _save_snapshot(cache_dir, content)
+    return df, _info(path, version, os.path.getmtime(path))
+
+def _load_remote(
+    url: str,
+    cache_dir: str,
+    ttl: int,
+    offline: bool
+) -> Tuple[Optional[pd.DataFrame], Optional[NormalizationInfo]]:
+    """
+    load a remote csv through the snapshot cache.
+
+    A snapshot younger than ttl is used without touching the network. Older
+    snapshots are revalidated with ETag / Last-Modified when the server
+    sends them. If the fetch fails, e.g. a truncated response, or the
+    response is not a readable csv, the last snapshot is used.
+    """
+    meta = _read_meta(cache_dir, url)
+    if meta and not os.path.exists(_snapshot_path(cache_dir, meta['version'])):
+        meta = None
+
+    if meta and (offline or time.time() - meta['fetched_at'] < ttl):
+        df, _ = _load_snapshot(cache_dir, meta['version'])
+        return df, _info(url, meta['version'], meta['fetched_at'])
+
+    if offline:
+        print(f"Warning: Offline mode and no normalization snapshot cached for {url}")
+        return None, None
+
+    request = urllib.request.Request(url)
+    if meta and meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if meta and meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=NORMALIZATION_TIMEOUT) as response:
+            content = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and meta:
+            meta['fetched_at'] = time.time()
+            _write_meta(cache_dir, url, meta)
+            df, _ = _load_snapshot(cache_dir, meta['version'])
+            return df, _info(url, meta['version'], meta['fetched_at'])
+        content = None
+        error = e
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        # HTTPException covers IncompleteRead, a response cut off mid-body
+        content = None
+        error = e
+
+    if content is not None:
+        try:
+            df = pd.read_csv(io.BytesIO(content))
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            # e.g. an html error or login page served with status 200
+            content = None
+            error = e
+
+    if content is None:
+        if meta:
+            print(f"Warning: Could not refresh normalization data ({error}), using snapshot {meta['version']}")
+            df, _ = _load_snapshot(cache_dir, meta['version'])
+            return df, _info(url, meta['version'], meta['fetched_at'])
+        print(f"Warning: Could not fetch normalization file: {error}")
+        return None, None
+
+    version = _save_snapshot(cache_dir, content)
+    fetched_at = time.time()
+    _write_meta(cache_dir, url, {
+        'version': version,
+        'fetched_at': fetched_at,
+        'etag': etag,
+        'last_modified': last_modified,
+    })
+    return df, _info(url, version, fetched_at)
+
+def load_normalization(
+    source: Optional[str] = None,
+    offline: bool = False,
+    ttl: int = DEFAULT_NORMALIZATION_TTL,
+    cache_dir: str = DEFAULT_CACHE_DIR
+) -> Tuple[Optional[pd.DataFrame], Optional[NormalizationInfo]]:
+    """
+    load normalization data from google sheet, a local file or a stored snapshot.
+
+    Args:
+        source: http(s) url of a csv export, path to a local csv/xlsx, or
+            'snapshot:<version>' for a snapshot recorded by an earlier run.
+            Defaults to the Normalisasi google sheet.
+        offline: never use the network, remote sources are served from snapshots only.
+        ttl: seconds a remote snapshot is used before it is revalidated.
+        cache_dir: cache location, snapshots of remote and local sources are
+            kept in its 'normalization' folder.
+
+    Returns:
+        (dataframe, info) where info holds source, version and fetched_at.
+        (None, None) if no data is available, enrichment is then skipped.
+
+    Raises:
+        FileNotFoundError: if a local source does not exist.
+        ValueError: if a requested snapshot is not stored.
+    """
+    if source is None:
+        source = DEFAULT_NORMALIZATION_URL
+
+    if source.startswith(SNAPSHOT_PREFIX):
+        df, info = _load_snapshot(cache_dir, source[len(SNAPSHOT_PREFIX):])
+    elif source.startswith(('http://', 'https://')):
+        df, info = _load_remote(source, cache_dir, ttl, offline)
+    else:
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Normalization file not found at {source}")
+        df, info = _load_local(source, cache_dir)
+
+    if info is not None:
+        print(f"Normalization data: {info['source']} (version {info['version']}, fetched {info['fetched_at']})")
+    return df, info
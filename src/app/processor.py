@@ -1,49 +1,296 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import io
+import json
 import os
-from datetime import datetime
-from typing import Dict, Optional, List
-from app.localization import assign_department, split_by_department
-from app.loader import load_excel_data
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, List, Tuple
+from app.dates import parse_date_columns
+from app.history import record_reports
+from app.metrics import capture_records, label_stages, merge_records, record_filter, stage
+from app.localization import DEPARTMENT_PICS, assign_department, compile_department_patterns, split_rows_by_department
+from app.loader import PO_SCHEMA, RFM_SCHEMA, InputFiles, load_excel_files, resolve_input_files
+from app.reports import LEAD_TIME_SHEET, PR_PO_COLUMN, REPORTS, compile_report_plan, evaluate_report_plan, reports_for_source
+from app.state import DEFAULT_STATE_DIR, diff_rows, read_state, row_hashes, row_keys, state_key, write_state
+from app.sinks import DEFAULT_SINKS, output_size, sink_path, write_sink
 
-def process_procurement_data(
-    po_file: str,
-    rfm_file: str,
-    datestart: str,
-    dateend: str,
-    normalization_file: Optional[pd.DataFrame] = None,
-    output_dir: Optional[str] = None
-) -> Dict[str, pd.DataFrame]:
+def lead_time_summary(
+    df: pd.DataFrame,
+    results: Dict[str, np.ndarray],
+    reports: List[Dict[str, Any]],
+    departments: List[str]
+) -> pd.DataFrame:
     """
-    Process procurement data for weekly reporting and save to Excel.
-    
+    PR-PO lead time statistics of the pr_po reports, overall and per department.
+
+    Args:
+        df: enriched, department-assigned frame with the PR-PO column.
+        results: report name to row positions in df.
+        reports: report definitions.
+        departments: department names, in row order.
+
+    Returns:
+        one row per report and department ('All' first) with the number of rows,
+        rows with a lead time, and median, p90 and mean PR-PO in days.
+    """
+    lead_times = df[PR_PO_COLUMN].to_numpy(dtype=float)
+    pr_po_reports = [report['name'] for report in reports if report.get('pr_po') and report['name'] in results]
+    summary = []
+    for name in pr_po_reports:
+        groups = {'All': results[name], **split_rows_by_department(df, results[name], departments)}
+        for dept, rows in groups.items():
+            values = lead_times[rows]
+            values = values[~np.isnan(values)]
+            summary.append({
+                'Report': name,
+                'Department': dept,
+                'Rows': len(rows),
+                'Rows with PR-PO': len(values),
+                'Median PR-PO': round(float(np.median(values)), 2) if len(values) else np.nan,
+                'P90 PR-PO': round(float(np.percentile(values, 90)), 2) if len(values) else np.nan,
+                'Mean PR-PO': round(float(values.mean()), 2) if len(values) else np.nan,
+            })
+    return pd.DataFrame(summary, columns=['Report', 'Department', 'Rows', 'Rows with PR-PO', 'Median PR-PO', 'P90 PR-PO', 'Mean PR-PO'])
+
+def _collect_sheets(
+    df_original: pd.DataFrame,
+    df: pd.DataFrame,
+    results: Dict[str, np.ndarray],
+    departments: List[str],
+    reports: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    lay out the sheets of one output workbook.
+
+    Report sheets are returned as functions that take their rows out of df
+    when called, so each one only exists while it is being written.
+
+    Args:
+        df_original: raw input, saved as 'Sheet'.
+        df: enriched, department-assigned frame.
+        results: report name to row positions in df.
+        departments: department names, in sheet order.
+        reports: report definitions, pr_po reports get the PR-PO column last.
+
+    Returns:
+        sheet name to dataframe or dataframe-building function, in write order.
+    """
+    # every column except 'Department_Assigned' and PR-PO, taken in the same step as the rows
+    columns = [idx for idx, name in enumerate(df.columns) if name not in ('Department_Assigned', PR_PO_COLUMN)]
+    has_lead_time = PR_PO_COLUMN in df.columns
+    pr_po_columns = columns + [df.columns.get_loc(PR_PO_COLUMN)] if has_lead_time else columns
+    pr_po_reports = {report['name'] for report in reports if report.get('pr_po')}
+
+    def take(rows: np.ndarray, report_columns: List[int]):
+        return lambda: df.iloc[rows, report_columns]
+
+    sheets: Dict[str, Any] = {'Sheet': df_original}  # Save raw input
+    for base_name, rows in results.items():
+        report_columns = pr_po_columns if base_name in pr_po_reports else columns
+        # Base export
+        sheets[base_name[:31]] = take(rows, report_columns)
+        # Dept export
+        for dept, dept_rows in split_rows_by_department(df, rows, departments).items():
+            sheets[f"{base_name}_{dept}"[:31]] = take(dept_rows, report_columns)
+    if has_lead_time and pr_po_reports & set(results):
+        sheets[LEAD_TIME_SHEET] = lead_time_summary(df, results, reports, departments)
+    return sheets
+
+def _save_workbook(
+    source: str,
+    path: str,
+    df_original: pd.DataFrame,
+    df: pd.DataFrame,
+    results: Dict[str, np.ndarray],
+    departments: List[str],
+    style_inline: bool,
+    properties: Dict[str, str],
+    reports: List[Dict[str, Any]],
+    sink: str = 'excel'
+):
+    """
+    save one output to a sink, excel workbooks are styled in the same pass unless style_inline is False.
+    """
+    with stage('write', source=source, sink=sink) as record:
+        sheets = _collect_sheets(df_original, df, results, departments, reports)
+        write_sink(sink, path, sheets, properties, reports, style_inline)
+        record['sheets'] = len(sheets)
+        record['rows_out'] = sum(len(rows) for rows in results.values())
+        record['bytes_written'] = output_size(path)
+
+def _outputs_digest(
+    fingerprint: str,
+    results: Dict[str, np.ndarray],
+    departments: List[str],
+    properties: Dict[str, str],
+    reports: List[Dict[str, Any]],
+    sink: str
+) -> str:
+    # everything one sink output of a source is written from
+    digest = hashlib.sha256(fingerprint.encode('utf-8'))
+    for name, rows in results.items():
+        digest.update(name.encode('utf-8'))
+        digest.update(np.asarray(rows, dtype=np.int64).tobytes())
+    digest.update(repr((departments, sorted(properties.items()), reports, sink)).encode('utf-8'))
+    return digest.hexdigest()
+
+def _output_stamp(path: str) -> List[int]:
+    # detects outputs replaced or edited since they were written
+    return [os.stat(path).st_mtime_ns, output_size(path)]
+
+def _save_outputs(
+    source: str,
+    output_dir: str,
+    df_original: pd.DataFrame,
+    df: pd.DataFrame,
+    results: Dict[str, np.ndarray],
+    departments: List[str],
+    style_inline: bool,
+    properties: Dict[str, str],
+    reports: List[Dict[str, Any]],
+    sinks: List[str],
+    fingerprint: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    save one source's results to every sink.
+
+    With a fingerprint of the enriched rows (incremental runs, see
+    enrich_incremental), each written output is recorded in a manifest in
+    output_dir, and an output whose rows, reports and settings are the same
+    as when it was written, and that is unchanged on disk, is kept instead of
+    written again.
+
+    Returns:
+        sink name to output path.
+    """
+    if not style_inline:
+        # plain workbooks are styled again after the run, always write them
+        fingerprint = None
+    manifest_path = os.path.join(output_dir, f".{os.path.splitext(OUTPUT_NAMES[source])[0]}.outputs.json")
+    manifest: Dict[str, Any] = {}
+    if fingerprint and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+    paths: Dict[str, str] = {}
+    for sink in sinks:
+        path = sink_path(output_dir, OUTPUT_NAMES[source], sink)
+        paths[sink] = path
+        digest = _outputs_digest(fingerprint, results, departments, properties, reports, sink) if fingerprint else None
+        entry = manifest.get(sink)
+        if digest and entry and entry['digest'] == digest and os.path.exists(path) and entry['stamp'] == _output_stamp(path):
+            print(f"{source} results unchanged since the last run, keeping: {path}")
+            continue
+        print(f"Saving {source} results to: {path}")
+        _save_workbook(source, path, df_original, df, results, departments, style_inline, properties, reports, sink)
+        if digest:
+            manifest[sink] = {'digest': digest, 'stamp': _output_stamp(path)}
+
+    if fingerprint:
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    return paths
+
+def _output_files(po_paths: Dict[str, str], rfm_paths: Dict[str, str], properties: Dict[str, str]) -> Dict[str, Any]:
+    # the excel workbook is the main output when written, otherwise the first sink's
+    main_sink = 'excel' if 'excel' in po_paths else next(iter(po_paths))
+    return {
+        'po_output_path': po_paths[main_sink],
+        'rfm_output_path': rfm_paths[main_sink],
+        'po_outputs': po_paths,
+        'rfm_outputs': rfm_paths,
+        'normalization_version': properties.get('Normalization Snapshot')
+    }
+
+def parse_window(datestart: str, dateend: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    parse a reporting window.
+
     Args:
-        po_file: Path to the PO Excel file.
-        rfm_file: Path to the RFM Excel file.
         datestart: Start date string in 'DD-MM-YYYY' format.
         dateend: End date string in 'DD-MM-YYYY' format.
-        normalization_file: Optional DataFrame containing normalization data pulled from google sheet.
-        output_dir: Optional directory to save output files. If None, uses po_file directory.
-        
+
     Returns:
-        Dictionary containing the processed dataframes.
+        (start, end) timestamps, both inclusive.
+
+    Raises:
+        ValueError: if a date is not in DD-MM-YYYY format.
     """
-    
-    if output_dir is None:
-        output_dir = os.path.dirname(po_file)
-        
-    # Load original files
-    df_po_original = load_excel_data(po_file)
-    df_rfm_original = load_excel_data(rfm_file)
+    try:
+        datestart_dt = pd.to_datetime(datestart, format='%d-%m-%Y')
+        dateend_dt = pd.to_datetime(dateend, format='%d-%m-%Y')
+    except ValueError as e:
+        raise ValueError(f"Error parsing dates. Please use DD-MM-YYYY format. Error: {e}")
+    return datestart_dt, dateend_dt
+
+def weekly_windows(datestart: str, dateend: str, cadence_days: int = 7) -> List[Tuple[str, str]]:
+    """
+    split a date range into consecutive reporting windows.
+
+    Each window covers cadence_days days, both ends inclusive, e.g. 14-11-2025
+    to 20-11-2025, and the next one starts the day after, so every date falls
+    in at most one window.
+
+    Args:
+        datestart: Range start in 'DD-MM-YYYY' format.
+        dateend: Range end in 'DD-MM-YYYY' format, last window ends on or before it.
+        cadence_days: Window length in days.
+
+    Returns:
+        list of (start, end) strings in 'DD-MM-YYYY' format.
+    """
+    if cadence_days < 1:
+        raise ValueError("Cadence must be at least one day.")
+    range_start, range_end = parse_window(datestart, dateend)
+    windows: List[Tuple[str, str]] = []
+    window_start = range_start
+    while window_start + timedelta(days=cadence_days - 1) <= range_end:
+        window_end = window_start + timedelta(days=cadence_days - 1)
+        windows.append((window_start.strftime('%d-%m-%Y'), window_end.strftime('%d-%m-%Y')))
+        window_start = window_end + timedelta(days=1)
+    if not windows:
+        raise ValueError(f"No {cadence_days}-day window fits between {datestart} and {dateend}.")
+    return windows
+
+# Define exclusions
+EXCLUDE_CATEGORY: List[str] = ['Jasa Logistik', 'Jasa/Service', 'Kontrak', 'Solar']
+EXCLUDE_REQUISITION_TYPE: List[str] = ['Consignment']
+EXCLUDE_DEPARTMENT: List[str] = ['test']
+
+OUTPUT_NAMES: Dict[str, str] = {'PO': 'data_PO_Weekly.xlsx', 'RFM': 'data_RFM_Weekly.xlsx'}
+
+# normalization columns copied onto the source rows by enrich_source
+NORMALIZATION_COLUMNS: List[str] = ['Updated Requisition Approved Date', 'Updated Requisition Required Date', 'Background Update']
+# input columns enrich_source converts in place
+CONVERTED_COLUMNS: Dict[str, List[str]] = {'PO': ['PO Approval Date'], 'RFM': []}
+
+# index of the last normalization frame, reused while the same frame object is passed again
+_NORMALIZATION_INDEX: Dict[str, Any] = {}
 
-    # Make working copies
-    df_po = df_po_original.copy()
-    df_rfm = df_rfm_original.copy()
+def index_normalization(normalization_file: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Index normalization data by 'Requisition Number'.
+
+    A long-running caller passing the same frame on every run, such as the
+    watch service, gets the index built for the first run.
 
-    # Define exclusions
-    exclude_category = ['Jasa Logistik', 'Jasa/Service', 'Kontrak', 'Solar']
-    exclude_requisition_type = ['Consignment']
-    exclude_department = ['test']
+    Args:
+        normalization_file: Optional DataFrame containing normalization data pulled from google sheet.
+
+    Returns:
+        indexed dataframe, or None when enrichment is skipped.
+    """
+    if normalization_file is not None and _NORMALIZATION_INDEX.get('frame') is normalization_file:
+        return _NORMALIZATION_INDEX['index']
 
     # Load Normalisasi file for updates
     picnorm_indexed = None
@@ -60,124 +307,644 @@ def process_procurement_data(
             print(f"Error processing Normalization data: {e}. Skipping data enrichment.")
     else:
         print("Normalization data not provided. Skipping data enrichment.")
+    if picnorm_indexed is not None:
+        _NORMALIZATION_INDEX.update(frame=normalization_file, index=picnorm_indexed)
+    return picnorm_indexed
+
+def enrich_source(source: str, df_original: pd.DataFrame, picnorm_indexed: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Apply normalization updates and parse the report date columns.
+
+    Args:
+        source: 'PO' or 'RFM'.
+        df_original: raw input, left unchanged.
+        picnorm_indexed: output of index_normalization.
+
+    Returns:
+        enriched working copy, sharing the unchanged columns with df_original.
+    """
+    # Make working copy, columns are replaced rather than written into
+    df = df_original.copy(deep=False)
 
-    # Apply data enrichment from Normalisasi file to both PO and RFM DataFrames
+    # Apply data enrichment from Normalisasi file
     if picnorm_indexed is not None:
-        # Process df_po
-        df_po['Updated Requisition Approved Date'] = df_po['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Approved Date'))
-        df_po['Updated Requisition Required Date'] = df_po['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Required Date'))
-        df_po['Background Update'] = df_po['Requisition Number'].map(picnorm_indexed.get('Background Update'))
-        df_po['used_approved_date'] = df_po['Updated Requisition Approved Date'].fillna(df_po['Requisition Approved Date'])
-        
-        # Process df_rfm
-        df_rfm['Updated Requisition Approved Date'] = df_rfm['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Approved Date'))
-        df_rfm['Updated Requisition Required Date'] = df_rfm['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Required Date'))
-        df_rfm['Background Update'] = df_rfm['Requisition Number'].map(picnorm_indexed.get('Background Update'))
-        df_rfm['used_approved_date'] = df_rfm['Updated Requisition Approved Date'].fillna(df_rfm['Requisition Approved Date'])
+        df['Updated Requisition Approved Date'] = df['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Approved Date'))
+        df['Updated Requisition Required Date'] = df['Requisition Number'].map(picnorm_indexed.get('Updated Requisition Required Date'))
+        df['Background Update'] = df['Requisition Number'].map(picnorm_indexed.get('Background Update'))
+        df['used_approved_date'] = df['Updated Requisition Approved Date'].fillna(df['Requisition Approved Date'])
     else:
         # If no Normalisasi file, use original dates
-        df_po['used_approved_date'] = df_po['Requisition Approved Date']
-        df_po['used_required_date'] = df_po['Requisition Required Date']
-        df_rfm['used_approved_date'] = df_rfm['Requisition Approved Date']
-        df_rfm['used_required_date'] = df_rfm['Requisition Required Date']
-        df_po['Updated Requisition Approved Date'] = np.nan
-        df_po['Updated Requisition Required Date'] = np.nan
-        df_po['Background Update'] = np.nan
-        df_rfm['Updated Requisition Approved Date'] = np.nan
-        df_rfm['Updated Requisition Required Date'] = np.nan
-        df_rfm['Background Update'] = np.nan
-
-    # Base filters
-    base_filter_po = (
-        ~df_po['Item Category'].isin(exclude_category) &
-        ~df_po['Requisition Type'].isin(exclude_requisition_type) &
-        ~df_po['Department'].str.lower().isin([dept.lower() for dept in exclude_department])
-    )
+        df['used_approved_date'] = df['Requisition Approved Date']
+        df['used_required_date'] = df['Requisition Required Date']
+        df['Updated Requisition Approved Date'] = np.nan
+        df['Updated Requisition Required Date'] = np.nan
+        df['Background Update'] = np.nan
+
+    # Convert date columns, each distinct value is parsed once with the column's formats
+    with stage('parse_dates', source=source) as record:
+        columns = (['PO Approval Date'] if source == 'PO' else []) + ['used_approved_date'] + NORMALIZATION_COLUMNS[:2]
+        coerced = parse_date_columns(df, columns)
+        record['rows_in'] = len(df)
+        record['coerced'] = coerced
+    for column, count in coerced.items():
+        if count:
+            print(f"Warning: {source}: {count} '{column}' values are not dates and were left empty.")
+
+    # PR-PO lead time in days, as Excel computes PO Approval Date - used_approved_date
+    if source == 'PO':
+        df[PR_PO_COLUMN] = (df['PO Approval Date'] - df['used_approved_date']) / pd.Timedelta(days=1)
+    return df
+
+def enrich_incremental(
+    source: str,
+    df_original: pd.DataFrame,
+    picnorm_indexed: Optional[pd.DataFrame],
+    department_patterns,
+    state_dir: str = DEFAULT_STATE_DIR
+) -> Tuple[pd.DataFrame, str]:
+    """
+    enrich_source and assign_department through the requisition state store.
+
+    Rows are keyed by requisition number and line, and hashed together with
+    their normalization entry. Only rows that are new or whose hash changed
+    since the last run are enriched, the others take their values from the
+    store. The store is then replaced by this export's rows.
+
+    Enrichment is a small part of a run, writing the outputs dominates. The
+    returned fingerprint lets _save_outputs keep outputs written from the
+    same rows, so a rerun without changes skips writing.
+
+    Args:
+        source: 'PO' or 'RFM'.
+        df_original: raw input, left unchanged.
+        picnorm_indexed: output of index_normalization.
+        department_patterns: output of compile_department_patterns.
+        state_dir: store location.
+
+    Returns:
+        (df, fingerprint): the enriched, department-assigned frame, the same
+        as a full run, and a digest of its rows and configuration.
+    """
+    with stage('state_diff', source=source) as record:
+        keys = row_keys(df_original)
+        normalization = None
+        if picnorm_indexed is not None:
+            normalization = picnorm_indexed.reindex(
+                columns=[c for c in NORMALIZATION_COLUMNS if c in picnorm_indexed.columns]
+            ).reindex(df_original['Requisition Number'].to_numpy())
+        hashes = row_hashes(df_original, normalization)
+        key = state_key(source, [
+            [(name, str(dtype)) for name, dtype in df_original.dtypes.items()],
+            None if normalization is None else list(normalization.columns),
+            [(dept, pattern.pattern) for dept, pattern in department_patterns]
+        ])
+        stored = read_state(key, state_dir)
+        changed, positions = diff_rows(stored, keys, hashes)
+        fingerprint = hashlib.sha256(key.encode('utf-8') + np.ascontiguousarray(hashes).tobytes()).hexdigest()
+        record['rows_in'] = len(df_original)
+        record['rows_out'] = len(changed)
+    print(f"{source}: {len(changed)} of {len(df_original)} rows new or changed since the last run")
 
-    base_filter_rfm = (
-        ~df_rfm['Item Category'].isin(exclude_category) &
-        ~df_rfm['Requisition Type'].isin(exclude_requisition_type) &
-        ~df_rfm['Project'].str.lower().isin([dept.lower() for dept in exclude_department])
+    with stage('enrich', source=source) as record:
+        fresh = enrich_source(source, df_original.iloc[changed], picnorm_indexed)
+        record['rows_out'] = len(fresh)
+    with stage('assign_department', source=source):
+        fresh = assign_department(fresh, department_patterns)
+
+    with stage('state_write', source=source):
+        # fresh has the full run's column order, even when no row changed
+        derived = [c for c in fresh.columns if c not in df_original.columns or c in CONVERTED_COLUMNS[source]]
+        reused = np.flatnonzero(positions != -1)
+        # stored rows first, then fresh ones, put back into export order
+        order = np.argsort(np.concatenate([reused, changed]), kind='stable')
+        df = df_original.copy(deep=False)
+        for column in derived:
+            if stored is not None and len(reused):
+                values = pd.concat([stored[column].iloc[positions[reused]], fresh[column]], ignore_index=True).take(order)
+            else:
+                values = fresh[column]
+            df[column] = values.set_axis(df.index)
+        if len(changed) or stored is None or len(stored) != len(df):
+            write_state(key, keys, hashes, df[derived], state_dir)
+    return df, fingerprint
+
+def build_base_filter(source: str, df: pd.DataFrame) -> pd.Series:
+    """
+    Rows kept by every report: excluded categories, requisition types and test departments are dropped.
+    """
+    # PO exports name the department column 'Department', RFM exports 'Project'
+    department = df['Department' if source == 'PO' else 'Project']
+    excluded_departments = [dept.lower() for dept in EXCLUDE_DEPARTMENT]
+    if isinstance(department.dtype, pd.CategoricalDtype):
+        # lowercase each category once instead of every row
+        codes = department.cat.codes.to_numpy()
+        hits = pd.Series(department.cat.categories).astype(str).str.lower().isin(excluded_departments).to_numpy()
+        is_excluded = pd.Series(np.where(codes >= 0, hits[codes], False), index=df.index)
+    else:
+        is_excluded = department.str.lower().isin(excluded_departments)
+    return (
+        ~df['Item Category'].isin(EXCLUDE_CATEGORY) &
+        ~df['Requisition Type'].isin(EXCLUDE_REQUISITION_TYPE) &
+        ~is_excluded
     )
 
-    # Convert date columns
-    df_po['PO Approval Date'] = pd.to_datetime(df_po['PO Approval Date'], errors='coerce')
-    df_po['used_approved_date'] = pd.to_datetime(df_po['used_approved_date'], errors='coerce')
-    df_rfm['used_approved_date'] = pd.to_datetime(df_rfm['used_approved_date'], errors='coerce')
-    df_po['Updated Requisition Approved Date'] = pd.to_datetime(df_po['Updated Requisition Approved Date'], errors='coerce', dayfirst= True)
-    df_po['Updated Requisition Required Date'] = pd.to_datetime(df_po['Updated Requisition Required Date'], errors='coerce', dayfirst= True)
-    df_rfm['Updated Requisition Approved Date'] = pd.to_datetime(df_rfm['Updated Requisition Approved Date'], errors='coerce', dayfirst= True)
-    df_rfm['Updated Requisition Required Date'] = pd.to_datetime(df_rfm['Updated Requisition Required Date'], errors='coerce', dayfirst= True)
+def prepare_source(
+    source: str,
+    file_path: InputFiles,
+    picnorm_indexed: Optional[pd.DataFrame],
+    department_patterns,
+    use_cache: bool = True,
+    streaming: bool = False,
+    reports: Optional[List[Dict[str, Any]]] = None,
+    incremental: bool = False
+) -> Dict[str, Any]:
+    """
+    Load, enrich and tag one source, independent of the reporting window.
 
-    # Date filters
-    try:
-        datestart_dt = pd.to_datetime(datestart, format='%d-%m-%Y')
-        dateend_dt = pd.to_datetime(dateend, format='%d-%m-%Y')
-    except ValueError as e:
-        raise ValueError(f"Error parsing dates. Please use DD-MM-YYYY format. Error: {e}")
+    Args:
+        source: 'PO' or 'RFM'.
+        file_path: Path to the source Excel file, or several, see process_procurement_data.
+        picnorm_indexed: output of index_normalization.
+        department_patterns: output of compile_department_patterns.
+        use_cache: see process_procurement_data.
+        streaming: see process_procurement_data.
+        reports: report definitions, this source's are compiled. Defaults to REPORTS.
+        incremental: see process_procurement_data.
+
+    Returns:
+        Dictionary with the raw frame 'df_original', the enriched frame 'df',
+        its 'base_filter', the compiled report 'plan' and, for incremental
+        runs, the rows' 'fingerprint' (see enrich_incremental).
+    """
+    is_po = source == 'PO'
+
+    # Load original file, several exports are read in parallel and merged
+    with stage('load', source=source) as record:
+        df_original = load_excel_files(file_path, use_cache=use_cache, schema=PO_SCHEMA if is_po else RFM_SCHEMA, streaming=streaming)
+        record['rows_out'] = len(df_original)
 
-    # Filtered data, using 'used_approved_date'
-    New_RFMfromPO = df_po[base_filter_po &
-                          (df_po['used_approved_date'] >= datestart_dt) &
-                          (df_po['used_approved_date'] <= dateend_dt)]
-
-    Inprocess_PO = df_po[base_filter_po &
-                         ((df_po['PO Approval Date'].isna()) |
-                          (df_po['PO Approval Date'] > dateend_dt))]
-
-    PO_Approved = df_po[base_filter_po &
-                        (df_po['PO Approval Date'] >= datestart_dt) &
-                        (df_po['PO Approval Date'] <= dateend_dt)]
-
-    New_RFMfromRFM = df_rfm[base_filter_rfm &
-                            (df_rfm['Requisition Status'] == 'Approve') &
-                            (df_rfm['used_approved_date'] >= datestart_dt) &
-                            (df_rfm['used_approved_date'] <= dateend_dt)]
-
-    Inprocess_RFM = df_rfm[base_filter_rfm &
-                           (df_rfm['Requisition Status'] == 'Approve') &
-                           (df_rfm['used_approved_date'] <= dateend_dt)]
-
-    # Prepare PO results
-    po_results = {
-        'PO_Approved': assign_department(PO_Approved),
-        'New_RFMfromPO': assign_department(New_RFMfromPO),
-        'Inprocess_PO': assign_department(Inprocess_PO)
+    fingerprint = None
+    if incremental:
+        df, fingerprint = enrich_incremental(source, df_original, picnorm_indexed, department_patterns)
+    else:
+        with stage('enrich', source=source):
+            df = enrich_source(source, df_original, picnorm_indexed)
+
+        # Assign departments once, report slices inherit the column
+        with stage('assign_department', source=source):
+            df = assign_department(df, department_patterns)
+
+    with stage('filter', source=source) as record:
+        base_filter = build_base_filter(source, df)
+        plan = compile_report_plan(df, base_filter, reports_for_source(reports or REPORTS, source))
+        record['rows_in'] = len(df)
+        record['rows_out'] = int(base_filter.sum())
+    record_filter('base', len(df), record['rows_out'], source=source)
+
+    return {
+        'df_original': df_original,
+        'df': df,
+        'base_filter': base_filter,
+        'plan': plan,
+        'fingerprint': fingerprint
     }
 
-    # Prepare RFM results
-    rfm_results = {
-        'New_RFMfromRFM': assign_department(New_RFMfromRFM),
-        'Inprocess_RFM': assign_department(Inprocess_RFM)
+def _report_properties(picnorm_indexed: Optional[pd.DataFrame], normalization_version: Optional[str]) -> Dict[str, str]:
+    # Record which normalization snapshot enriched the report
+    properties: Dict[str, str] = {}
+    if picnorm_indexed is not None and normalization_version:
+        properties['Normalization Snapshot'] = normalization_version
+    return properties
+
+def prepare_procurement_data(
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    normalization_file: Optional[pd.DataFrame] = None,
+    use_cache: bool = True,
+    streaming: bool = False,
+    departments: Optional[Dict[str, List[str]]] = None,
+    normalization_version: Optional[str] = None,
+    reports: Optional[List[Dict[str, Any]]] = None,
+    incremental: bool = False
+) -> Dict[str, Any]:
+    """
+    Load, enrich and tag the PO and RFM data, independent of the reporting window.
+
+    Args:
+        see process_procurement_data.
+
+    Returns:
+        Dictionary with the raw frames ('df_po_original', 'df_rfm_original'),
+        the enriched frames ('df_po', 'df_rfm'), their base filters
+        ('base_filter_po', 'base_filter_rfm'), compiled report plans
+        ('plan_po', 'plan_rfm'), incremental row fingerprints ('fingerprint_po',
+        'fingerprint_rfm'), 'departments', 'reports' and the workbook 'properties'.
+    """
+    if reports is None:
+        reports = REPORTS
+    picnorm_indexed = index_normalization(normalization_file)
+    if departments is None:
+        departments = DEPARTMENT_PICS
+    department_patterns = compile_department_patterns(departments)
+
+    po = prepare_source('PO', po_file, picnorm_indexed, department_patterns, use_cache, streaming, reports, incremental)
+    rfm = prepare_source('RFM', rfm_file, picnorm_indexed, department_patterns, use_cache, streaming, reports, incremental)
+
+    return {
+        'df_po_original': po['df_original'],
+        'df_rfm_original': rfm['df_original'],
+        'df_po': po['df'],
+        'df_rfm': rfm['df'],
+        'base_filter_po': po['base_filter'],
+        'base_filter_rfm': rfm['base_filter'],
+        'plan_po': po['plan'],
+        'plan_rfm': rfm['plan'],
+        'fingerprint_po': po['fingerprint'],
+        'fingerprint_rfm': rfm['fingerprint'],
+        'departments': list(departments),
+        'reports': reports,
+        'properties': _report_properties(picnorm_indexed, normalization_version)
     }
 
+def _evaluate_reports(source: str, plan: Dict[str, Any], datestart_dt: pd.Timestamp, dateend_dt: pd.Timestamp) -> Dict[str, np.ndarray]:
+    """
+    evaluate_report_plan, recording the rows each report keeps.
+    """
+    with stage('slice', source=source):
+        results = evaluate_report_plan(plan, datestart_dt, dateend_dt)
+    for name, rows in results.items():
+        record_filter(name, plan['n_rows'], len(rows), source=source)
+    return results
+
+def slice_reports(
+    prepared: Dict[str, Any],
+    datestart_dt: pd.Timestamp,
+    dateend_dt: pd.Timestamp
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Select the report rows of one window.
+
+    Args:
+        prepared: output of prepare_procurement_data.
+        datestart_dt: window start, inclusive.
+        dateend_dt: window end, inclusive.
+
+    Returns:
+        (po_results, rfm_results), report name to row positions in df_po / df_rfm.
+    """
+    po_results = _evaluate_reports('PO', prepared['plan_po'], datestart_dt, dateend_dt)
+    rfm_results = _evaluate_reports('RFM', prepared['plan_rfm'], datestart_dt, dateend_dt)
+    return po_results, rfm_results
+
+def write_reports(
+    prepared: Dict[str, Any],
+    po_results: Dict[str, np.ndarray],
+    rfm_results: Dict[str, np.ndarray],
+    output_dir: str,
+    style_inline: bool = True,
+    sinks: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Save the PO and RFM outputs of one window.
+
+    Args:
+        prepared: output of prepare_procurement_data.
+        po_results: PO report name to row positions, see slice_reports.
+        rfm_results: RFM report name to row positions.
+        output_dir: directory to save output files.
+        style_inline: see process_procurement_data.
+        sinks: see process_procurement_data.
+
+    Returns:
+        Dictionary with 'po_output_path', 'rfm_output_path', the paths of every
+        sink ('po_outputs', 'rfm_outputs') and 'normalization_version'.
+    """
+    departments = prepared['departments']
+    properties = prepared['properties']
+    reports = prepared['reports']
+    sinks = sinks or DEFAULT_SINKS
+
     # === Save PO ===
-    po_output_path = os.path.join(output_dir, 'data_PO_Weekly.xlsx')
-    print(f"Saving PO results to: {po_output_path}")
-    with pd.ExcelWriter(po_output_path, engine='xlsxwriter') as writer:
-        df_po_original.to_excel(writer, sheet_name='Sheet', index=False)  # Save raw input
-        for base_name, df in po_results.items():
-            # Base export
-            df.drop(columns='Department_Assigned').to_excel(writer, sheet_name=base_name[:31], index=False)
-            # Dept export
-            dept_split = split_by_department(df)
-            for dept, df_dept in dept_split.items():
-                df_dept.to_excel(writer, sheet_name=f"{base_name}_{dept}"[:31], index=False)
+    po_paths = _save_outputs('PO', output_dir, prepared['df_po_original'], prepared['df_po'], po_results, departments, style_inline, properties, reports, sinks, prepared['fingerprint_po'])
 
     # === Save RFM ===
-    rfm_output_path = os.path.join(output_dir, 'data_RFM_Weekly.xlsx')
-    print(f"Saving RFM results to: {rfm_output_path}")
-    with pd.ExcelWriter(rfm_output_path, engine='xlsxwriter') as writer:
-        df_rfm_original.to_excel(writer, sheet_name='Sheet', index=False)  # Save raw input
-        for base_name, df in rfm_results.items():
-            # Base export
-            df.drop(columns='Department_Assigned').to_excel(writer, sheet_name=base_name[:31], index=False)
-            # Dept export
-            dept_split = split_by_department(df)
-            for dept, df_dept in dept_split.items():
-                df_dept.to_excel(writer, sheet_name=f"{base_name}_{dept}"[:31], index=False)
+    rfm_paths = _save_outputs('RFM', output_dir, prepared['df_rfm_original'], prepared['df_rfm'], rfm_results, departments, style_inline, properties, reports, sinks, prepared['fingerprint_rfm'])
 
-    return {
-        'po_output_path': po_output_path,
-        'rfm_output_path': rfm_output_path
-    }
+    return _output_files(po_paths, rfm_paths, properties)
+
+def record_history(
+    history: str,
+    prepared: Dict[str, Any],
+    po_results: Dict[str, np.ndarray],
+    rfm_results: Dict[str, np.ndarray],
+    datestart_dt: pd.Timestamp,
+    dateend_dt: pd.Timestamp
+):
+    """
+    Store the PO and RFM report rows of one window in the history database, see app.history.
+    """
+    version = prepared['properties'].get('Normalization Snapshot')
+    record_reports(history, 'PO', prepared['df_po'], po_results, prepared['departments'], datestart_dt, dateend_dt, version)
+    record_reports(history, 'RFM', prepared['df_rfm'], rfm_results, prepared['departments'], datestart_dt, dateend_dt, version)
+
+# state inherited by forked source pipeline workers, set only while they run
+_PIPELINE_STATE: Dict[str, Any] = {}
+
+def _run_source_pipeline(source: str) -> Dict[str, Any]:
+    """
+    load, transform and write one source from _PIPELINE_STATE.
+
+    Output and stage metrics are captured and returned so the parent can
+    print each pipeline's log as one block, in a fixed order.
+    """
+    state = _PIPELINE_STATE
+    buffer = io.StringIO()
+    with capture_records() as captured:
+        try:
+            with redirect_stdout(buffer):
+                prepared = prepare_source(
+                    source,
+                    state['files'][source],
+                    state['picnorm_indexed'],
+                    state['department_patterns'],
+                    state['use_cache'],
+                    state['streaming'],
+                    state['reports'],
+                    state['incremental']
+                )
+                results = _evaluate_reports(source, prepared['plan'], state['datestart_dt'], state['dateend_dt'])
+
+                paths = _save_outputs(
+                    source, state['output_dir'], prepared['df_original'], prepared['df'], results,
+                    state['departments'], state['style_inline'], state['properties'], state['reports'], state['sinks'],
+                    prepared['fingerprint']
+                )
+                if state['history']:
+                    record_reports(
+                        state['history'], source, prepared['df'], results, state['departments'],
+                        state['datestart_dt'], state['dateend_dt'], state['properties'].get('Normalization Snapshot')
+                    )
+            outcome = {'paths': paths, 'log': buffer.getvalue(), 'error': None}
+        except Exception as e:
+            outcome = {'paths': None, 'log': buffer.getvalue(), 'error': e}
+    outcome['metrics'] = captured
+    return outcome
+
+def _process_sources_concurrently(
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    datestart_dt: pd.Timestamp,
+    dateend_dt: pd.Timestamp,
+    normalization_file: Optional[pd.DataFrame],
+    output_dir: str,
+    style_inline: bool,
+    use_cache: bool,
+    streaming: bool,
+    departments: Dict[str, List[str]],
+    normalization_version: Optional[str],
+    max_workers: int,
+    reports: List[Dict[str, Any]],
+    incremental: bool,
+    sinks: List[str],
+    history: Optional[str]
+) -> Dict[str, Any]:
+    """
+    run the PO and RFM pipelines in parallel worker processes.
+
+    The normalization index and department patterns are built once and
+    shared read-only with the forked workers.
+    """
+    picnorm_indexed = index_normalization(normalization_file)
+    properties = _report_properties(picnorm_indexed, normalization_version)
+    _PIPELINE_STATE.update({
+        'files': {'PO': po_file, 'RFM': rfm_file},
+        'picnorm_indexed': picnorm_indexed,
+        'department_patterns': compile_department_patterns(departments),
+        'departments': list(departments),
+        'properties': properties,
+        'datestart_dt': datestart_dt,
+        'dateend_dt': dateend_dt,
+        'output_dir': output_dir,
+        'style_inline': style_inline,
+        'use_cache': use_cache,
+        'streaming': streaming,
+        'reports': reports,
+        'incremental': incremental,
+        'sinks': sinks,
+        'history': history
+    })
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(OUTPUT_NAMES)), mp_context=context) as executor:
+            outcomes = dict(zip(OUTPUT_NAMES, executor.map(_run_source_pipeline, OUTPUT_NAMES)))
+    finally:
+        _PIPELINE_STATE.clear()
+
+    for source, outcome in outcomes.items():
+        merge_records(outcome['metrics'])
+        for line in outcome['log'].splitlines():
+            print(f"[{source}] {line}")
+    for source, outcome in outcomes.items():
+        if outcome['error'] is not None:
+            raise outcome['error']
+
+    return _output_files(outcomes['PO']['paths'], outcomes['RFM']['paths'], properties)
+
+def process_procurement_data(
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    datestart: str,
+    dateend: str,
+    normalization_file: Optional[pd.DataFrame] = None,
+    output_dir: Optional[str] = None,
+    style_inline: bool = True,
+    use_cache: bool = True,
+    streaming: bool = False,
+    departments: Optional[Dict[str, List[str]]] = None,
+    normalization_version: Optional[str] = None,
+    max_workers: int = 1,
+    reports: Optional[List[Dict[str, Any]]] = None,
+    incremental: bool = False,
+    sinks: Optional[List[str]] = None,
+    history: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Process procurement data for weekly reporting and save to Excel.
+    
+    Args:
+        po_file: Path to the PO Excel file. A glob pattern or a list of paths
+            (e.g. one export per site or month) is read in parallel and merged:
+            columns are aligned, a requisition in several exports takes its
+            lines from the last one, and each row's export is kept in 'Source File'.
+        rfm_file: Path to the RFM Excel file, or several as for po_file.
+        datestart: Start date string in 'DD-MM-YYYY' format.
+        dateend: End date string in 'DD-MM-YYYY' format.
+        normalization_file: Optional DataFrame containing normalization data pulled from google sheet.
+        output_dir: Optional directory to save output files. If None, uses the (first) po_file directory.
+        style_inline: Style the workbooks while writing them. If False, writes plain
+            workbooks to be styled afterwards with style_and_reorder_excel_by_process.
+        use_cache: Reuse parsed PO/RFM frames from the local input cache.
+        streaming: Read the inputs in chunks with the declared PO/RFM schemas
+            instead of a full read_excel, for exports too large to parse at once.
+        departments: Optional department to PIC names mapping in match priority order.
+            Defaults to the lists in localization.py.
+        normalization_version: Optional snapshot version of normalization_file, stored
+            in the output workbooks' document properties.
+        max_workers: Worker processes. With 2 or more the PO and RFM pipelines run
+            concurrently where the platform can fork, with their logs printed per source.
+        reports: Optional report definitions, see app.reports. Defaults to REPORTS.
+        incremental: Enrich only the rows that are new or changed since the last
+            run and reuse the rest from the local requisition state store.
+            Outputs written from the same rows and settings are kept instead
+            of written again, so an unchanged rerun of a window skips writing.
+        sinks: Output formats to write, any of 'excel', 'parquet', 'csv' and 'sqlite'
+            (see app.sinks), with the same sheet names. Defaults to excel only.
+        history: Optional sqlite file the window's report rows are appended to,
+            for year-to-date and trend queries (see app.history).
+        
+    Returns:
+        Dictionary containing the output paths, the paths per sink and the normalization snapshot version.
+    """
+    
+    if output_dir is None:
+        output_dir = os.path.dirname(resolve_input_files(po_file)[0])
+
+    # Date filters
+    datestart_dt, dateend_dt = parse_window(datestart, dateend)
+
+    if max_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        return _process_sources_concurrently(
+            po_file,
+            rfm_file,
+            datestart_dt,
+            dateend_dt,
+            normalization_file,
+            output_dir,
+            style_inline,
+            use_cache,
+            streaming,
+            departments if departments is not None else DEPARTMENT_PICS,
+            normalization_version,
+            max_workers,
+            reports if reports is not None else REPORTS,
+            incremental,
+            sinks or DEFAULT_SINKS,
+            history
+        )
+
+    prepared = prepare_procurement_data(
+        po_file,
+        rfm_file,
+        normalization_file=normalization_file,
+        use_cache=use_cache,
+        streaming=streaming,
+        departments=departments,
+        normalization_version=normalization_version,
+        reports=reports,
+        incremental=incremental
+    )
+    po_results, rfm_results = slice_reports(prepared, datestart_dt, dateend_dt)
+    output_files = write_reports(prepared, po_results, rfm_results, output_dir, style_inline, sinks)
+    if history:
+        record_history(history, prepared, po_results, rfm_results, datestart_dt, dateend_dt)
+    return output_files
+
+# state inherited by forked backfill workers, set only while a backfill runs
+_BACKFILL_STATE: Dict[str, Any] = {}
+
+def _backfill_window(window: Tuple[str, str]) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """
+    slice and write one backfill window from _BACKFILL_STATE.
+
+    Returns:
+        (output dictionary, stage metrics of the window).
+    """
+    state = _BACKFILL_STATE
+    datestart, dateend = window
+    datestart_dt, dateend_dt = parse_window(datestart, dateend)
+    window_dir = os.path.join(state['output_dir'], f"{datestart}_{dateend}")
+    os.makedirs(window_dir, exist_ok=True)
+    with capture_records() as captured, label_stages(window=f"{datestart}_{dateend}"):
+        po_results, rfm_results = slice_reports(state['prepared'], datestart_dt, dateend_dt)
+        output_files = write_reports(state['prepared'], po_results, rfm_results, window_dir, state['style_inline'], state['sinks'])
+        if state['history']:
+            record_history(state['history'], state['prepared'], po_results, rfm_results, datestart_dt, dateend_dt)
+    return output_files, captured
+
+def process_procurement_backfill(
+    po_file: InputFiles,
+    rfm_file: InputFiles,
+    windows: List[Tuple[str, str]],
+    normalization_file: Optional[pd.DataFrame] = None,
+    output_dir: Optional[str] = None,
+    style_inline: bool = True,
+    use_cache: bool = True,
+    streaming: bool = False,
+    departments: Optional[Dict[str, List[str]]] = None,
+    normalization_version: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    reports: Optional[List[Dict[str, Any]]] = None,
+    incremental: bool = False,
+    sinks: Optional[List[str]] = None,
+    history: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Process several reporting windows from one load of the PO and RFM data.
+
+    Inputs are loaded and enriched once, report plans are compiled once
+    (date columns sorted, static filters evaluated), and each window is
+    cut out with a binary search. Workbooks
+    of each window go to '<output_dir>/<start>_<end>/' and are written in
+    parallel worker processes where the platform can fork.
+
+    Args:
+        windows: list of (start, end) strings in 'DD-MM-YYYY' format, see weekly_windows.
+        max_workers: worker processes for writing. Defaults to one per window,
+            capped at the cpu count. 1 writes the windows sequentially.
+        other arguments: see process_procurement_data.
+
+    Returns:
+        list of output dictionaries, one per window, in window order.
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(resolve_input_files(po_file)[0])
+
+    # fail on a bad window before the slow load
+    for datestart, dateend in windows:
+        parse_window(datestart, dateend)
+
+    prepared = prepare_procurement_data(
+        po_file,
+        rfm_file,
+        normalization_file=normalization_file,
+        use_cache=use_cache,
+        streaming=streaming,
+        departments=departments,
+        normalization_version=normalization_version,
+        reports=reports,
+        incremental=incremental
+    )
+
+    _BACKFILL_STATE.update({
+        'prepared': prepared,
+        'output_dir': output_dir,
+        'style_inline': style_inline,
+        'sinks': sinks,
+        'history': history
+    })
+    try:
+        if max_workers is None:
+            max_workers = min(len(windows), os.cpu_count() or 1)
+        # workers read the prepared frames through fork instead of pickling them
+        if max_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                outcomes = list(executor.map(_backfill_window, windows))
+        else:
+            outcomes = [_backfill_window(window) for window in windows]
+    finally:
+        _BACKFILL_STATE.clear()
+
+    for _, captured in outcomes:
+        merge_records(captured)
+    return [output_files for output_files, _ in outcomes]
@@ -0,0 +1,219 @@
+import pandas as pd
+import numpy as np
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from app.dates import DATE_FORMATS, parse_dates
+
+# report definitions, in sheet order. each report selects rows of one source
+# where every predicate holds:
+#   ['base']                          source base filter (exclusions)
+#   ['equals', column, value]         column == value
+#   ['between', column]               window start <= column <= window end
+#   ['on_or_before', column]          column <= window end
+#   ['missing_or_after', column]      column is empty or > window end
+# 'highlight' columns are filled yellow, 'tab_color' is the sheet tab color and
+# 'pr_po' adds the PR-PO lead time column as values, or with 'formula' as
+# formulas carrying the computed values.
+REPORTS: List[Dict[str, Any]] = [
+    {
+        'name': 'PO_Approved',
+        'source': 'PO',
+        'predicates': [['base'], ['between', 'PO Approval Date']],
+        'highlight': ['PO Approval Date'],
+        'tab_color': '00FF00',  # Green
+        'pr_po': True,
+    },
+    {
+        'name': 'New_RFMfromPO',
+        'source': 'PO',
+        'predicates': [['base'], ['between', 'used_approved_date']],
+        'highlight': ['Requisition Approved Date'],
+        'tab_color': '3399FF',  # Blue
+    },
+    {
+        'name': 'Inprocess_PO',
+        'source': 'PO',
+        'predicates': [['base'], ['missing_or_after', 'PO Approval Date']],
+        'highlight': ['PO Approval Date', 'Requisition Approved Date'],
+        'tab_color': 'FFFF00',  # Yellow
+    },
+    {
+        'name': 'New_RFMfromRFM',
+        'source': 'RFM',
+        'predicates': [['base'], ['equals', 'Requisition Status', 'Approve'], ['between', 'used_approved_date']],
+        'highlight': ['Requisition Approved Date'],
+        'tab_color': '3399FF',  # Blue
+    },
+    {
+        'name': 'Inprocess_RFM',
+        'source': 'RFM',
+        'predicates': [['base'], ['equals', 'Requisition Status', 'Approve'], ['on_or_before', 'used_approved_date']],
+        'highlight': ['Requisition Approved Date'],
+        'tab_color': 'FFFF00',  # Yellow
+    },
+]
+
+# PO Approval Date - used_approved_date in days, computed in enrich_source
+PR_PO_COLUMN = 'PR-PO'
+# median / p90 PR-PO per report and department, last sheet of outputs with pr_po reports
+LEAD_TIME_SHEET = 'PR-PO_Summary'
+
+STATIC_OPS = {'base': 1, 'equals': 3}
+WINDOW_OPS = {'between': 2, 'on_or_before': 2, 'missing_or_after': 2}
+
+def validate_reports(reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    check report definitions.
+
+    Args:
+        reports: report definitions, see REPORTS.
+
+    Returns:
+        the same definitions.
+
+    Raises:
+        ValueError: on a missing field, duplicate name or unknown predicate.
+    """
+    names = set()
+    for report in reports:
+        name = report.get('name')
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"Report definition without a name: {report}")
+        if name in names:
+            raise ValueError(f"Duplicate report name: {name}")
+        names.add(name)
+        if report.get('source') not in ('PO', 'RFM'):
+            raise ValueError(f"Report {name}: source must be 'PO' or 'RFM'.")
+        if report.get('pr_po') not in (None, False, True, 'formula'):
+            raise ValueError(f"Report {name}: pr_po must be true, false or 'formula'.")
+        for predicate in report.get('predicates', []):
+            op = predicate[0] if predicate else None
+            arity = STATIC_OPS.get(op, WINDOW_OPS.get(op))
+            if arity is None or len(predicate) != arity:
+                raise ValueError(f"Report {name}: invalid predicate {predicate}.")
+    return reports
+
+def load_report_config(path: str) -> List[Dict[str, Any]]:
+    """
+    load report definitions from a json file.
+
+    The file holds a list of definitions in the format of REPORTS.
+
+    Args:
+        path: path to json file.
+
+    Returns:
+        report definitions.
+    """
+    with open(path, encoding='utf-8') as f:
+        reports = json.load(f)
+    if not isinstance(reports, list):
+        raise ValueError(f"Report config {path} must be a list of report definitions.")
+    return validate_reports(reports)
+
+def reports_for_source(reports: List[Dict[str, Any]], source: str) -> List[Dict[str, Any]]:
+    """
+    reports of one source ('PO' or 'RFM'), in definition order.
+    """
+    return [report for report in reports if report['source'] == source]
+
+def find_report(reports: List[Dict[str, Any]], title: str) -> Optional[Dict[str, Any]]:
+    """
+    report a sheet belongs to, by longest name prefix ('PO_Approved_OBI' -> 'PO_Approved').
+
+    Args:
+        reports: report definitions.
+        title: sheet name.
+
+    Returns:
+        report definition, or None for sheets such as the raw 'Sheet'.
+    """
+    matches = [report for report in reports if title.startswith(report['name'][:31])]
+    return max(matches, key=lambda report: len(report['name']), default=None)
+
+def compile_report_plan(df: pd.DataFrame, base_filter: pd.Series, reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    precompute everything about a source's reports that does not depend on the window.
+
+    Window-independent predicates are evaluated once as boolean masks,
+    and each date column used by a window predicate is sorted once so
+    a window is cut out with a binary search.
+
+    Args:
+        df: enriched source frame.
+        base_filter: its base filter.
+        reports: this source's report definitions.
+
+    Returns:
+        plan for evaluate_report_plan.
+    """
+    static_masks: Dict[Tuple, np.ndarray] = {}
+    date_index: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    for report in reports:
+        for predicate in report['predicates']:
+            key = tuple(predicate)
+            op = predicate[0]
+            if op == 'base' and key not in static_masks:
+                static_masks[key] = base_filter.to_numpy(dtype=bool)
+            elif op == 'equals' and key not in static_masks:
+                static_masks[key] = (df[predicate[1]] == predicate[2]).to_numpy(dtype=bool)
+            elif op in WINDOW_OPS and predicate[1] not in date_index:
+                dates = df[predicate[1]]
+                if not pd.api.types.is_datetime64_any_dtype(dates):
+                    dates, _ = parse_dates(dates, DATE_FORMATS.get(predicate[1]))
+                values = dates.to_numpy()
+                missing = np.isnat(values)
+                rows = np.flatnonzero(~missing)
+                order = np.argsort(values[rows], kind='stable')
+                date_index[predicate[1]] = (rows[order], values[rows][order], np.flatnonzero(missing))
+
+    return {
+        'reports': reports,
+        'n_rows': len(df),
+        'static_masks': static_masks,
+        'date_index': date_index
+    }
+
+def evaluate_report_plan(plan: Dict[str, Any], datestart_dt: pd.Timestamp, dateend_dt: pd.Timestamp) -> Dict[str, np.ndarray]:
+    """
+    row positions of every report for one window.
+
+    Each distinct predicate is evaluated once and shared between reports.
+
+    Args:
+        plan: output of compile_report_plan.
+        datestart_dt: window start, inclusive.
+        dateend_dt: window end, inclusive.
+
+    Returns:
+        report name to ascending row positions in the source frame.
+    """
+    start = np.datetime64(datestart_dt)
+    end = np.datetime64(dateend_dt)
+    n_rows = plan['n_rows']
+    masks = dict(plan['static_masks'])
+
+    def window_mask(op: str, column: str) -> np.ndarray:
+        rows, values, missing_rows = plan['date_index'][column]
+        hi = np.searchsorted(values, end, side='right')
+        mask = np.zeros(n_rows, dtype=bool)
+        if op == 'between':
+            mask[rows[np.searchsorted(values, start, side='left'):hi]] = True
+        elif op == 'on_or_before':
+            mask[rows[:hi]] = True
+        else:  # missing_or_after
+            mask[rows[hi:]] = True
+            mask[missing_rows] = True
+        return mask
+
+    results: Dict[str, np.ndarray] = {}
+    for report in plan['reports']:
+        mask = np.ones(n_rows, dtype=bool)
+        for predicate in report['predicates']:
+            key = tuple(predicate)
+            if key not in masks:
+                masks[key] = window_mask(predicate[0], predicate[1])
+            mask &= masks[key]
+        results[report['name']] = np.flatnonzero(mask)
+    return results
@@ -0,0 +1,471 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import traceback
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from app.normalization import DEFAULT_NORMALIZATION_TTL, load_normalization
+from app.preflight import classify_export
+from app.processor import parse_window
+
+DEFAULT_PORT: int = 8765
+DEFAULT_DEBOUNCE: float = 5.0  # seconds a file must stay unchanged before it is read
+DEFAULT_QUEUE_SIZE: int = 4
+# seconds a new export of one source waits for the other source's before running with the older one
+DEFAULT_PAIR_WAIT: float = 300.0
+POLL_INTERVAL: float = 1.0  # seconds between folder scans
+JOB_HISTORY: int = 50  # finished jobs kept for the status endpoint
+
+EXPORT_EXTENSIONS = ('.xlsx', '.xlsm')
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+def default_window(cadence_days: int = 7, today: Optional[date] = None) -> List[str]:
+    """
+    reporting window of cadence_days days ending today, both ends inclusive,
+    e.g. 15-11-2025 to 21-11-2025 for a 7 day cadence.
+
+    Returns:
+        [start, end] in 'DD-MM-YYYY' format.
+    """
+    end = today or date.today()
+    return [(end - timedelta(days=cadence_days - 1)).strftime('%d-%m-%Y'), end.strftime('%d-%m-%Y')]
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    # job fields for the api, without the metrics payload
+    return {key: value for key, value in job.items() if key != 'metrics'}
+
+def submit_job(
+    state: Dict[str, Any],
+    trigger: str,
+    po_file: Optional[str] = None,
+    rfm_file: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    queue a run, inputs default to the newest PO and RFM exports seen in the folder.
+
+    Args:
+        state: service state from serve.
+        trigger: 'watch' or 'api', recorded with the job.
+        po_file: PO export path, one existing file.
+        rfm_file: RFM export path, one existing file.
+        start_date: window start in 'DD-MM-YYYY' format, defaults to the cadence window ending today.
+        end_date: window end in 'DD-MM-YYYY' format.
+
+    Returns:
+        the job, or None when the queue is full.
+
+    Raises:
+        ValueError: when no PO or RFM export is known yet, an export is not a
+            file, or a date is not in DD-MM-YYYY format.
+    """
+    with state['lock']:
+        po_file = po_file or state['latest'].get('PO')
+        rfm_file = rfm_file or state['latest'].get('RFM')
+    if not po_file or not rfm_file:
+        raise ValueError(f"No {'PO' if not po_file else 'RFM'} export found in {state['watch_dir']} yet.")
+    for label, path in (('PO', po_file), ('RFM', rfm_file)):
+        # one file per source, globs would fork reader processes next to the api threads
+        if not isinstance(path, str) or not os.path.isfile(path):
+            raise ValueError(f"{label} export {path!r} is not a file.")
+    if not start_date or not end_date:
+        start_date, end_date = default_window(state['cadence_days'])
+    if not isinstance(start_date, str) or not isinstance(end_date, str):
+        raise ValueError("start_date and end_date must be DD-MM-YYYY strings.")
+    # the output folder is named after the window, so only parsed dates get that far
+    start_dt, end_dt = parse_window(start_date, end_date)
+    start_date, end_date = start_dt.strftime('%d-%m-%Y'), end_dt.strftime('%d-%m-%Y')
+
+    with state['lock']:
+        job = {
+            'id': state['next_id'],
+            'trigger': trigger,
+            'status': 'queued',
+            'po_file': po_file,
+            'rfm_file': rfm_file,
+            'start_date': start_date,
+            'end_date': end_date,
+            'submitted': _now(),
+            'started': None,
+            'finished': None,
+            'outputs': None,
+            'error': None,
+        }
+        try:
+            state['queue'].put_nowait(job)
+        except queue.Full:
+            return None
+        state['next_id'] += 1
+        state['jobs'].append(job)
+    print(f"Queued job {job['id']} ({trigger}): {po_file}, {rfm_file}, {start_date} to {end_date}")
+    return job
+
+def _warm_normalization(state: Dict[str, Any]):
+    """
+    normalization frame kept in memory, reloaded once it is older than the ttl.
+    """
+    warm = state['normalization']
+    if warm['df'] is not None and time.time() - warm['loaded_at'] < state['normalization_ttl']:
+        return warm['df'], warm['version']
+    df, info = load_normalization(state['normalization_source'], offline=state['offline'], ttl=state['normalization_ttl'])
+    if df is None and warm['df'] is not None:
+        # keep serving the last data when a refresh finds nothing
+        return warm['df'], warm['version']
+    warm.update(df=df, version=info['version'] if info else None, loaded_at=time.time())
+    return warm['df'], warm['version']
+
+def _work(state: Dict[str, Any]):
+    """
+    run queued jobs one at a time, runs share the process-wide metrics collector.
+    """
+    while True:
+        job = state['queue'].get()
+        if job is None:
+            return
+        with state['lock']:
+            job['status'] = 'running'
+            job['started'] = _now()
+        start_dt, end_dt = parse_window(job['start_date'], job['end_date'])
+        window_dir = os.path.join(state['output_dir'], f"{start_dt:%d-%m-%Y}_{end_dt:%d-%m-%Y}")
+        metrics_path = os.path.join(window_dir, 'metrics.json')
+        outputs = None
+        error = None
+        try:
+            normalization, normalization_version = _warm_normalization(state)
+            outputs = state['run_job'](
+                po_file=job['po_file'],
+                rfm_file=job['rfm_file'],
+                start_date=job['start_date'],
+                end_date=job['end_date'],
+                normalization_file=normalization,
+                normalization_version=normalization_version,
+                output_dir=window_dir,
+                metrics_json=metrics_path,
+                **state['run_options']
+            )
+        except Exception as e:
+            traceback.print_exc()
+            error = f"{type(e).__name__}: {e}"
+        metrics = None
+        if os.path.exists(metrics_path):
+            with open(metrics_path, encoding='utf-8') as f:
+                metrics = json.load(f)
+        with state['lock']:
+            job.update(status='failed' if error else 'done', finished=_now(), outputs=outputs, error=error)
+            if metrics is not None:
+                state['last_metrics'] = metrics
+            # drop the oldest finished jobs
+            finished = [j for j in state['jobs'] if j['status'] in ('done', 'failed')]
+            for old in finished[:max(0, len(finished) - JOB_HISTORY)]:
+                state['jobs'].remove(old)
+        print(f"Job {job['id']} {job['status']}" + (f": {error}" if error else ''))
+
+def scan_folder(state: Dict[str, Any], pending: Dict[str, Any]) -> bool:
+    """
+    one pass over the watched folder.
+
+    A file is read once its size and mtime have not changed for the debounce
+    period and its header can be parsed, so partially copied exports are
+    left alone. PO and RFM exports are told apart by their headers.
+
+    Args:
+        state: service state from serve.
+        pending: path to (size, mtime, first seen) of files waiting to settle, kept between passes.
+
+    Returns:
+        True when a new PO or RFM export was found.
+    """
+    found = False
+    now = time.monotonic()
+    try:
+        names = os.listdir(state['watch_dir'])
+    except OSError as e:
+        print(f"Warning: Cannot list {state['watch_dir']}: {e}")
+        return False
+    for name in names:
+        # skip excel lock files and hidden temp files
+        if not name.lower().endswith(EXPORT_EXTENSIONS) or name.startswith(('~$', '.')):
+            continue
+        path = os.path.join(state['watch_dir'], name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if state['seen'].get(path) == signature:
+            continue
+        waiting = pending.get(path)
+        if waiting is None or waiting[:2] != signature:
+            pending[path] = signature + (now,)
+            continue
+        if now - waiting[2] < state['debounce']:
+            continue
+        del pending[path]
+        source = classify_export(path)
+        if source is None:
+            # unreadable files are retried once they change again
+            state['seen'][path] = signature
+            print(f"Ignoring {path}: not a readable PO or RFM export")
+            continue
+        state['seen'][path] = signature
+        with state['lock']:
+            latest = state['latest'].get(source)
+            if latest is None or not os.path.exists(latest) or os.path.getmtime(latest) <= stat.st_mtime:
+                state['latest'][source] = path
+        print(f"New {source} export: {path}")
+        found = True
+    for path in [path for path in pending if not os.path.exists(path)]:
+        del pending[path]
+    return found
+
+def pair_ready(state: Dict[str, Any], pending: Dict[str, Any], now: float) -> bool:
+    """
+    whether the latest PO and RFM exports should be run together now.
+
+    A run starts once both exports are newer than those of the last watch
+    run. When only one source has a new export, the run waits pair_wait
+    seconds with no file still settling, so a PO and an RFM export copied
+    in one after the other run as one pair instead of two runs, the first
+    with the old partner.
+    """
+    latest = state['latest']
+    if not latest.get('PO') or not latest.get('RFM'):
+        return False
+    inputs = {source: (path, state['seen'].get(path)) for source, path in latest.items()}
+    changed = [source for source in ('PO', 'RFM') if inputs[source] != state['last_inputs'].get(source)]
+    if not changed:
+        state['changed_at'] = None
+        return False
+    if state['changed_at'] is None:
+        state['changed_at'] = now
+    if len(changed) == 2 or (not pending and now - state['changed_at'] >= state['pair_wait']):
+        state['last_inputs'] = inputs
+        state['changed_at'] = None
+        return True
+    return False
+
+def _watch(state: Dict[str, Any]):
+    pending: Dict[str, Any] = {}
+    while not state['stop'].is_set():
+        scan_folder(state, pending)
+        if pair_ready(state, pending, time.monotonic()):
+            try:
+                if submit_job(state, 'watch') is None:
+                    print("Warning: Job queue is full, new export not queued.")
+            except ValueError as e:
+                print(f"Warning: {e}")
+        state['stop'].wait(POLL_INTERVAL)
+
+def _payload(body: Any) -> bytes:
+    return json.dumps(body, indent=2, default=str).encode('utf-8')
+
+def _make_handler(state: Dict[str, Any]):
+    """
+    request handler of the trigger api.
+
+      GET  /status      service settings, latest exports and jobs
+      GET  /jobs/<id>   one job
+      GET  /metrics     run report of the last finished job
+      POST /run         queue a run, optional json body with po_file, rfm_file,
+                        start_date and end_date
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code: int, payload: bytes):
+            # called without the state lock, a slow client must not hold up the worker or the watcher
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = self.path.rstrip('/')
+            with state['lock']:
+                code, payload = self._get(path)
+            self._send(code, payload)
+
+        def _get(self, path: str):
+            # response of a GET, serialised while the caller holds the state lock
+            def reply(code: int, body: Any):
+                return code, _payload(body)
+
+            if path == '/status':
+                return reply(200, {
+                    'watch_dir': state['watch_dir'],
+                    'output_dir': state['output_dir'],
+                    'latest': dict(state['latest']),
+                    'queued': state['queue'].qsize(),
+                    'queue_size': state['queue'].maxsize,
+                    'normalization_version': state['normalization']['version'],
+                    'jobs': [_job_view(job) for job in state['jobs']],
+                })
+            if path.startswith('/jobs/') and path[len('/jobs/'):].isdigit():
+                job_id = int(path[len('/jobs/'):])
+                job = next((job for job in state['jobs'] if job['id'] == job_id), None)
+                return reply(200, _job_view(job)) if job else reply(404, {'error': f"No job {job_id}"})
+            if path == '/metrics':
+                if state['last_metrics'] is None:
+                    return reply(404, {'error': 'No finished run yet'})
+                return reply(200, state['last_metrics'])
+            return reply(404, {'error': f"Unknown path {self.path}"})
+
+        def _send_json(self, code: int, body: Any):
+            self._send(code, _payload(body))
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/run':
+                self._send_json(404, {'error': f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                if not isinstance(body, dict):
+                    raise ValueError("Request body must be a json object.")
+                job = submit_job(
+                    state, 'api',
+                    body.get('po_file'), body.get('rfm_file'), body.get('start_date'), body.get('end_date')
+                )
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            if job is None:
+                self._send_json(503, {'error': 'Job queue is full'})
+            else:
+                with state['lock']:
+                    payload = _payload(_job_view(job))
+                self._send(202, payload)
+
+    return Handler
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(
+    watch_dir: str,
+    output_dir: Optional[str] = None,
+    run_job: Optional[Callable[..., Any]] = None,
+    run_options: Optional[Dict[str, Any]] = None,
+    cadence_days: int = 7,
+    port: Optional[int] = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+    debounce: float = DEFAULT_DEBOUNCE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    normalization_source: Optional[str] = None,
+    offline: bool = False,
+    normalization_ttl: int = DEFAULT_NORMALIZATION_TTL,
+    pair_wait: float = DEFAULT_PAIR_WAIT
+):
+    """
+    watch a folder for PO/RFM exports and process them as they land.
+
+    The process stays up, so imports and normalization data (reloaded
+    after normalization_ttl, with its lookup index) stay warm between runs.
+    Runs go through a bounded queue and are processed one at a time into
+    '<output_dir>/<start>_<end>/', with the run report saved as
+    'metrics.json' next to the outputs. A new PO or RFM export is run
+    together with the other source's, see pair_ready.
+
+    Runs use one process (max_workers 1): the pipeline's worker pools fork,
+    which is unsafe next to the api and watcher threads.
+
+    A local api (see _make_handler) triggers runs and reports status, on
+    127.0.0.1:port and/or a unix socket. Blocks until interrupted.
+
+    Args:
+        watch_dir: folder the exports are dropped into.
+        output_dir: where reports go. Defaults to '<watch_dir>/reports'.
+        run_job: function processing one run, called like app.main.run.
+        run_options: extra keyword arguments for run_job, e.g. sinks or pic_config.
+        cadence_days: length of the default window, which ends on the day of the run.
+        port: tcp port of the api on localhost, None to disable.
+        socket_path: unix socket path of the api, None to disable.
+        debounce: seconds a new file must stay unchanged before it is read.
+        queue_size: runs that can wait in the queue.
+        normalization_source: see app.normalization.load_normalization.
+        offline: see app.normalization.load_normalization.
+        normalization_ttl: seconds the in-memory normalization data is reused.
+        pair_wait: seconds a new export of one source waits for one of the other.
+    """
+    if not os.path.isdir(watch_dir):
+        raise FileNotFoundError(f"Watch folder not found at {watch_dir}")
+    if run_job is None:
+        raise ValueError("serve needs a run_job function, e.g. app.main.run.")
+    output_dir = output_dir or os.path.join(watch_dir, 'reports')
+    os.makedirs(output_dir, exist_ok=True)
+    run_options = dict(run_options or {})
+    if (run_options.get('max_workers') or 1) > 1:
+        print("Warning: Service runs use one process, ignoring max_workers.")
+    run_options['max_workers'] = 1
+
+    state: Dict[str, Any] = {
+        'watch_dir': watch_dir,
+        'output_dir': output_dir,
+        'run_job': run_job,
+        'run_options': run_options,
+        'cadence_days': cadence_days,
+        'debounce': debounce,
+        'normalization_source': normalization_source,
+        'offline': offline,
+        'normalization_ttl': normalization_ttl,
+        'normalization': {'df': None, 'version': None, 'loaded_at': 0.0},
+        'queue': queue.Queue(maxsize=queue_size),
+        'lock': threading.Lock(),
+        'stop': threading.Event(),
+        'seen': {},
+        'latest': {},
+        'last_inputs': {},
+        'changed_at': None,
+        'pair_wait': pair_wait,
+        'jobs': [],
+        'next_id': 1,
+        'last_metrics': None,
+    }
+
+    # load normalization data before the first export lands
+    _warm_normalization(state)
+
+    servers = []
+    if port is not None:
+        servers.append(ThreadingHTTPServer(('127.0.0.1', port), _make_handler(state)))
+        print(f"Trigger api on http://127.0.0.1:{port}")
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        servers.append(_UnixHTTPServer(socket_path, _make_handler(state)))
+        print(f"Trigger api on unix socket {socket_path}")
+
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    threads.append(threading.Thread(target=_work, args=(state,), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    print(f"Watching {watch_dir}, reports go to {output_dir}. Press Ctrl+C to stop.")
+    try:
+        _watch(state)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        state['stop'].set()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        # let the running job finish, queued ones are dropped
+        while True:
+            try:
+                state['queue'].get_nowait()
+            except queue.Empty:
+                break
+        state['queue'].put(None)
+        threads[-1].join()
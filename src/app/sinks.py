@@ -0,0 +1,158 @@
+import pandas as pd
+import json
+import os
+import shutil
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Union
+from app.cache import HAS_PYARROW
+from app.styler import write_styled_workbook
+
+Sheets = Dict[str, Union[pd.DataFrame, Callable[[], pd.DataFrame]]]
+
+# sink name -> suffix of its output, in place of the workbook's '.xlsx'.
+# folder sinks write one file per sheet, named like the workbook sheets.
+SINKS: Dict[str, str] = {
+    'excel': '.xlsx',
+    'parquet': '_parquet',
+    'csv': '_csv',
+    'sqlite': '.sqlite',
+}
+DEFAULT_SINKS: List[str] = ['excel']
+
+PROPERTIES_NAME = '_properties'
+
+def validate_sinks(sinks: List[str]) -> List[str]:
+    """
+    check sink names.
+
+    Args:
+        sinks: sink names, see SINKS.
+
+    Returns:
+        the names without duplicates, in the given order.
+
+    Raises:
+        ValueError: on an unknown name, or parquet without pyarrow.
+    """
+    unknown = [sink for sink in sinks if sink not in SINKS]
+    if unknown:
+        raise ValueError(f"Unknown output sink(s) {', '.join(unknown)}, expected {', '.join(SINKS)}.")
+    if 'parquet' in sinks and not HAS_PYARROW:
+        raise ValueError("The parquet sink needs pyarrow installed: pip install -e .[parquet]")
+    return list(dict.fromkeys(sinks))
+
+def sink_path(output_dir: str, output_name: str, sink: str) -> str:
+    """
+    output location of one sink, e.g. 'data_PO_Weekly.xlsx' -> 'data_PO_Weekly_parquet'.
+    """
+    return os.path.join(output_dir, os.path.splitext(output_name)[0] + SINKS[sink])
+
+def output_size(path: str) -> int:
+    """
+    bytes of a sink output, file or folder.
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+def _frame(sheet) -> pd.DataFrame:
+    return sheet() if callable(sheet) else sheet
+
+def write_excel(path: str, sheets: Sheets, properties: Dict[str, str], reports: List[Dict[str, Any]], style_inline: bool = True):
+    """
+    write an excel workbook, styled in the same pass unless style_inline is False.
+    """
+    if style_inline:
+        write_styled_workbook(path, sheets, properties, reports)
+        return
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for name, value in properties.items():
+            writer.book.set_custom_property(name, value)
+        for sheet_name, sheet in sheets.items():
+            _frame(sheet).to_excel(writer, sheet_name=sheet_name, index=False)
+
+def _write_folder(path: str, sheets: Sheets, properties: Dict[str, str], write_sheet: Callable[[pd.DataFrame, str], None], extension: str):
+    """
+    write one file per sheet into a fresh folder, replacing path once complete.
+    """
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for sheet_name, sheet in sheets.items():
+        write_sheet(_frame(sheet), os.path.join(tmp_path, sheet_name + extension))
+    with open(os.path.join(tmp_path, PROPERTIES_NAME + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(properties, f, indent=2)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    # object columns holding several python types (e.g. numbers and text) are written as text
+    mixed = [
+        column for column in df.columns
+        if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True).startswith('mixed')
+    ]
+    return df.astype({column: 'string' for column in mixed}) if mixed else df
+
+def write_parquet(path: str, sheets: Sheets, properties: Dict[str, str]):
+    """
+    write a folder with one parquet file per sheet.
+    """
+    _write_folder(path, sheets, properties, lambda df, file_path: _arrow_safe(df).to_parquet(file_path, index=False), '.parquet')
+
+def write_csv(path: str, sheets: Sheets, properties: Dict[str, str]):
+    """
+    write a folder with one csv file per sheet.
+    """
+    _write_folder(path, sheets, properties, lambda df, file_path: df.to_csv(file_path, index=False), '.csv')
+
+def write_sqlite(path: str, sheets: Sheets, properties: Dict[str, str]):
+    """
+    write a sqlite database with one table per sheet and a '_properties' table.
+    """
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        for sheet_name, sheet in sheets.items():
+            _frame(sheet).to_sql(sheet_name, connection, index=False, chunksize=50000)
+        pd.DataFrame(list(properties.items()), columns=['name', 'value']).to_sql(PROPERTIES_NAME, connection, index=False)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+
+def write_sink(
+    sink: str,
+    path: str,
+    sheets: Sheets,
+    properties: Optional[Dict[str, str]] = None,
+    reports: Optional[List[Dict[str, Any]]] = None,
+    style_inline: bool = True
+):
+    """
+    write the sheets of one output to a sink.
+
+    Args:
+        sink: sink name, see SINKS.
+        path: output location, see sink_path.
+        sheets: sheet name to dataframe, or to a function building it. Every
+            sink uses these names for its sheets, files or tables.
+        properties: document properties, e.g. the normalization snapshot. Folder
+            sinks save them in '_properties.json', sqlite in a '_properties' table.
+        reports: report definitions used for excel styling.
+        style_inline: see write_excel.
+    """
+    properties = properties or {}
+    if sink == 'excel':
+        write_excel(path, sheets, properties, reports, style_inline)
+    elif sink == 'parquet':
+        write_parquet(path, sheets, properties)
+    elif sink == 'csv':
+        write_csv(path, sheets, properties)
+    elif sink == 'sqlite':
+        write_sqlite(path, sheets, properties)
+    else:
+        raise ValueError(f"Unknown output sink {sink}, expected {', '.join(SINKS)}.")
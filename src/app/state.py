@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import os
+from typing import List, Optional, Tuple
+from app.cache import DEFAULT_CACHE_DIR, read_cached_frame, write_cached_frame
+
+DEFAULT_STATE_DIR: str = os.path.join(DEFAULT_CACHE_DIR, 'state')
+
+# bump when the enrichment logic changes, stored rows of older versions are not reused
+STATE_VERSION: int = 3
+
+KEY_COLUMN = 'Requisition Number'
+HASH_COLUMN = '_row_hash'
+
+def row_keys(df: pd.DataFrame) -> pd.Index:
+    """
+    one key per line: requisition number and the line's position within the requisition.
+
+    Args:
+        df: raw PO or RFM export.
+
+    Returns:
+        unique string keys, e.g. 'RQ-00000012#0', in row order.
+    """
+    numbers = df[KEY_COLUMN].astype(str).reset_index(drop=True)
+    lines = numbers.groupby(numbers, sort=False).cumcount()
+    return pd.Index(numbers + '#' + lines.astype(str))
+
+def row_hashes(df: pd.DataFrame, extra: Optional[pd.DataFrame] = None) -> np.ndarray:
+    """
+    content hash of every row.
+
+    Args:
+        df: raw PO or RFM export.
+        extra: optional frame aligned with df by position whose values the
+            row's result also depends on, e.g. its normalization entry.
+
+    Returns:
+        uint64 hash per row.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    if extra is not None:
+        extra_hashes = pd.util.hash_pandas_object(extra, index=False).to_numpy()
+        hashes = pd.util.hash_pandas_object(pd.DataFrame({'row': hashes, 'extra': extra_hashes}), index=False).to_numpy()
+    return hashes
+
+def state_key(source: str, fingerprint: List) -> str:
+    """
+    store entry for one source and configuration.
+
+    Args:
+        source: 'PO' or 'RFM'.
+        fingerprint: everything besides the row contents the stored values depend
+            on, e.g. input columns and dtypes and department patterns.
+
+    Returns:
+        hex key, a changed configuration starts a new store.
+    """
+    parts = [str(STATE_VERSION), source, repr(fingerprint)]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+def read_state(key: str, state_dir: str = DEFAULT_STATE_DIR) -> Optional[pd.DataFrame]:
+    """
+    load the stored rows of a source.
+
+    Returns:
+        frame indexed by row key with HASH_COLUMN and the stored columns,
+        or None when nothing is stored yet.
+    """
+    return read_cached_frame(key, state_dir)
+
+def write_state(key: str, keys: pd.Index, hashes: np.ndarray, df: pd.DataFrame, state_dir: str = DEFAULT_STATE_DIR):
+    """
+    replace the stored rows of a source.
+
+    Args:
+        key: store entry from state_key.
+        keys: row keys from row_keys, aligned with df.
+        hashes: row hashes from row_hashes, aligned with df.
+        df: columns to store for each row.
+        state_dir: store location.
+    """
+    state = df.set_axis(keys)
+    state.insert(0, HASH_COLUMN, hashes)
+    write_cached_frame(key, state, state_dir)
+
+def diff_rows(stored: Optional[pd.DataFrame], keys: pd.Index, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    compare an export with the stored rows.
+
+    Args:
+        stored: output of read_state.
+        keys: row keys of the export.
+        hashes: row hashes of the export.
+
+    Returns:
+        (changed, positions): row positions that are new or changed, and for
+        every row its position in stored, -1 where it has to be recomputed.
+    """
+    if stored is None or not len(stored):
+        return np.arange(len(keys)), np.full(len(keys), -1, dtype=np.intp)
+    positions = stored.index.get_indexer(keys)
+    found = positions != -1
+    same = np.zeros(len(keys), dtype=bool)
+    same[found] = stored[HASH_COLUMN].to_numpy()[positions[found]] == hashes[found]
+    positions[~same] = -1
+    return np.flatnonzero(~same), positions
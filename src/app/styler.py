@@ -1,14 +1,225 @@
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
-import os
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+import math
+import pandas as pd
+import xlsxwriter
+from app.reports import LEAD_TIME_SHEET, PR_PO_COLUMN, REPORTS, find_report
 
-def style_and_reorder_excel_by_process(path: str):
+HIGHLIGHT_COLOR = 'FFFF00'
+
+# same defaults pandas uses when writing dates through ExcelWriter
+DATE_FORMAT = 'YYYY-MM-DD'
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+
+def get_tab_color(title: str, reports: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+    """
+    tab color for a report sheet.
+
+    Args:
+        title: sheet name.
+        reports: report definitions. Defaults to REPORTS.
+
+    Returns:
+        hex color without '#', or None for sheets left uncolored.
+    """
+    report = find_report(reports or REPORTS, title)
+    return report.get('tab_color') if report else None
+
+def get_highlight_headers(title: str, reports: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """
+    headers whose data cells are highlighted on a report sheet.
+
+    Args:
+        title: sheet name.
+        reports: report definitions. Defaults to REPORTS.
+
+    Returns:
+        list of column headers to fill yellow.
+    """
+    report = find_report(reports or REPORTS, title)
+    return list(report.get('highlight', [])) if report else []
+
+def has_pr_po(title: str, reports: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """
+    check whether a report sheet gets the PR-PO column.
+
+    Args:
+        title: sheet name.
+        reports: report definitions. Defaults to REPORTS.
+    """
+    report = find_report(reports or REPORTS, title)
+    return bool(report and report.get('pr_po'))
+
+def has_pr_po_formulas(title: str, reports: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """
+    check whether a report sheet's PR-PO column is written as formulas.
+
+    Args:
+        title: sheet name.
+        reports: report definitions. Defaults to REPORTS.
+    """
+    report = find_report(reports or REPORTS, title)
+    return bool(report and report.get('pr_po') == 'formula')
+
+def order_sheet_names(sheet_names: List[str], reports: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """
+    raw 'Sheet' first, then report sheets grouped by report in definition order.
+
+    Args:
+        sheet_names: sheet names in any order.
+        reports: report definitions. Defaults to REPORTS.
+
+    Returns:
+        ordered sheet names, the PR-PO summary last. other names not
+        matching any report are dropped.
+    """
+    ordered_sheets: List[str] = []
+
+    if 'Sheet' in sheet_names:
+        ordered_sheets.append('Sheet')
+
+    reports = reports or REPORTS
+    for report in reports:
+        ordered_sheets += [
+            s for s in sheet_names
+            if s not in ordered_sheets and find_report(reports, s) is report
+        ]
+
+    if LEAD_TIME_SHEET in sheet_names and LEAD_TIME_SHEET not in ordered_sheets:
+        ordered_sheets.append(LEAD_TIME_SHEET)
+
+    return ordered_sheets
+
+def _write_styled_sheet(workbook, formats: Dict, sheet_name: str, df: pd.DataFrame, reports: List[Dict[str, Any]]):
+    """
+    write one dataframe row by row with its styling applied.
+
+    Args:
+        workbook: open xlsxwriter workbook.
+        formats: format cache shared across sheets of the workbook.
+        sheet_name: worksheet name.
+        df: data to write, header included.
+        reports: report definitions the sheet styling comes from.
+    """
+    def get_format(num_format: Optional[str], highlight: bool):
+        key = (num_format, highlight)
+        if key not in formats:
+            props = {}
+            if num_format:
+                props['num_format'] = num_format
+            if highlight:
+                props['bg_color'] = '#' + HIGHLIGHT_COLOR
+                props['pattern'] = 1
+            formats[key] = workbook.add_format(props) if props else None
+        return formats[key]
+
+    worksheet = workbook.add_worksheet(sheet_name)
+
+    tab_color = get_tab_color(sheet_name, reports)
+    if tab_color:
+        worksheet.set_tab_color('#' + tab_color)
+
+    headers = list(df.columns)
+    highlight_headers = get_highlight_headers(sheet_name, reports)
+    highlighted = [header in highlight_headers for header in headers]
+
+    # PR-PO = PO Approval Date - used_approved_date. computed values are written as
+    # numbers, or as formulas with the value cached. frames without the column get
+    # formulas appended after the last column.
+    pr_po_idx = headers.index(PR_PO_COLUMN) if has_pr_po(sheet_name, reports) and PR_PO_COLUMN in headers else None
+    pr_po_cols = None
+    if has_pr_po(sheet_name, reports) and (pr_po_idx is None or has_pr_po_formulas(sheet_name, reports)):
+        try:
+            pr_po_cols = (
+                get_column_letter(headers.index('PO Approval Date') + 1),
+                get_column_letter(headers.index('used_approved_date') + 1)
+            )
+        except ValueError:
+            print(f"Skipping PR-PO calculation for sheet {sheet_name}: Required date column not found.")
+
+    append_pr_po = pr_po_cols is not None and pr_po_idx is None
+    for col_idx, header in enumerate(headers):
+        worksheet.write(0, col_idx, header)
+    if append_pr_po:
+        worksheet.write(0, len(headers), PR_PO_COLUMN)
+    pr_po_format = get_format('0.00', False)
+
+    for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        for col_idx, value in enumerate(row):
+            highlight = highlighted[col_idx]
+            if col_idx == pr_po_idx and not (value is None or math.isnan(value)):
+                if pr_po_cols:
+                    excel_row = row_idx + 1
+                    formula = f"={pr_po_cols[0]}{excel_row}-{pr_po_cols[1]}{excel_row}"
+                    worksheet.write_formula(row_idx, col_idx, formula, pr_po_format, value)
+                else:
+                    worksheet.write_number(row_idx, col_idx, value, pr_po_format)
+                continue
+            if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+                # blank cells only need writing when they carry a fill
+                if highlight:
+                    worksheet.write_blank(row_idx, col_idx, None, get_format(None, True))
+                continue
+            if isinstance(value, datetime):
+                worksheet.write_datetime(row_idx, col_idx, value, get_format(DATETIME_FORMAT, highlight))
+            elif isinstance(value, date):
+                worksheet.write_datetime(row_idx, col_idx, value, get_format(DATE_FORMAT, highlight))
+            elif isinstance(value, float) and math.isinf(value):
+                worksheet.write_string(row_idx, col_idx, 'inf' if value > 0 else '-inf', get_format(None, highlight))
+            else:
+                worksheet.write(row_idx, col_idx, value, get_format(None, highlight))
+        if append_pr_po:
+            excel_row = row_idx + 1
+            worksheet.write_formula(row_idx, len(headers), f"={pr_po_cols[0]}{excel_row}-{pr_po_cols[1]}{excel_row}", pr_po_format)
+
+def write_styled_workbook(
+    path: str,
+    sheets: Dict[str, Union[pd.DataFrame, Callable[[], pd.DataFrame]]],
+    properties: Optional[Dict[str, str]] = None,
+    reports: Optional[List[Dict[str, Any]]] = None
+):
+    """
+    write and style an output workbook in a single pass with xlsxwriter.
+
+    Produces the same layout as writing with pandas and then running
+    style_and_reorder_excel_by_process, without reloading the file.
+
+    Args:
+        path (str): location of excel file.
+        sheets: sheet name to dataframe, or to a function building it so large
+            sheets only exist while written. names already truncated to 31 chars.
+        properties: optional custom document properties, e.g. the normalization snapshot.
+        reports: report definitions. Defaults to REPORTS.
+    """
+    print(f"Writing styled file: {path}")
+    reports = reports or REPORTS
+
+    # constant_memory flushes each row to disk once written, rows must be written in order
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    formats: Dict = {}
+    for name, value in (properties or {}).items():
+        workbook.set_custom_property(name, value)
+    try:
+        for sheet_name in order_sheet_names(list(sheets), reports):
+            df = sheets[sheet_name]
+            _write_styled_sheet(workbook, formats, sheet_name, df() if callable(df) else df, reports)
+    finally:
+        workbook.close()
+    print(f"Styled file saved: {path}")
+
+def style_and_reorder_excel_by_process(path: str, reports: Optional[List[Dict[str, Any]]] = None):
     """
     apply strings reorder for tidying excel file
+
+    Fallback for workbooks written without write_styled_workbook,
+    reloads the whole file with openpyxl.
     
     Args:
         path (str): location of excel file, no need to input taking from main.py
+        reports: report definitions. Defaults to REPORTS.
     """
     print(f"Styling file: {path}")
     try:
@@ -17,88 +228,68 @@ def style_and_reorder_excel_by_process(path: str):
         print(f"File not found: {path}")
         return
 
-    # Define the is_po_file variable based on the path
-    is_po_file = 'data_PO_Weekly.xlsx' in os.path.basename(path) 
-    
-    base_names = [
-        'PO_Approved', 'New_RFMfromPO', 'Inprocess_PO',
-        'New_RFMfromRFM', 'Inprocess_RFM'
-    ]
+    reports = reports or REPORTS
 
-    yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+    yellow_fill = PatternFill(start_color=HIGHLIGHT_COLOR, end_color=HIGHLIGHT_COLOR, fill_type='solid')
 
-    ordered_sheets = []
-
-    if 'Sheet' in wb.sheetnames:
-        ordered_sheets.append('Sheet')
-
-    for base in base_names:
-        ordered_sheets += [s for s in wb.sheetnames if s.startswith(base) and s not in ordered_sheets]
+    ordered_sheets = order_sheet_names(wb.sheetnames, reports)
 
     for sheet in wb.worksheets:
         title = sheet.title
         
         # --- PR-PO CALCULATION LOGIC ---
-        # Only runs if it's the PO file AND the sheet is PO_Approved or a department split
-        if is_po_file and title.startswith('PO_Approved'):
+        # Only runs for reports flagged pr_po (PO_Approved) and their department splits
+        if has_pr_po(title, reports):
             
             # Find the required column indices
             headers = [sheet.cell(row=1, column=c).value for c in range(1, sheet.max_column + 1)]
             
-            try:
-                # Find indices (1-based) for the date columns:
-                used_approved_date_col_idx = headers.index('used_approved_date') + 1
-                po_approval_date_col_idx = headers.index('PO Approval Date') + 1
+            if PR_PO_COLUMN in headers:
+                # computed by the processor, only the number format is missing
+                pr_po_col_idx = headers.index(PR_PO_COLUMN) + 1
+                for (cell,) in sheet.iter_rows(min_row=2, min_col=pr_po_col_idx, max_col=pr_po_col_idx):
+                    cell.number_format = '0.00'
+            else:
+                try:
+                    # Find indices (1-based) for the date columns:
+                    used_approved_date_col_idx = headers.index('used_approved_date') + 1
+                    po_approval_date_col_idx = headers.index('PO Approval Date') + 1
                 
-                # Convert indices to Excel column letters
-                used_approved_date_col_letter = get_column_letter(used_approved_date_col_idx)
-                po_approval_date_col_letter = get_column_letter(po_approval_date_col_idx)
+                    # Convert indices to Excel column letters
+                    used_approved_date_col_letter = get_column_letter(used_approved_date_col_idx)
+                    po_approval_date_col_letter = get_column_letter(po_approval_date_col_idx)
                 
-                # Determine the position of the new column
-                new_col_idx = sheet.max_column + 1
+                    # Determine the position of the new column
+                    new_col_idx = sheet.max_column + 1
                 
-                # Set Header in the new column
-                sheet.cell(row=1, column=new_col_idx, value='PR-PO')
-                sheet.cell(row=1, column=new_col_idx).number_format = 'General'
+                    # Set Header in the new column
+                    sheet.cell(row=1, column=new_col_idx, value=PR_PO_COLUMN)
+                    sheet.cell(row=1, column=new_col_idx).number_format = 'General'
                 
-                # Insert formula into every data row (starting from row 2)
-                for row_idx in range(2, sheet.max_row + 1):
-                    # Formula: = [PO Approval Date] - [used_approved_date]
-                    po_cell = f"{po_approval_date_col_letter}{row_idx}"
-                    used_approved_cell = f"{used_approved_date_col_letter}{row_idx}"
+                    # Insert formula into every data row (starting from row 2)
+                    for row_idx in range(2, sheet.max_row + 1):
+                        # Formula: = [PO Approval Date] - [used_approved_date]
+                        po_cell = f"{po_approval_date_col_letter}{row_idx}"
+                        used_approved_cell = f"{used_approved_date_col_letter}{row_idx}"
                     
-                    formula = f"={po_cell}-{used_approved_cell}"
-                    new_cell = sheet.cell(row=row_idx, column=new_col_idx, value=formula)
-                    new_cell.number_format = '0.00'
+                        formula = f"={po_cell}-{used_approved_cell}"
+                        new_cell = sheet.cell(row=row_idx, column=new_col_idx, value=formula)
+                        new_cell.number_format = '0.00'
                 
-            except ValueError as e:
-                print(f"Skipping PR-PO calculation for sheet {title}: Required date column not found.")
+                except ValueError as e:
+                    print(f"Skipping PR-PO calculation for sheet {title}: Required date column not found.")
 
         # --- TAB COLORING LOGIC ---
-        if title.startswith('PO_Approved'):
-            sheet.sheet_properties.tabColor = '00FF00'  # Green
-        elif title.startswith('New_RFMfromPO') or title.startswith('New_RFMfromRFM'):
-            sheet.sheet_properties.tabColor = '3399FF'  # Blue
-        elif title.startswith('Inprocess_PO') or title.startswith('Inprocess_RFM'):
-            sheet.sheet_properties.tabColor = 'FFFF00'  # Yellow
+        tab_color = get_tab_color(title, reports)
+        if tab_color:
+            sheet.sheet_properties.tabColor = tab_color
 
         # --- COLUMN HIGHLIGHTING LOGIC ---
+        highlight_headers = get_highlight_headers(title, reports)
         for col_idx, col in enumerate(sheet.iter_cols(min_row=2), start=1):
             header = sheet.cell(row=1, column=col_idx).value
-            should_highlight = False
-
-            if title.startswith("PO_Approved") and header == "PO Approval Date":
-                should_highlight = True
-            elif title.startswith("New_RFMfromPO") and header == "Requisition Approved Date":
-                should_highlight = True
-            elif title.startswith("Inprocess_PO") and header in ["PO Approval Date", "Requisition Approved Date"]:
-                should_highlight = True
-            elif title.startswith("New_RFMfromRFM") and header == "Requisition Approved Date":
-                should_highlight = True
-            elif title.startswith("Inprocess_RFM") and header == "Requisition Approved Date":
-                should_highlight = True
-
-            if should_highlight:
+
+            if header in highlight_headers:
                 for cell in col:
                     cell.fill = yellow_fill
                     
@@ -0,0 +1,157 @@
+import pandas as pd
+import numpy as np
+import os
+from typing import Dict, List, Optional
+from app.localization import DEPARTMENT_PICS
+from app.processor import EXCLUDE_CATEGORY, EXCLUDE_DEPARTMENT, EXCLUDE_REQUISITION_TYPE
+
+# excel sheets hold 1,048,576 rows including the header
+EXCEL_MAX_ROWS: int = 1048575
+
+# value pools, (value, weight). excluded values come from processor.py so
+# generated data exercises the base filter at a realistic rate.
+ITEM_CATEGORIES = [('Sparepart', 40), ('Consumable', 25), ('Tools', 10), ('IT Equipment', 5), ('ATK', 5)] + [
+    (category, 15 / len(EXCLUDE_CATEGORY)) for category in EXCLUDE_CATEGORY
+]
+REQUISITION_TYPES = [('Normal', 90), ('Urgent', 6)] + [(t, 4 / len(EXCLUDE_REQUISITION_TYPE)) for t in EXCLUDE_REQUISITION_TYPE]
+DEPARTMENTS = [('Mine', 35), ('Plant', 30), ('HSE', 10), ('Finance', 8), ('Head Office', 15)] + [
+    (dept, 1) for dept in EXCLUDE_DEPARTMENT
+] + [(dept.upper(), 1) for dept in EXCLUDE_DEPARTMENT]
+REQUISITION_STATUSES = [('Approve', 80), ('Draft', 8), ('Reject', 5), ('Cancel', 7)]
+UOMS = ['PCS', 'EA', 'SET', 'LTR', 'KG', 'UNIT']
+
+def _choice(rng: np.random.Generator, pool, n_rows: int) -> np.ndarray:
+    values = np.array([value for value, _ in pool], dtype=object)
+    weights = np.array([weight for _, weight in pool], dtype=float)
+    return rng.choice(values, n_rows, p=weights / weights.sum())
+
+def _procurement_names(rng: np.random.Generator, n_rows: int, departments: Dict[str, List[str]]) -> np.ndarray:
+    """
+    pic names from the department lists, plus unknown and missing names.
+    """
+    known = [name for names in departments.values() for name in names]
+    pool = [(name, 90 / len(known)) for name in known] + [('Purchasing Team', 5), (None, 5)]
+    return _choice(rng, pool, n_rows)
+
+def _days(rng: np.random.Generator, n_rows: int, median: float, sigma: float, cap: int) -> np.ndarray:
+    # lead times are right-skewed, a lognormal with a hard cap
+    return np.minimum(np.round(rng.lognormal(np.log(median), sigma, n_rows)), cap).astype('int64')
+
+def generate_source(
+    source: str,
+    n_rows: int,
+    seed: int = 0,
+    start: str = '2025-01-01',
+    days: int = 365,
+    departments: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
+    """
+    generate a cps-like PO or RFM export.
+
+    Requisitions have several item lines, approval dates spread over the
+    period with fewer on weekends, required dates follow approval and
+    about a third of PO lines are still waiting for PO approval.
+
+    Args:
+        source: 'PO' or 'RFM'.
+        n_rows: number of lines.
+        seed: random seed, the same arguments give the same frame.
+        start: first requisition approval date.
+        days: length of the period approvals are spread over.
+        departments: department to pic names. Defaults to DEPARTMENT_PICS.
+
+    Returns:
+        dataframe with the export's column names.
+    """
+    if source not in ('PO', 'RFM'):
+        raise ValueError("source must be 'PO' or 'RFM'.")
+    if departments is None:
+        departments = DEPARTMENT_PICS
+    rng = np.random.default_rng([seed, 0 if source == 'PO' else 1])
+
+    # about 3 lines per requisition, lines of one requisition share its header fields
+    n_requisitions = max(1, n_rows // 3)
+    requisition = np.sort(rng.integers(0, n_requisitions, n_rows))
+
+    day_offsets = rng.integers(0, days, n_requisitions)
+    start_ts = pd.Timestamp(start)
+    weekend = ((start_ts.dayofweek + day_offsets) % 7) >= 5
+    day_offsets[weekend] = rng.integers(0, days, weekend.sum())
+    approved = start_ts + pd.to_timedelta(day_offsets, unit='D') + pd.to_timedelta(rng.integers(7 * 3600, 18 * 3600, n_requisitions), unit='s')
+    required = approved.normalize() + pd.to_timedelta(_days(rng, n_requisitions, 21, 0.6, 120), unit='D')
+
+    data = {
+        'Requisition Number': pd.Series(requisition).map(lambda i: f"RQ-{i:08d}").to_numpy(),
+        'Line Number': pd.Series(requisition).groupby(requisition).cumcount().to_numpy() + 1,
+        'Item Code': pd.Series(rng.integers(100000, 160000, n_rows)).map(lambda i: f"ITM{i}").to_numpy(),
+        'Item Description': pd.Series(rng.integers(0, 5000, n_rows)).map(lambda i: f"Item description {i}").to_numpy(),
+        'Item Category': _choice(rng, ITEM_CATEGORIES, n_requisitions)[requisition],
+        'Requisition Type': _choice(rng, REQUISITION_TYPES, n_requisitions)[requisition],
+        'Department' if source == 'PO' else 'Project': _choice(rng, DEPARTMENTS, n_requisitions)[requisition],
+        'Procurement Name': _procurement_names(rng, n_requisitions, departments)[requisition],
+        'Quantity': rng.integers(1, 200, n_rows),
+        'UOM': rng.choice(UOMS, n_rows),
+        'Requisition Approved Date': approved[requisition],
+        'Requisition Required Date': required[requisition],
+        'Requisition Status': _choice(rng, REQUISITION_STATUSES, n_requisitions)[requisition],
+    }
+    if source == 'PO':
+        po_approved = approved[requisition] + pd.to_timedelta(_days(rng, n_rows, 9, 0.8, 180), unit='D')
+        data['PO Number'] = pd.Series(rng.integers(0, max(1, n_rows // 5), n_rows)).map(lambda i: f"PO-{i:08d}").to_numpy()
+        data['PO Approval Date'] = pd.Series(po_approved).where(rng.random(n_rows) > 0.3)
+    return pd.DataFrame(data)
+
+def generate_normalization(source_frames: List[pd.DataFrame], fraction: float = 0.05, seed: int = 0) -> pd.DataFrame:
+    """
+    generate Normalisasi rows for a sample of requisitions.
+
+    Updated dates are DD/MM/YYYY strings, as in the google sheet.
+
+    Args:
+        source_frames: generated exports to take requisition numbers from.
+        fraction: share of requisitions with an update.
+        seed: random seed.
+
+    Returns:
+        normalization dataframe.
+    """
+    rng = np.random.default_rng([seed, 2])
+    numbers = pd.unique(pd.concat([df['Requisition Number'] for df in source_frames], ignore_index=True))
+    picked = numbers[rng.random(len(numbers)) < fraction]
+    approved = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, len(picked)), unit='D')
+    required = approved + pd.to_timedelta(rng.integers(7, 60, len(picked)), unit='D')
+    return pd.DataFrame({
+        'Requisition Number': picked,
+        'Updated Requisition Approved Date': approved.strftime('%d/%m/%Y'),
+        'Updated Requisition Required Date': required.strftime('%d/%m/%Y'),
+        'Background Update': rng.choice(['Revisi tanggal approve', 'Salah input', 'Request user'], len(picked)),
+    })
+
+def write_dataset(output_dir: str, n_rows: int, seed: int = 0, departments: Optional[Dict[str, List[str]]] = None) -> Dict[str, str]:
+    """
+    write PO.xlsx, RFM.xlsx and Normalisasi.csv of n_rows lines each.
+
+    Args:
+        output_dir: target folder, created if missing.
+        n_rows: lines per export, at most EXCEL_MAX_ROWS.
+        seed: random seed.
+        departments: department to pic names. Defaults to DEPARTMENT_PICS.
+
+    Returns:
+        Dictionary with 'po_file', 'rfm_file' and 'normalization_file' paths.
+    """
+    if n_rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"{n_rows} rows do not fit in one Excel sheet (max {EXCEL_MAX_ROWS}).")
+    os.makedirs(output_dir, exist_ok=True)
+    df_po = generate_source('PO', n_rows, seed, departments=departments)
+    df_rfm = generate_source('RFM', n_rows, seed, departments=departments)
+    paths = {
+        'po_file': os.path.join(output_dir, 'PO.xlsx'),
+        'rfm_file': os.path.join(output_dir, 'RFM.xlsx'),
+        'normalization_file': os.path.join(output_dir, 'Normalisasi.csv'),
+    }
+    for df, path in ((df_po, paths['po_file']), (df_rfm, paths['rfm_file'])):
+        print(f"Writing {len(df)} rows to: {path}")
+        df.to_excel(path, index=False, engine='xlsxwriter')
+    generate_normalization([df_po, df_rfm], seed=seed).to_csv(paths['normalization_file'], index=False)
+    return paths
@@ -0,0 +1,106 @@
+import os
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from app import cache
+from app.cache import cache_key, evict, has_cached_frame, read_cached_frame, write_cached_frame
+from app.loader import PO_SCHEMA, is_cached, load_excel_data
+
+def _write(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Requisition Number', 'Requisition Status', 'PO Approval Date'])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def _frame():
+    return pd.DataFrame({
+        'Requisition Number': ['R1', 'R2', 'R3'],
+        'Requisition Status': pd.Categorical(['Approve', None, 'Draft']),
+        'PO Approval Date': pd.to_datetime(['2025-06-02', None, '2025-06-04']),
+    })
+
+def test_unchanged_export_loads_from_cache(tmp_path, capsys):
+    path = str(tmp_path / 'PO.xlsx')
+    cache_dir = str(tmp_path / 'cache')
+    _write(path, [['R1', 'Approve', '2025-06-02'], ['R2', None, None]])
+
+    first = load_excel_data(path, cache_dir=cache_dir, schema=PO_SCHEMA)
+    assert is_cached(path, cache_dir=cache_dir, schema=PO_SCHEMA)
+    assert not is_cached(path, cache_dir=cache_dir, schema=PO_SCHEMA, streaming=True)
+    capsys.readouterr()
+    second = load_excel_data(path, cache_dir=cache_dir, schema=PO_SCHEMA)
+
+    assert 'Loaded from cache' in capsys.readouterr().out
+    pd.testing.assert_frame_equal(second, first)
+
+def test_changed_export_is_parsed_again(tmp_path, capsys):
+    path = str(tmp_path / 'PO.xlsx')
+    cache_dir = str(tmp_path / 'cache')
+    _write(path, [['R1', 'Approve', '2025-06-02']])
+    load_excel_data(path, cache_dir=cache_dir)
+    _write(path, [['R1', 'Approve', '2025-06-02'], ['R2', 'Draft', None]])
+    capsys.readouterr()
+
+    df = load_excel_data(path, cache_dir=cache_dir)
+
+    assert 'Loaded from cache' not in capsys.readouterr().out
+    assert list(df['Requisition Number']) == ['R1', 'R2']
+
+def test_key_changes_with_size_mtime_and_sheet(tmp_path):
+    path = tmp_path / 'PO.xlsx'
+    path.write_bytes(b'export')
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    key = cache_key(str(path), 0)
+
+    assert cache_key(str(path), 0) == key
+    assert cache_key(str(path), 'RFM') != key
+    assert cache_key(str(path), 0, variant='streaming') != key
+    # same content, touched
+    os.utime(path, (1_700_086_400, 1_700_086_400))
+    touched = cache_key(str(path), 0)
+    assert touched != key
+    # grown, mtime restored
+    path.write_bytes(b'export, appended')
+    os.utime(path, (1_700_086_400, 1_700_086_400))
+    assert cache_key(str(path), 0) not in (key, touched)
+
+def test_evict_drops_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path)
+    for age, key in enumerate(['newest', 'middle', 'oldest']):
+        write_cached_frame(key, _frame(), cache_dir)
+        for name in os.listdir(cache_dir):
+            if name.startswith(key):
+                os.utime(os.path.join(cache_dir, name), (1_700_000_000 - age * 60,) * 2)
+    # reading an entry makes it the most recently used
+    assert read_cached_frame('oldest', cache_dir) is not None
+    size = max(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+    assert evict(cache_dir, max_bytes=2 * size) == 1
+    assert not has_cached_frame('middle', cache_dir)
+    assert has_cached_frame('oldest', cache_dir) and has_cached_frame('newest', cache_dir)
+    assert evict(cache_dir, max_bytes=0) == 2
+    assert os.listdir(cache_dir) == []
+
+def test_pickle_fallback_without_pyarrow(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    monkeypatch.setattr(cache, 'HAS_PYARROW', False)
+
+    write_cached_frame('key', _frame(), cache_dir)
+
+    assert os.listdir(cache_dir) == ['key.pkl']
+    assert has_cached_frame('key', cache_dir)
+    pd.testing.assert_frame_equal(read_cached_frame('key', cache_dir), _frame())
+
+def test_parquet_entry_is_skipped_without_pyarrow(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    cache_dir = str(tmp_path)
+    write_cached_frame('key', _frame(), cache_dir)
+    assert os.listdir(cache_dir) == ['key.parquet']
+    pd.testing.assert_frame_equal(read_cached_frame('key', cache_dir), _frame())
+
+    monkeypatch.setattr(cache, 'HAS_PYARROW', False)
+
+    assert not has_cached_frame('key', cache_dir)
+    assert read_cached_frame('key', cache_dir) is None
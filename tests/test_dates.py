@@ -0,0 +1,23 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from app.dates import DATE_FORMATS, parse_dates
+
+def test_normalization_dates_are_day_first():
+    values = pd.Series(['03/04/2025', '13/04/2025', '03/04/2025 08:30:00', '', None, 'not a date'])
+    dates, coerced = parse_dates(values, DATE_FORMATS['used_approved_date'])
+    assert list(dates[:3]) == [pd.Timestamp('2025-04-03'), pd.Timestamp('2025-04-13'), pd.Timestamp('2025-04-03 08:30')]
+    assert dates[3:].isna().all()
+    assert coerced == 1
+
+def test_excel_cells_and_iso_text_mix():
+    # datetime cells from excel next to the text the normalization sheet fills in
+    values = pd.Series([datetime(2025, 4, 3), '05/04/2025', '2025-04-06', np.nan], dtype=object)
+    dates, coerced = parse_dates(values, DATE_FORMATS['used_approved_date'])
+    assert list(dates[:3]) == [pd.Timestamp('2025-04-03'), pd.Timestamp('2025-04-05'), pd.Timestamp('2025-04-06')]
+    assert pd.isna(dates[3]) and coerced == 0
+
+def test_export_dates_are_iso_first():
+    dates, coerced = parse_dates(pd.Series(['2025-04-03 10:00:00', '2025-04-13']), DATE_FORMATS['PO Approval Date'])
+    assert list(dates) == [pd.Timestamp('2025-04-03 10:00'), pd.Timestamp('2025-04-13')]
+    assert coerced == 0
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+from app.history import history_keys
+
+def _export():
+    # PO_SCHEMA columns only, as in a CPS export
+    return pd.DataFrame({
+        'Requisition Number': ['R1', 'R1', 'R1', 'R2'],
+        'Item Category': ['Goods', 'Service', 'Goods', 'Goods'],
+        'Requisition Type': ['Standard'] * 4,
+        'Department': ['HO', 'HO', 'HO', 'LAR'],
+        'Procurement Name': ['Ani', 'Ani', 'Ani', 'Budi'],
+        'Requisition Approved Date': pd.to_datetime(['2025-06-02'] * 3 + ['2025-06-03']),
+        'Requisition Required Date': pd.to_datetime(['2025-06-20'] * 4),
+        'Requisition Status': ['Pending'] * 4,
+        'PO Approval Date': pd.to_datetime([None, None, None, '2025-06-05']),
+    })
+
+def test_history_keys_are_stable_across_order_and_updates():
+    df = _export()
+    keys = history_keys(df, 'PO')
+    assert len(set(keys)) == 4
+
+    # reordered, with status and PO updates and categories loaded as categoricals
+    later = df.iloc[[3, 1, 0, 2]].reset_index(drop=True)
+    later['Requisition Status'] = 'Approve'
+    later['PO Approval Date'] = pd.Timestamp('2025-06-10')
+    later['Item Category'] = later['Item Category'].astype('category')
+    later_keys = history_keys(later, 'PO')
+    assert sorted(later_keys) == sorted(keys)
+    assert later_keys[0] == keys[3] and later_keys[1] == keys[1]
+
+def test_history_keys_need_key_columns():
+    with pytest.raises(ValueError):
+        history_keys(_export().drop(columns=['Department']), 'PO')
@@ -0,0 +1,90 @@
+import os
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from app.loader import PO_SCHEMA, load_excel_files, load_excel_streaming, resolve_input_files
+
+def _write(path, header, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def test_streaming_unions_empty_and_mixed_category_chunks(tmp_path):
+    path = str(tmp_path / 'PO.xlsx')
+    header = ['Requisition Number', 'Requisition Status', 'Requisition Type']
+    # first chunk: blank status, numeric types; second chunk: text for both
+    rows = [[f"R{i}", None, 7] for i in range(100)]
+    rows += [[f"R{i}", 'Approved', 'Goods'] for i in range(100, 150)]
+    _write(path, header, rows)
+
+    df = load_excel_streaming(path, PO_SCHEMA, chunk_size=100)
+
+    assert len(df) == 150
+    status = df['Requisition Status']
+    assert isinstance(status.dtype, pd.CategoricalDtype)
+    assert status.isna().sum() == 100
+    assert list(status.cat.categories) == ['Approved']
+    assert status.cat.categories.equals(pd.Series(['Approved']).astype('category').cat.categories)
+    types = df['Requisition Type']
+    assert types.iloc[0] == 7 and types.iloc[-1] == 'Goods'
+    assert set(types.cat.categories) == {7, 'Goods'}
+
+def test_updated_line_in_two_exports_is_kept_once(tmp_path):
+    header = ['Requisition Number', 'Item Category', 'Requisition Status', 'PO Approval Date']
+    first = str(tmp_path / 'PO_1.xlsx')
+    second = str(tmp_path / 'PO_2.xlsx')
+    _write(first, header, [
+        ['R1', 'Goods', 'Pending', None],
+        ['R1', 'Goods', 'Pending', None],
+        ['R2', 'Service', 'Approve', '2025-06-03'],
+    ])
+    # R1's second line got a PO approval, R3 is new
+    _write(second, header, [
+        ['R1', 'Goods', 'Pending', None],
+        ['R1', 'Goods', 'Approve', '2025-06-05'],
+        ['R3', 'Goods', 'Pending', None],
+    ])
+
+    df = load_excel_files([first, second], use_cache=False, schema=PO_SCHEMA, max_workers=1)
+
+    assert sorted(df['Requisition Number']) == ['R1', 'R1', 'R2', 'R3']
+    r1 = df[df['Requisition Number'] == 'R1']
+    assert set(r1['Source File']) == {'PO_2.xlsx'}
+    assert list(r1['Requisition Status']) == ['Pending', 'Approve']
+    assert r1['PO Approval Date'].notna().sum() == 1
+
+def test_merge_needs_requisition_number(tmp_path):
+    paths = []
+    for name in ('PO_1.xlsx', 'PO_2.xlsx'):
+        paths.append(str(tmp_path / name))
+        _write(paths[-1], ['Item Category'], [['Goods']])
+    with pytest.raises(ValueError):
+        load_excel_files(paths, use_cache=False, max_workers=1)
+
+def test_newest_export_wins_whatever_the_names(tmp_path):
+    header = ['Requisition Number', 'Requisition Status']
+    newer = str(tmp_path / 'PO_a.xlsx')
+    older = str(tmp_path / 'PO_b.xlsx')
+    _write(newer, header, [['R1', 'Approve']])
+    _write(older, header, [['R1', 'Pending'], ['R2', 'Pending']])
+    os.utime(older, (1_700_000_000, 1_700_000_000))
+    os.utime(newer, (1_700_086_400, 1_700_086_400))
+
+    # the glob sorts PO_a first, the list gives it first
+    for files in (str(tmp_path / 'PO_*.xlsx'), [newer, older]):
+        df = load_excel_files(files, use_cache=False, schema=PO_SCHEMA, max_workers=1)
+        r1 = df[df['Requisition Number'] == 'R1']
+        assert list(r1['Requisition Status']) == ['Approve']
+        assert list(r1['Source File']) == ['PO_a.xlsx']
+        assert sorted(df['Requisition Number']) == ['R1', 'R2']
+
+def test_existing_path_with_glob_characters_is_literal(tmp_path):
+    path = str(tmp_path / 'PO [HO].xlsx')
+    _write(path, ['Requisition Number'], [['R1']])
+
+    assert resolve_input_files(path) == [path]
+    with pytest.raises(FileNotFoundError):
+        resolve_input_files(str(tmp_path / 'PO [LAR].xlsx'))
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from app.localization import assign_department, compile_department_patterns
+
+NAMES = [
+    'Irwan / Auriel / Joko',  # OBI, LAR and HO
+    'Fairus / Irwan / Auriel',  # LAR and HO
+    'Auriel',
+    'Somebody Else',
+    np.nan,
+    'Irwan / Auriel / Joko',
+]
+
+def test_first_matching_department_wins():
+    df = pd.DataFrame({'Procurement Name': NAMES})
+
+    assigned = assign_department(df)['Department_Assigned']
+
+    assert list(assigned.cat.categories) == ['OBI', 'LAR', 'HO']
+    assert list(assigned.astype(object).where(assigned.notna(), None)) == ['OBI', 'LAR', 'HO', None, None, 'OBI']
+
+def test_priority_follows_department_order():
+    df = pd.DataFrame({'Procurement Name': NAMES})
+    patterns = compile_department_patterns({'HO': ['Auriel'], 'LAR': ['Irwan'], 'OBI': ['Joko'], 'Empty': []})
+
+    assigned = assign_department(df, patterns)['Department_Assigned']
+
+    assert list(assigned.cat.categories) == ['HO', 'LAR', 'OBI']
+    assert list(assigned.astype(object).where(assigned.notna(), None)) == ['HO', 'HO', 'HO', None, None, 'HO']
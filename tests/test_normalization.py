@@ -0,0 +1,64 @@
+import http.client
+import urllib.request
+import pandas as pd
+import pytest
+from app.normalization import load_normalization
+
+URL = 'https://example.com/normalisasi.csv'
+
+class _Response:
+    def __init__(self, content=b'', error=None):
+        self.content = content
+        self.error = error
+        self.headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def read(self):
+        if self.error:
+            raise self.error
+        return self.content
+
+@pytest.mark.parametrize('response', [
+    _Response(error=http.client.IncompleteRead(b'Requisition Number\nR1')),
+    _Response(b''),
+    _Response(b'\xff\xfe\x00garbage'),
+    _Response(b'a,b\n1,2,3,4\n"unterminated'),
+])
+def test_failed_refresh_uses_last_snapshot(tmp_path, monkeypatch, response):
+    monkeypatch.setattr(urllib.request, 'urlopen', lambda *args, **kwargs: _Response(b'Requisition Number,Background Update\nR1,late\n'))
+    df, info = load_normalization(URL, cache_dir=str(tmp_path))
+    assert list(df['Requisition Number']) == ['R1']
+
+    monkeypatch.setattr(urllib.request, 'urlopen', lambda *args, **kwargs: response)
+    refreshed, refreshed_info = load_normalization(URL, ttl=0, cache_dir=str(tmp_path))
+    assert list(refreshed['Requisition Number']) == ['R1']
+    assert refreshed_info == info
+
+@pytest.mark.parametrize('name', ['Normalisasi.csv', 'Normalisasi.xlsx'])
+def test_local_file_version_can_be_replayed(tmp_path, name):
+    path = tmp_path / name
+    data = pd.DataFrame({
+        'Requisition Number': ['R1', 'R2'],
+        'Updated Requisition Approved Date': ['03/06/2025', None],
+        'Background Update': ['late', 'ok'],
+    })
+    if name.endswith('.csv'):
+        data.to_csv(path, index=False)
+    else:
+        with pd.ExcelWriter(path) as writer:
+            data.iloc[:0].to_excel(writer, sheet_name='Other', index=False)
+            data.assign(**{'Updated Requisition Approved Date': pd.to_datetime(['2025-06-03', None])}).to_excel(writer, sheet_name='RFM', index=False)
+    cache_dir = str(tmp_path / 'cache')
+
+    df, info = load_normalization(str(path), cache_dir=cache_dir)
+    path.unlink()
+    replayed, replayed_info = load_normalization(f"snapshot:{info['version']}", cache_dir=cache_dir)
+
+    assert replayed_info['version'] == info['version']
+    pd.testing.assert_frame_equal(replayed, df)
+    assert list(df['Updated Requisition Approved Date'].fillna('')) == ['03/06/2025', '']
@@ -0,0 +1,53 @@
+from openpyxl import Workbook
+from app.loader import PO_OPTIONAL_COLUMNS, PO_SCHEMA, load_excel_files
+from app.preflight import check_source, check_sources, classify_export
+
+def _write(path, header, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def test_po_export_without_optional_columns_passes(tmp_path):
+    path = str(tmp_path / 'PO.xlsx')
+    header = [column for column in PO_SCHEMA if column not in PO_OPTIONAL_COLUMNS]
+    row = ['R1', 'Goods', 'Standard', 'IT', 'Buyer', '2025-06-02', '2025-06-10']
+    _write(path, header, [row])
+
+    assert check_source('PO', path) == []
+    assert classify_export(path) == 'PO'
+    df = load_excel_files(path, use_cache=False, schema=PO_SCHEMA)
+    assert set(PO_OPTIONAL_COLUMNS) <= set(df.columns)
+    assert df['Requisition Status'].isna().all()
+
+def test_po_export_missing_required_column_fails(tmp_path):
+    path = str(tmp_path / 'PO.xlsx')
+    header = [column for column in PO_SCHEMA if column != 'PO Approval Date']
+    _write(path, header, [['R1'] + [None] * (len(header) - 1)])
+
+    problems = check_source('PO', path)
+    assert len(problems) == 1 and "'PO Approval Date'" in problems[0]
+
+def test_exports_to_merge_without_requisition_number_fail(tmp_path):
+    paths = []
+    header = [column for column in PO_SCHEMA if column != 'Requisition Number']
+    for name in ('PO_1.xlsx', 'PO_2.xlsx'):
+        paths.append(str(tmp_path / name))
+        _write(paths[-1], header, [['Goods'] + [None] * (len(header) - 1)])
+
+    problems = check_sources('PO', paths)
+    assert len(problems) == 2 and all("'Requisition Number'" in problem for problem in problems)
+
+def test_bad_sampled_dates_are_warnings_in_a_run(tmp_path):
+    path = str(tmp_path / 'PO.xlsx')
+    header = list(PO_SCHEMA)
+    row = ['R1', 'Goods', 'Standard', 'IT', 'Buyer', 'soon', '2025-06-10', 'Approve', None]
+    _write(path, header, [row])
+
+    # --check fails on it, a run only warns
+    assert len(check_source('PO', path)) == 1
+    warnings = []
+    assert check_source('PO', path, warnings=warnings) == []
+    assert len(warnings) == 1 and "'Requisition Approved Date'" in warnings[0]
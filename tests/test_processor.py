@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from app.reports import compile_report_plan, evaluate_report_plan
+from app import processor
+
+def test_incremental_rerun_keeps_unchanged_outputs(tmp_path, monkeypatch):
+    written = []
+
+    def save_workbook(source, path, *args):
+        written.append(path)
+        with open(path, 'w') as f:
+            f.write(str(len(written)))
+
+    monkeypatch.setattr(processor, '_save_workbook', save_workbook)
+    results = {'PO_Approved': np.array([0, 2])}
+
+    def save(fingerprint, results=results):
+        return processor._save_outputs('PO', str(tmp_path), None, None, results, ['HO'], True, {}, [], ['csv'], fingerprint)
+
+    save('rows-1')
+    save('rows-1')
+    assert len(written) == 1
+    # changed rows, another window's selection, or no fingerprint write again
+    save('rows-2')
+    save('rows-2', {'PO_Approved': np.array([1])})
+    save(None)
+    assert len(written) == 4
+
+def test_backfill_windows_count_each_row_once():
+    windows = processor.weekly_windows('01-09-2025', '30-09-2025', 7)
+    assert windows[:2] == [('01-09-2025', '07-09-2025'), ('08-09-2025', '14-09-2025')]
+    assert windows[-1] == ('22-09-2025', '28-09-2025')
+
+    # one approved PO per day
+    dates = pd.date_range('2025-08-30', '2025-10-02', freq='D')
+    df = pd.DataFrame({'PO Approval Date': dates})
+    report = {'name': 'PO_Approved', 'source': 'PO', 'predicates': [['between', 'PO Approval Date']]}
+    plan = compile_report_plan(df, pd.Series(True, index=df.index), [report])
+
+    counts = np.zeros(len(df), dtype=int)
+    for datestart, dateend in windows:
+        start, end = processor.parse_window(datestart, dateend)
+        counts[evaluate_report_plan(plan, start, end)['PO_Approved']] += 1
+    covered = (dates >= '2025-09-01') & (dates < '2025-09-29')
+    assert (counts[covered] == 1).all()
+    assert (counts[~covered] == 0).all()
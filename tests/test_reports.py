@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.reports import REPORTS, compile_report_plan, evaluate_report_plan, reports_for_source
+
+START = pd.Timestamp('2025-06-09')
+END = pd.Timestamp('2025-06-15')
+# NaT, the day before the window, both boundaries, a time on the last day,
+# inside, and after the window
+DATES = [pd.NaT, START - pd.Timedelta(days=1), START, START + pd.Timedelta(hours=8), pd.Timestamp('2025-06-12'),
+         END, END + pd.Timedelta(hours=10), END + pd.Timedelta(days=1), pd.Timestamp('2025-07-01')]
+
+def _frame():
+    # every combination of the two date columns and the status
+    index = pd.MultiIndex.from_product([range(len(DATES)), range(len(DATES)), ['Approve', 'Draft', None]])
+    df = pd.DataFrame({
+        'PO Approval Date': [DATES[i] for i, _, _ in index],
+        'used_approved_date': [DATES[j] for _, j, _ in index],
+        'Requisition Status': pd.Categorical([status for _, _, status in index]),
+    })
+    base = pd.Series(np.arange(len(df)) % 5 != 0)
+    return df, base
+
+def _baseline(df, base, datestart_dt, dateend_dt):
+    # the filters of process_procurement_data before report definitions
+    return {
+        'PO_Approved': base & (df['PO Approval Date'] >= datestart_dt) & (df['PO Approval Date'] <= dateend_dt),
+        'New_RFMfromPO': base & (df['used_approved_date'] >= datestart_dt) & (df['used_approved_date'] <= dateend_dt),
+        'Inprocess_PO': base & ((df['PO Approval Date'].isna()) | (df['PO Approval Date'] > dateend_dt)),
+        'New_RFMfromRFM': base & (df['Requisition Status'] == 'Approve') &
+                          (df['used_approved_date'] >= datestart_dt) & (df['used_approved_date'] <= dateend_dt),
+        'Inprocess_RFM': base & (df['Requisition Status'] == 'Approve') & (df['used_approved_date'] <= dateend_dt),
+    }
+
+@pytest.mark.parametrize('datestart_dt, dateend_dt', [
+    (START, END),
+    (END, END),
+    (START - pd.Timedelta(days=30), START - pd.Timedelta(days=20)),
+])
+def test_report_plan_matches_baseline_filters(datestart_dt, dateend_dt):
+    df, base = _frame()
+    expected = _baseline(df, base, datestart_dt, dateend_dt)
+
+    for source in ('PO', 'RFM'):
+        plan = compile_report_plan(df, base, reports_for_source(REPORTS, source))
+        results = evaluate_report_plan(plan, datestart_dt, dateend_dt)
+        for name, rows in results.items():
+            assert list(rows) == list(np.flatnonzero(expected[name].to_numpy())), name
@@ -0,0 +1,65 @@
+import os
+import queue
+import threading
+import pytest
+from app.service import pair_ready, submit_job
+
+def _state(tmp_path):
+    po_file = tmp_path / 'PO.xlsx'
+    rfm_file = tmp_path / 'RFM.xlsx'
+    po_file.write_bytes(b'')
+    rfm_file.write_bytes(b'')
+    return {
+        'watch_dir': str(tmp_path),
+        'output_dir': str(tmp_path / 'reports'),
+        'cadence_days': 7,
+        'queue': queue.Queue(maxsize=4),
+        'lock': threading.Lock(),
+        'seen': {str(po_file): (0, 1), str(rfm_file): (0, 1)},
+        'latest': {'PO': str(po_file), 'RFM': str(rfm_file)},
+        'last_inputs': {},
+        'changed_at': None,
+        'pair_wait': 300.0,
+        'jobs': [],
+        'next_id': 1,
+    }
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('../../../tmp/escape', '30-06-2025'),
+    ('01-06-2025', '30-06-2025/../../x'),
+    ('2025-06-01', '2025-06-30'),
+    ('31-02-2025', '30-06-2025'),
+    (20250601, '30-06-2025'),
+])
+def test_submit_job_rejects_invalid_dates(tmp_path, start_date, end_date):
+    state = _state(tmp_path)
+    with pytest.raises(ValueError):
+        submit_job(state, 'api', start_date=start_date, end_date=end_date)
+    assert state['queue'].empty()
+
+def test_submit_job_normalises_dates(tmp_path):
+    state = _state(tmp_path)
+    job = submit_job(state, 'api', start_date='1-6-2025', end_date='30-06-2025')
+    assert (job['start_date'], job['end_date']) == ('01-06-2025', '30-06-2025')
+
+def test_submit_job_rejects_missing_export(tmp_path):
+    state = _state(tmp_path)
+    with pytest.raises(ValueError):
+        submit_job(state, 'api', po_file=os.path.join(str(tmp_path), '*.xlsx'))
+
+def test_pair_ready_waits_for_other_source(tmp_path):
+    state = _state(tmp_path)
+    assert pair_ready(state, {}, 0.0)
+
+    # a new PO export alone waits for the RFM one
+    state['seen'][state['latest']['PO']] = (0, 2)
+    assert not pair_ready(state, {}, 10.0)
+    state['seen'][state['latest']['RFM']] = (0, 2)
+    assert pair_ready(state, {}, 20.0)
+    assert not pair_ready(state, {}, 30.0)
+
+    # or runs with the older one after pair_wait
+    state['seen'][state['latest']['PO']] = (0, 3)
+    assert not pair_ready(state, {}, 40.0)
+    assert not pair_ready(state, {'other.xlsx': None}, 400.0)
+    assert pair_ready(state, {}, 400.0)
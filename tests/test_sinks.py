@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from app.sinks import PROPERTIES_NAME, _arrow_safe, write_csv, write_parquet, write_sqlite
+
+PROPERTIES = {'Normalization Snapshot': 'abc123'}
+
+def _frame(rows=3):
+    return pd.DataFrame({
+        'Requisition Number': [f"R{i}" for i in range(rows)],
+        'Department': pd.Categorical((['HO', None, 'OBI'] * rows)[:rows], categories=['OBI', 'LAR', 'HO']),
+        'PO Approval Date': pd.to_datetime((['2025-06-02', None, '2025-06-04'] * rows)[:rows]),
+        'Amount': ([1.5, np.nan, 3.0] * rows)[:rows],
+        # numbers and text in one export column
+        'Reference': pd.Series(([7, 'PR-8', None] * rows)[:rows], dtype=object),
+    })
+
+def test_arrow_safe_writes_mixed_columns_as_text():
+    df = _frame()
+
+    safe = _arrow_safe(df)
+
+    assert safe['Reference'].dtype == 'string'
+    assert list(safe['Reference'].fillna('')) == ['7', 'PR-8', '']
+    assert safe['Department'].dtype == df['Department'].dtype
+    assert safe['PO Approval Date'].dtype == df['PO Approval Date'].dtype
+    plain = df.drop(columns='Reference')
+    assert _arrow_safe(plain) is plain
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'data_PO_Weekly_parquet')
+    df = _frame()
+
+    write_parquet(path, {'PO_Approved': df, 'PO_Approved_HO': lambda: df.iloc[[0]]}, PROPERTIES)
+
+    assert sorted(os.listdir(path)) == ['PO_Approved.parquet', 'PO_Approved_HO.parquet', PROPERTIES_NAME + '.json']
+    back = pd.read_parquet(os.path.join(path, 'PO_Approved.parquet'))
+    pd.testing.assert_frame_equal(back, _arrow_safe(df), check_dtype=False)
+    assert isinstance(back['Department'].dtype, pd.CategoricalDtype)
+    assert list(back['Department'].cat.categories) == ['OBI', 'LAR', 'HO']
+    assert back['PO Approval Date'].isna().tolist() == [False, True, False]
+    assert len(pd.read_parquet(os.path.join(path, 'PO_Approved_HO.parquet'))) == 1
+    with open(os.path.join(path, PROPERTIES_NAME + '.json'), encoding='utf-8') as f:
+        assert json.load(f) == PROPERTIES
+
+def test_csv_round_trip_replaces_folder(tmp_path):
+    path = str(tmp_path / 'data_PO_Weekly_csv')
+    write_csv(path, {'PO_Approved': _frame(), 'Inprocess_PO': _frame()}, PROPERTIES)
+    write_csv(path, {'PO_Approved': _frame(5)}, PROPERTIES)
+
+    assert sorted(os.listdir(path)) == ['PO_Approved.csv', PROPERTIES_NAME + '.json']
+    back = pd.read_csv(os.path.join(path, 'PO_Approved.csv'), parse_dates=['PO Approval Date'])
+    assert list(back['Requisition Number']) == [f"R{i}" for i in range(5)]
+    assert list(back['Department'].fillna('')) == ['HO', '', 'OBI', 'HO', '']
+    pd.testing.assert_series_equal(back['PO Approval Date'], _frame(5)['PO Approval Date'], check_dtype=False)
+    assert list(back['Reference'].fillna('').astype(str)) == ['7', 'PR-8', '', '7', 'PR-8']
+
+def test_sqlite_round_trip_on_repeated_runs(tmp_path):
+    path = str(tmp_path / 'data_PO_Weekly.sqlite')
+    write_sqlite(path, {'PO_Approved': _frame(), 'Inprocess_PO': _frame()}, PROPERTIES)
+    # a later run into the same file replaces its tables
+    write_sqlite(path, {'PO_Approved': _frame(5)}, {'Normalization Snapshot': 'def456'})
+
+    assert not os.path.exists(path + '.tmp')
+    with sqlite3.connect(path) as connection:
+        tables = {name for (name,) in connection.execute("select name from sqlite_master where type = 'table'")}
+        back = pd.read_sql('select * from PO_Approved', connection, parse_dates=['PO Approval Date'])
+        properties = pd.read_sql(f"select * from {PROPERTIES_NAME}", connection)
+    assert tables == {'PO_Approved', PROPERTIES_NAME}
+    assert list(back['Requisition Number']) == [f"R{i}" for i in range(5)]
+    assert list(back['Department'].fillna('')) == ['HO', '', 'OBI', 'HO', '']
+    pd.testing.assert_series_equal(back['PO Approval Date'], _frame(5)['PO Approval Date'], check_dtype=False)
+    assert back['Amount'].isna().tolist() == [False, True, False, False, True]
+    assert properties.to_dict('records') == [{'name': 'Normalization Snapshot', 'value': 'def456'}]
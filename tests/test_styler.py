@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from app.reports import PR_PO_COLUMN, REPORTS
+from app.sinks import write_excel
+from app.styler import HIGHLIGHT_COLOR, style_and_reorder_excel_by_process
+
+def _sheets():
+    frame = pd.DataFrame({
+        'Requisition Number': ['R1', 'R2', None],
+        'Requisition Approved Date': pd.to_datetime(['2025-06-02', None, '2025-06-04 13:30:00'], format='ISO8601'),
+        'PO Approval Date': pd.to_datetime(['2025-06-05', '2025-06-06', None]),
+        'used_approved_date': pd.to_datetime(['2025-06-02', '2025-06-03', '2025-06-04']),
+        'Amount': [1.5, np.nan, 3.0],
+        'Lines': [1, 2, 3],
+    })
+    with_pr_po = frame.assign(**{PR_PO_COLUMN: [3.0, 3.0, np.nan]})
+    # out of order, as outputs are collected
+    return {
+        'Inprocess_PO_HO': frame,
+        'PO_Approved_OBI': frame,
+        'Sheet': frame,
+        'New_RFMfromPO': frame,
+        'PO_Approved': with_pr_po,
+        'Inprocess_PO': frame,
+    }
+
+def _rgb(color):
+    # xlsxwriter and openpyxl differ in the alpha byte of ARGB colors
+    return color.rgb[-6:] if color is not None else None
+
+def _layout(path):
+    wb = load_workbook(path)
+    layout = {'order': wb.sheetnames}
+    for ws in wb.worksheets:
+        cells = [
+            [(cell.value, _rgb(cell.fill.fgColor) if cell.fill.fill_type == 'solid' else None) for cell in row]
+            for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column)
+        ]
+        widths = {letter: dim.width for letter, dim in ws.column_dimensions.items() if dim.customWidth}
+        layout[ws.title] = (_rgb(ws.sheet_properties.tabColor), cells, widths)
+    return layout
+
+def test_styled_workbook_matches_legacy_styling(tmp_path):
+    inline = str(tmp_path / 'inline.xlsx')
+    legacy = str(tmp_path / 'legacy.xlsx')
+    write_excel(inline, _sheets(), {}, REPORTS, style_inline=True)
+    write_excel(legacy, _sheets(), {}, REPORTS, style_inline=False)
+    style_and_reorder_excel_by_process(legacy)
+
+    inline_layout = _layout(inline)
+    assert inline_layout == _layout(legacy)
+    assert inline_layout['order'] == ['Sheet', 'PO_Approved_OBI', 'PO_Approved', 'New_RFMfromPO', 'Inprocess_PO_HO', 'Inprocess_PO']
+    tab_color, cells, _ = inline_layout['PO_Approved_OBI']
+    assert tab_color == '00FF00'
+    # header unfilled, highlighted column filled down to blank cells
+    assert cells[0][2] == ('PO Approval Date', None)
+    assert cells[3][2][1] == HIGHLIGHT_COLOR
+    assert cells[0][-1][0] == PR_PO_COLUMN and cells[1][-1][0] == '=C2-D2'